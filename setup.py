@@ -31,7 +31,8 @@ setup(
     ],
     packages=[
         'solr_tasks',
-        'solr_tasks.lib'
+        'solr_tasks.lib',
+        'solr_tasks.testing'
     ],
     package_dir={'solr_tasks': 'solr_tasks'},
     package_data={'solr_tasks': ['resources/*']},
@@ -41,5 +42,8 @@ setup(
         'bugsnag>=3.7.0',
         'urllib3>=1.25.0',
         'requests>=2.24.0'
-    ]
+    ],
+    extras_require={
+        'orjson': ['orjson>=3.0.0']
+    }
 )
@@ -1,10 +1,13 @@
 # encoding: utf-8
 
 
+import argparse
 import datetime
 import logging
 import os
 from solr_tasks.lib import utils
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection
 import copy
 
@@ -85,16 +88,20 @@ def expand_mv_fields(documents: list, group_field: str) -> list:
     return new_documents
 
 
-def aggregate_fields(documents: list, group_fields: list) -> dict:
+def aggregate_fields(documents: list, group_fields: list,
+                     counts: dict = None) -> dict:
     """
     Aggregates documents based on a list of group fields
 
     :param documents: The list of documents to aggregate
     :param group_fields: The list of group fields
+    :param counts: Optional counts of an earlier aggregation to add the counts
+    of the given documents to
 
     :return: The aggregated counts
     """
-    counts = {}
+    if counts is None:
+        counts = {}
 
     for group_field in group_fields:
         documents = expand_mv_fields(documents, group_field)
@@ -184,42 +191,68 @@ def get_aggregations(counts: dict, aggregated_signals: list, signal_type: str,
 def main() -> None:
     utils.setup_logger(__file__)
 
+    parser = argparse.ArgumentParser(description='Aggregates the donl signals')
+    parser.add_argument('--commit_policy', type=CommitPolicy.from_string,
+                        default=CommitPolicy.from_environment(),
+                        help='How to commit between phases: hard, soft, '
+                             'deferred or none, optionally followed by '
+                             ':{commitWithin in ms}')
+
+    input_arguments = vars(parser.parse_args())
+
     logging.info('aggregate_signals.py started')
 
     signal_collection = SolrCollection(os.getenv('SOLR_COLLECTION_SIGNALS'))
     signal_aggregated_collection = SolrCollection(
-        os.getenv('SOLR_COLLECTION_SIGNALS_AGGREGATED')
+        os.getenv('SOLR_COLLECTION_SIGNALS_AGGREGATED'),
+        commit_policy=input_arguments['commit_policy']
     )
 
-    signals = signal_collection.select_all_documents()
+    query_counts = {}
+    search_timestamp_counts = {}
+    filters_counts = {}
+
+    for signals in signal_collection.iter_batches():
+        aggregate_fields(signals, ['query', 'handler'], query_counts)
+        aggregate_fields(
+            reduce_date_field_to_hours(signals, 'search_timestamp'),
+            ['search_timestamp', 'handler'],
+            search_timestamp_counts
+        )
+        aggregate_fields(
+            preprocess_filters(signals),
+            ['filters', 'handler'],
+            filters_counts
+        )
+
     aggregated_signals = signal_aggregated_collection.select_all_documents()
 
     signal_aggregated_collection.index_documents(get_aggregations(
-        aggregate_fields(signals, ['query', 'handler']),
+        query_counts,
         aggregated_signals,
         'query'
-    ))
+    ), commit=False)
 
     signal_aggregated_collection.index_documents(get_aggregations(
-        aggregate_fields(
-            reduce_date_field_to_hours(signals, 'search_timestamp'),
-            ['search_timestamp', 'handler']
-        ),
+        search_timestamp_counts,
         aggregated_signals,
         'search_timestamp'
-    ))
+    ), commit=False)
 
     signal_aggregated_collection.index_documents(get_aggregations(
-        aggregate_fields(
-            preprocess_filters(signals),
-            ['filters', 'handler']
-        ),
+        filters_counts,
         aggregated_signals,
         'filters'
-    ))
+    ), commit=False)
+    signal_aggregated_collection.commit(final=True)
 
     signal_collection.delete_documents('*:*')
 
+    signal_collection.log_transfer_statistics()
+    signal_aggregated_collection.log_transfer_statistics()
+
+    dump_metrics(__file__)
+
     logging.info('aggregate_signals.py finished')
 
 
@@ -0,0 +1,469 @@
+# encoding: utf-8
+
+
+import argparse
+import datetime
+import importlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Union
+from solr_tasks.generate_relations import compute_related_to
+from solr_tasks.generate_suggestions import count_context_relations
+from solr_tasks.lib import utils
+from solr_tasks.lib.graph import RelationGraph
+from solr_tasks.testing.corpus import COLLECTION_SCHEMAS, SyntheticCorpus
+from solr_tasks.testing.fake_solr import FakeCollection
+
+
+TASKS = {
+    'synchronize_collections': ['SOLR_COLLECTION_DATASET',
+                                'SOLR_COLLECTION_SEARCH'],
+    'generate_relations': ['SOLR_COLLECTION_SEARCH'],
+    'generate_suggestions': ['SOLR_COLLECTION_SEARCH',
+                             'SOLR_COLLECTION_SUGGESTER'],
+    'aggregate_signals': ['SOLR_COLLECTION_SIGNALS',
+                          'SOLR_COLLECTION_SIGNALS_AGGREGATED'],
+}
+DEFAULT_DOCUMENTS = [10000, 100000, 1000000]
+DEFAULT_REPEAT = 5
+
+
+def benchmark_result_location() -> str:
+    """
+    Returns the directory the benchmark results are stored in, this
+    information is based on the `BENCHMARK_RESULT_LOCATION` environment
+    variable and defaults to `./benchmarks`.
+    """
+    return os.getenv('BENCHMARK_RESULT_LOCATION', './benchmarks')
+
+
+def collection_name(variable: str) -> str:
+    """
+    Returns the name of the collection configured by the given environment
+    variable, falling back to the default DONL collection name.
+
+    :param str variable: The environment variable, such as
+                         `SOLR_COLLECTION_SEARCH`
+    :rtype: str
+    """
+    return os.getenv(variable, 'donl_{0}'.format(
+        variable[len('SOLR_COLLECTION_'):].lower()))
+
+
+def run_benchmark(task: str,
+                  documents: int,
+                  seed: int,
+                  work_directory: str,
+                  fixed_batches: bool = False) -> dict:
+    """
+    Runs a single task against a fake Solr server holding a synthetic corpus
+    of the given size. The task runs in a separate Python process, so that its
+    duration and peak memory usage are measured in isolation. Generating and
+    loading the corpus is not part of the measurement.
+
+    :param str task: The name of the task module, such as `generate_relations`
+    :param int documents: The size of the corpus
+    :param int seed: The seed of the corpus
+    :param str work_directory: The directory for the logs, metrics and
+                               valuelists of the run
+    :param bool fixed_batches: Whether to run the task with the fixed batch
+                               sizes of `SOLR_ADAPTIVE_BATCHES=false`
+    :rtype: dict[str, Any]
+    :return: The benchmark result
+    """
+    corpus = SyntheticCorpus(documents, seed)
+    collections = {variable: collection_name(variable)
+                   for variable in TASKS[task]}
+
+    logging.info('%s @ %s documents: loading corpus', task, documents)
+
+    server = corpus.create_server(collections)
+    valuelists = os.path.join(work_directory, 'lists')
+    os.makedirs(valuelists, exist_ok=True)
+
+    with open(os.path.join(valuelists, 'donl_communities.json'), 'w') as fh:
+        json.dump(corpus.communities_valuelist(), fh)
+
+    environment = dict(collections, **{
+        'SOLR_HOST': server.url,
+        'SOLR_CLOUD': 'false',
+        'VALUELIST_DIR': valuelists,
+        'LOGGING_FILE_ENABLE': 'false',
+        'BUGSNAG_ENABLE': 'false',
+        'METRICS_ENABLE': 'true',
+        'METRICS_LOCATION': work_directory,
+        'SOLR_DEAD_LETTER_LOCATION': work_directory,
+        'SOLR_ADAPTIVE_BATCHES': 'false' if fixed_batches else 'true',
+    })
+    log_file = os.path.join(work_directory, '{0}-{1}.log'.format(task,
+                                                                 documents))
+
+    logging.info('%s @ %s documents: running', task, documents)
+
+    with server, open(log_file, 'w') as log:
+        start = time.monotonic()
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'solr_tasks.benchmark', '--run_task', task],
+            env=dict(os.environ,
+                     BENCHMARK_ENVIRONMENT=json.dumps(environment)),
+            stdout=log, stderr=subprocess.STDOUT
+        )
+        process.wait()
+        seconds = time.monotonic() - start
+
+        solr = {collection.name: dict(collection.statistics,
+                                      documents=len(collection.documents))
+                for collection in server.collections.values()}
+
+    if process.returncode != 0:
+        with open(log_file) as fh:
+            logging.error('%s @ %s documents failed with exit code %s:\n%s',
+                          task, documents, process.returncode,
+                          ''.join(fh.readlines()[-20:]))
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'version': utils.get_version().strip(),
+        'task': task,
+        'documents': documents,
+        'seed': seed,
+        'fixed_batches': fixed_batches,
+        'seconds': round(seconds, 3),
+        'exit_code': process.returncode,
+        'max_rss_kb': read_peak_memory(work_directory),
+        'requests': read_metrics(work_directory, task),
+        'solr': solr
+    }
+
+
+def search_objects_by_type(documents: int, seed: int) -> dict:
+    """
+    Returns the objects of the search collection of a synthetic corpus as
+    Solr stores them, including the `relation` copy field, grouped by their
+    type.
+
+    :param int documents: The size of the corpus
+    :param int seed: The seed of the corpus
+    :rtype: dict[str, list of dict[str, Any]]
+    """
+    collection = FakeCollection('search',
+                                **COLLECTION_SCHEMAS['SOLR_COLLECTION_SEARCH'])
+    collection.load(SyntheticCorpus(documents, seed).search_documents())
+    by_type = {}
+
+    for document in collection.documents.values():
+        by_type.setdefault(document.get('sys_type'), []).append(document)
+
+    return by_type
+
+
+def prepare_related_to(objects: dict) -> Callable[[], None]:
+    """
+    Prepares the `related_to` computation of `generate_relations.py` for
+    every source type in `has_relations.json`.
+
+    :param dict[str, list of dict] objects: The objects grouped by type
+    :rtype: Callable[[], None]
+    """
+    arguments = [
+        (mapping,
+         [relation for target in mapping
+          for relation in objects.get(target, [])],
+         [source for source in objects.get(relation_source, [])
+          if 'sys_uri' in source])
+        for relation_source, mapping in
+        utils.load_resource('has_relations').items()
+    ]
+
+    return lambda: [compute_related_to(*single) for single in arguments]
+
+
+def prepare_context_counts(objects: dict) -> Callable[[], None]:
+    """
+    Prepares the local context weighting of `generate_suggestions.py`, the
+    graph of the objects of each context type and the counts of the related
+    objects of the suggested type, for every context in `suggestions.json`.
+
+    :param dict[str, list of dict] objects: The objects grouped by type
+    :rtype: Callable[[], None]
+    """
+    arguments = [
+        (in_context,
+         [context for context in objects.get(in_context, [])
+          if 'relation' in context],
+         [suggested['sys_uri'] for suggested in objects.get(doc_type, [])
+          if 'sys_uri' in suggested])
+        for in_context, config in utils.load_resource('suggestions').items()
+        for doc_type in config['relations']
+    ]
+
+    return lambda: [count_context_relations(
+        RelationGraph.from_documents(contexts, ['relation']), in_context,
+        uris) for in_context, contexts, uris in arguments]
+
+
+MICRO_BENCHMARKS = {
+    'compute_related_to': prepare_related_to,
+    'context_counts': prepare_context_counts,
+}
+
+
+def run_micro_benchmark(name: str,
+                        documents: int,
+                        seed: int,
+                        repeat: int) -> dict:
+    """
+    Runs a single computation of the tasks in the current process, on the
+    objects of a synthetic corpus of the given size, without Solr. The
+    corpus and the inputs of the computation are prepared before the
+    measurement, the computation runs the given amount of times and the
+    fastest run is reported.
+
+    :param str name: The name of the micro-benchmark, see `MICRO_BENCHMARKS`
+    :param int documents: The size of the corpus
+    :param int seed: The seed of the corpus
+    :param int repeat: The amount of times to run the computation
+    :rtype: dict[str, Any]
+    :return: The benchmark result
+    """
+    logging.info('%s @ %s documents: preparing', name, documents)
+
+    computation = MICRO_BENCHMARKS[name](
+        search_objects_by_type(documents, seed))
+    durations = []
+
+    logging.info('%s @ %s documents: running %s times', name, documents,
+                 repeat)
+
+    for _ in range(max(repeat, 1)):
+        start = time.perf_counter()
+        computation()
+        durations.append(time.perf_counter() - start)
+
+    return {
+        'timestamp': datetime.datetime.now().isoformat(timespec='seconds'),
+        'version': utils.get_version().strip(),
+        'task': name,
+        'documents': documents,
+        'seed': seed,
+        'repeat': len(durations),
+        'seconds': round(min(durations), 6),
+        'mean_seconds': round(sum(durations) / len(durations), 6),
+        'exit_code': 0
+    }
+
+
+def read_metrics(work_directory: str, task: str) -> dict:
+    """
+    Summarizes the metrics written by a task per collection.
+
+    :param str work_directory: The directory the metrics were written to
+    :param str task: The name of the task
+    :rtype: dict[str, dict[str, int|float]]
+    """
+    try:
+        metrics = utils.load_json_file(os.path.join(
+            work_directory, '{0}.json'.format(task)))
+    except (OSError, ValueError):
+        return {}
+
+    summary = {}
+
+    for collection, endpoints in metrics.items():
+        summary[collection] = {}
+
+        for counter in ['requests', 'errors', 'retries', 'bytes_sent',
+                        'bytes_received', 'documents_read',
+                        'documents_written', 'latency_seconds_sum']:
+            summary[collection][counter] = round(sum(
+                endpoint[counter] for endpoint in endpoints.values()), 3)
+
+    return summary
+
+
+def peak_memory() -> int:
+    """
+    Returns the peak resident set size of the current process in KiB. On
+    Linux the high water mark of the process image is used, as the maximum
+    reported by `getrusage()` includes the memory of the benchmark process it
+    was forked from.
+
+    :rtype: int
+    """
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def read_peak_memory(work_directory: str) -> Union[int, None]:
+    """
+    Returns the peak memory usage in KiB recorded by `run_task()`.
+
+    :param str work_directory: The directory of the benchmark run
+    :rtype: int|None
+    """
+    try:
+        with open(os.path.join(work_directory, 'peak_memory')) as fh:
+            return int(fh.read())
+    except (OSError, ValueError):
+        return None
+
+
+def previous_result(results_file: str,
+                    task: str,
+                    documents: int,
+                    fixed_batches: bool = False) -> dict:
+    """
+    Returns the most recent stored result of the given benchmark, if any.
+
+    :param str results_file: The file the results are stored in
+    :param str task: The name of the task
+    :param int documents: The size of the corpus
+    :param bool fixed_batches: Whether the task ran with fixed batch sizes
+    :rtype: dict[str, Any]|None
+    """
+    if not os.path.isfile(results_file):
+        return None
+
+    previous = None
+
+    with open(results_file) as fh:
+        for line in fh:
+            result = json.loads(line)
+
+            if task == result['task'] and documents == result['documents'] \
+                    and fixed_batches == result.get('fixed_batches', False) \
+                    and 0 == result['exit_code']:
+                previous = result
+
+    return previous
+
+
+def run_task(task: str) -> None:
+    """
+    Runs a task in the current process with the environment prepared by
+    `run_benchmark()`. The environment is applied after the `.env` file has
+    been loaded, so that the task never connects to the Solr installation
+    configured there.
+
+    :param str task: The name of the task module
+    """
+    os.environ.update(json.loads(os.environ['BENCHMARK_ENVIRONMENT']))
+    sys.argv = ['{0}.py'.format(task)]
+
+    importlib.import_module('solr_tasks.{0}'.format(task)).main()
+
+    with open(os.path.join(os.environ['METRICS_LOCATION'], 'peak_memory'),
+              'w') as fh:
+        fh.write(str(peak_memory()))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmarks the tasks against '
+                                                 'a fake Solr server holding a '
+                                                 'synthetic corpus')
+    parser.add_argument('--tasks', type=str, nargs='+', choices=TASKS.keys(),
+                        default=list(TASKS.keys()),
+                        help='Which tasks to benchmark')
+    parser.add_argument('--micro', type=str, nargs='*',
+                        choices=MICRO_BENCHMARKS.keys(), default=None,
+                        help='Run the given micro-benchmarks, or all of '
+                             'them, instead of the tasks')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='The amount of runs per micro-benchmark')
+    parser.add_argument('--documents', type=int, nargs='+',
+                        default=DEFAULT_DOCUMENTS,
+                        help='The corpus sizes to benchmark the tasks with')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='The seed of the synthetic corpus')
+    parser.add_argument('--fixed_batches', type=bool, nargs='?', const=True,
+                        default=False, help='Run the tasks with the fixed '
+                                            'batch sizes of '
+                                            'SOLR_ADAPTIVE_BATCHES=false')
+    parser.add_argument('--run_task', type=str, choices=TASKS.keys(),
+                        help=argparse.SUPPRESS)
+
+    input_arguments = vars(parser.parse_args())
+
+    if input_arguments['run_task']:
+        run_task(input_arguments['run_task'])
+
+        return
+
+    utils.setup_logger(__file__)
+
+    logging.info('benchmark.py -- starting')
+
+    location = benchmark_result_location()
+    results_file = os.path.join(location, 'results.jsonl')
+    os.makedirs(location, exist_ok=True)
+
+    if input_arguments['micro'] is not None:
+        for documents in input_arguments['documents']:
+            for name in input_arguments['micro'] or MICRO_BENCHMARKS.keys():
+                result = run_micro_benchmark(name, documents,
+                                             input_arguments['seed'],
+                                             input_arguments['repeat'])
+                previous = previous_result(results_file, name, documents)
+
+                with open(results_file, 'a') as fh:
+                    fh.write(json.dumps(result) + '\n')
+
+                logging.info('%s @ %s documents: %.4fs fastest of %s runs%s',
+                             name, documents, result['seconds'],
+                             result['repeat'], ' ({0:+.1f}% compared to {1} of '
+                             '{2})'.format(100 * (result['seconds']
+                                                  / previous['seconds'] - 1),
+                                           previous['version'],
+                                           previous['timestamp'])
+                             if previous else '')
+
+        logging.info('results appended to %s', results_file)
+        logging.info('benchmark.py -- finished')
+
+        return
+
+    for documents in input_arguments['documents']:
+        for task in input_arguments['tasks']:
+            with tempfile.TemporaryDirectory() as work_directory:
+                result = run_benchmark(task, documents,
+                                       input_arguments['seed'],
+                                       work_directory,
+                                       input_arguments['fixed_batches'])
+
+            previous = previous_result(results_file, task, documents,
+                                       input_arguments['fixed_batches'])
+
+            with open(results_file, 'a') as fh:
+                fh.write(json.dumps(result) + '\n')
+
+            if previous and 0 == result['exit_code']:
+                logging.info('%s @ %s documents: %.2fs, %s KiB peak (%+.1f%% '
+                             'compared to %s of %s)', task, documents,
+                             result['seconds'], result['max_rss_kb'],
+                             100 * (result['seconds'] / previous['seconds']
+                                    - 1), previous['version'],
+                             previous['timestamp'])
+            else:
+                logging.info('%s @ %s documents: %.2fs, %s KiB peak', task,
+                             documents, result['seconds'],
+                             result['max_rss_kb'])
+
+    logging.info('results appended to %s', results_file)
+    logging.info('benchmark.py -- finished')
+
+
+if '__main__' == __name__:
+    main()
@@ -1,12 +1,23 @@
 # encoding: utf-8
 
 
+import argparse
 import logging
 import os
+from typing import Callable, Iterable
 from solr_tasks.lib import utils
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.diff import UpdateDiff, as_values
+from solr_tasks.lib.graph import RelationGraph
+from solr_tasks.lib.metrics import dump_metrics
+from solr_tasks.lib.phases import Phase, PhaseScheduler
+from solr_tasks.lib.relation_state import RelationState, relation_state_file
+from solr_tasks.lib.scan import ScanPlan
 from solr_tasks.lib.solr import SolrCollection
 
 
+CHANGED_OBJECTS_PER_REQUEST = 500
+
 def update_reverse_relations(searcher: SolrCollection) -> None:
     """
     Ensures that the relations in the following example are mirrored:
@@ -40,212 +51,606 @@ def update_reverse_relations(searcher: SolrCollection) -> None:
     """
     relations = utils.load_resource('relations')
 
+    logging.info('selecting the objects of all relations')
+    graph = RelationGraph.load(
+        searcher, 'sys_type:({0})'.format(' OR '.join(sorted(
+            reverse_relation_types(relations)))),
+        reverse_relation_fields(relations), export=True
+    )
+
     for source_object, source_data in relations.items():
         for relation, mapping in source_data.items():
             logging.info('updating reverse relations from %s to %s',
                          source_object, relation)
 
-            field_entities = searcher.select_all_documents(
-                'sys_type:{0}'.format(source_object),
-                ['sys_id', mapping['match'], mapping['to']],
-                id_field='sys_id'
-            )
-            field_entities = {entity[mapping['match']]: entity
-                              for entity in field_entities}
+            diff, related = diff_reverse_relations(graph, source_object,
+                                                   relation, mapping)
 
-            relation_entities = searcher.select_all_documents(
-                'sys_type:{0}'.format(relation),
-                [mapping['match'], mapping['from']],
-                id_field='sys_id'
-            )
+            logging.info(' found %s objects of type %s with relations to'
+                         ' objects of type %s', related, relation,
+                         source_object)
 
-            entities_to_relation_entities = {}
+            searcher.index_documents(diff.updates, commit=False)
 
-            for relation_entity in relation_entities:
-                if mapping['from'] not in relation_entity:
-                    continue
+            logging.info('results')
+            diff.log_results()
 
-                for uri in relation_entity[mapping['from']]:
-                    if uri in field_entities.keys():
-                        if uri not in entities_to_relation_entities:
-                            entities_to_relation_entities[uri] = []
 
-                        entities_to_relation_entities[uri].append(
-                            relation_entity[mapping['match']]
-                        )
+def reverse_relation_types(relations: dict) -> set:
+    """
+    Returns the types of the objects involved in the reverse relations.
 
-            logging.info(' found %s objects of type %s with relations to'
-                         ' objects of type %s',
-                         len(entities_to_relation_entities.keys()),
-                         relation,
-                         source_object)
+    :param dict[str, dict] relations: The contents of `relations.json`
+    :rtype: set of str
+    """
+    return {sys_type for source_object, source_data in relations.items()
+            for sys_type in [source_object] + list(source_data.keys())}
 
-            deletes = [{'sys_id': field_entity['sys_id'],
-                        mapping['to']: {
-                            'remove': field_entity[mapping['to']]
-                        }} for field_entity in field_entities
-                       if mapping['to'] in field_entity
-                       and field_entity[mapping['match']] not in
-                       entities_to_relation_entities.keys()]
 
-            updates = [{
-                'sys_id': field_entities[uri]['sys_id'],
-                mapping['to']: {
-                    'set': entities_to_relation_entities[uri]
-                }
-            } for uri in entities_to_relation_entities]
+def reverse_relation_fields(relations: dict) -> set:
+    """
+    Returns the fields read and written by the reverse relations.
+
+    :param dict[str, dict] relations: The contents of `relations.json`
+    :rtype: set of str
+    """
+    return {field for source_data in relations.values()
+            for mapping in source_data.values()
+            for field in [mapping['from'], mapping['to']]}
 
-            searcher.index_documents(deletes, commit=False)
-            searcher.index_documents(updates, commit=False)
 
-            logging.info('results')
-            logging.info(' deleted: %s', len(deletes))
-            logging.info(' updated: %s', len(updates))
+def diff_reverse_relations(graph: RelationGraph,
+                           source_object: str,
+                           relation: str,
+                           mapping: dict,
+                           uris: set = None) -> tuple:
+    """
+    Determines the reverse relations of a single pair in `relations.json`:
+    the objects of type `relation` referring to each object of type
+    `source_object` through the `from` field. Objects without any reverse
+    relation lose the relations they had. The objects are matched on the URI
+    of the graph, the `match` field of every pair.
+
+    :param RelationGraph graph: The graph holding the `from` and `to` fields
+                                of both types
+    :param str source_object: The type of the objects receiving the reverse
+                              relations
+    :param str relation: The type of the objects holding the relations
+    :param dict[str, str] mapping: The mapping of the pair
+    :param set of str uris: Only determine the reverse relations of the
+                            objects with these URIs, defaults to all objects
+    :rtype: tuple of (UpdateDiff, int)
+    :return: The updates and the amount of objects with reverse relations
+    """
+    diff = UpdateDiff(mapping['to'])
+    related = 0
+
+    for node in graph.nodes(source_object):
+        if uris is not None and graph.uri(node) not in uris:
+            continue
+
+        value = [graph.uri(neighbour) for neighbour in graph.neighbours(
+            node, mapping['from'], relation, reverse=True)]
+        related += bool(value)
+
+        diff.compare({'sys_id': graph.key(node), mapping['to']: [
+            graph.uri(neighbour)
+            for neighbour in graph.neighbours(node, mapping['to'])
+        ]}, value)
+
+    return diff, related
+
+
+def compute_related_to(mapping: dict, rels: list, sources: list) -> dict:
+    """
+    Determines for every source object the types of the objects that refer to
+    it, through the reverse edges of a graph of `rels`.
+
+    :param dict[str, str] mapping: The field referring to the source, keyed by
+                                   the type of the referring objects
+    :param list of dict rels: The objects that may refer to the sources, with
+                              their `sys_uri`, `sys_type` and the mapped
+                              fields
+    :param list of dict sources: The source objects, with their `sys_id` and
+                                 `sys_uri`
+    :rtype: dict[str, set of str]
+    :return: The referring types, keyed by the `sys_id` of every source
+    """
+    graph = RelationGraph.from_documents(rels, mapping.values())
+    related_to = {}
+
+    for source in sources:
+        node = graph.node(source['sys_uri'])
+        related_to[source['sys_id']] = set() if node is None else {
+            mapping_target for mapping_target, field in mapping.items()
+            if graph.degree(node, field, mapping_target, reverse=True)
+        }
+
+    return related_to
+
+
+def diff_related_to(mapping: dict,
+                    rels: list,
+                    sources: list,
+                    diff: UpdateDiff) -> None:
+    """
+    Compares the `related_to` types determined by `compute_related_to()` with
+    the current types of the sources.
+
+    :param dict[str, str] mapping: See `compute_related_to()`
+    :param list of dict rels: See `compute_related_to()`
+    :param list of dict sources: The source objects, with their `sys_id`,
+                                 `sys_uri` and current `related_to` types
+    :param UpdateDiff diff: The diff to add the updates to
+    """
+    related_to = compute_related_to(mapping, rels, sources)
+
+    for source in sources:
+        diff.compare(source, sorted(related_to[source['sys_id']]))
 
 
 def update_relations(searcher: SolrCollection) -> None:
     has_relations = utils.load_resource('has_relations')
-    updates = {}
+    diff = UpdateDiff('related_to')
+    plan = ScanPlan(searcher, id_field='sys_id', export=True)
+    requests = {
+        relation_source: (
+            plan.add('sys_type:{0}'.format(' OR sys_type:'.join(
+                mapping.keys())),
+                list(set(list(mapping.values()) + ['sys_uri', 'sys_type']))),
+            plan.add('sys_type:{0}'.format(relation_source),
+                     ['sys_uri', 'related_to'])
+        ) for relation_source, mapping in has_relations.items()
+    }
+
+    logging.info('selecting the objects of all relations')
+    plan.execute()
+
     for relation_source, mapping in has_relations.items():
         logging.info('relations for %s', relation_source)
 
-        sources = searcher.select_all_documents(
-            fq='sys_type:{0}'.format(relation_source),
-            id_field='sys_id'
-        )
-        rels = searcher.select_all_documents(
-            fl=list(set(list(mapping.values()) + ['sys_uri', 'sys_type'])),
-            fq='sys_type:{0}'.format(' OR sys_type:'.join(mapping.keys())),
-            id_field='sys_id'
-        )
+        rels = requests[relation_source][0].documents
+        sources = requests[relation_source][1].documents
 
-        logging.info(' subjects:        %s', len(sources))
         logging.info(' relations:       %s', len(rels))
 
-        [source.update({'related_to': []}) for source in sources]
+        diff_related_to(mapping, rels, sources, diff)
 
-        for source in sources:
-            related_to = set()
-            for mapping_target, mapping_source in mapping.items():
-                if mapping_target in source['related_to']:
-                    continue
-
-                for relation in rels:
-                    if mapping_target != relation['sys_type']:
-                        continue
+        logging.info(' subjects:        %s', len(sources))
 
-                    try:
-                        if isinstance(relation[mapping_source], list):
-                            if source['sys_uri'] in relation[mapping_source]:
-                                related_to.add(mapping_target)
-                        else:
-                            if source['sys_uri'] == relation[mapping_source]:
-                                related_to.add(mapping_target)
-                    except KeyError:
-                        continue
+    logging.info('indexing relations')
 
-            if source['sys_id'] not in updates:
-                updates[source['sys_id']] = set()
+    searcher.index_documents(diff.updates, commit=False)
 
-            for related_to_type in related_to:
-                updates[source['sys_id']].add(related_to_type)
+    logging.info('results')
+    diff.log_results()
 
-    logging.info('indexing relations')
 
-    updates = [{
-        'sys_id': sys_id,
-        'related_to': {
-            'set': list(update)
-        }
-    } for sys_id, update in updates.items()]
+def diff_authority_kind(organizations: Iterable,
+                        objects_with_authority: Iterable) -> UpdateDiff:
+    """
+    Determines the `authority_kind` of every object with an authority, based
+    on the kind of the organizations.
+
+    :param Iterable[dict] organizations: The organizations, with their
+                                         `sys_uri` and `kind`
+    :param Iterable[dict] objects_with_authority: The objects with an
+                                                  authority, with their
+                                                  `sys_id`, `authority` and
+                                                  current `authority_kind`
+    :rtype: UpdateDiff
+    """
+    organization_types = {organization['sys_uri']: organization['kind']
+                          for organization in organizations
+                          if 'kind' in organization
+                          and 'sys_uri' in organization}
+    diff = UpdateDiff('authority_kind')
 
-    searcher.index_documents(updates, commit=False)
+    for donl_object in objects_with_authority:
+        diff.compare(donl_object, [
+            organization_types[authority]
+            for authority in as_values(donl_object.get('authority'))
+            if authority in organization_types
+        ])
 
-    logging.info('results')
-    logging.info(' indexed:         %s', len(updates))
+    return diff
 
 
 def update_authority_kind(searcher: SolrCollection) -> None:
-    organization_types = {organization['sys_uri']: organization['kind']
-                     for organization in searcher.select_all_documents(
-            'sys_type:organization', ['sys_uri', 'kind'], id_field='sys_id'
-        ) if 'kind' in organization and 'sys_uri' in organization}
-
-    objects_with_authority = searcher.select_all_documents(
-        'authority:[* TO *]',
-        ['sys_id, authority'],
-        id_field='sys_id'
-    )
+    plan = ScanPlan(searcher, id_field='sys_id', export=True)
+    organizations = plan.add('sys_type:organization', ['sys_uri', 'kind'])
+    authorities = plan.add('authority:[* TO *]',
+                           ['sys_id', 'authority', 'authority_kind'])
+    plan.execute()
+
+    diff = diff_authority_kind(organizations.documents, authorities.documents)
 
     logging.info('Found {0} objects with a relation with an authority'.format(
-        len(objects_with_authority)
+        len(authorities.documents)
     ))
 
-    updates = [{
-        'sys_id': donl_object['sys_id'],
-        'authority_kind': {
-            'set': [organization_types[authority]
-                    for authority in donl_object['authority']
-                    if authority in organization_types]
-        }
-    } for donl_object in objects_with_authority]
-
-    searcher.index_documents(updates, commit=False)
+    searcher.index_documents(diff.updates, commit=False)
 
     logging.info('results')
-    logging.info(' indexed:         %s', len(updates))
+    diff.log_results()
+
+
+def diff_popularity(relation_counts: dict,
+                    donl_objects: Iterable) -> UpdateDiff:
+    """
+    Determines the popularity of every object that is related to by other
+    objects.
+
+    :param dict[str, int] relation_counts: The amount of relations per URI
+    :param Iterable[dict] donl_objects: The objects, with their `sys_id`,
+                                        `sys_uri` and current `popularity`
+    :rtype: UpdateDiff
+    """
+    diff = UpdateDiff('popularity')
+
+    for donl_object in donl_objects:
+        if donl_object.get('sys_uri') in relation_counts:
+            diff.compare(donl_object,
+                         relation_counts[donl_object['sys_uri']])
+
+    return diff
 
 
 def update_popularity(searcher: SolrCollection) -> None:
     logging.info('Updating popularity')
     relation_counts = searcher.get_facet_counts('relation')
 
-    donl_objects = searcher.select_all_documents(
+    donl_objects = searcher.iter_documents(
         fl=['sys_uri', 'popularity'],
-        id_field='sys_id'
+        id_field='sys_id',
+        export=True
     )
 
-    updates = [{
-        'sys_id': donl_object['sys_id'],
-        'popularity': {
-            'set': relation_counts[donl_object['sys_uri']]
-        }
-    } for donl_object in donl_objects
-    if donl_object['sys_uri'] in relation_counts
-    and not ('popularity' in donl_object
-    and donl_object['popularity'] == relation_counts[donl_object['sys_uri']])]
+    diff = diff_popularity(relation_counts, donl_objects)
 
-    searcher.index_documents(updates, commit=False)
+    searcher.index_documents(diff.updates, commit=False)
 
     logging.info('results')
-    logging.info(' indexed:         %s', len(updates))
+    diff.log_results()
+
+
+def relation_state_fields() -> list:
+    """
+    Returns the fields the relation state has to store for the incremental
+    mode, based on `relations.json` and `has_relations.json`.
+
+    :rtype: list of str
+    """
+    fields = {'sys_uri', 'authority', 'kind', 'authority_kind', 'related_to',
+              'popularity'}
+
+    for source_data in utils.load_resource('relations').values():
+        for mapping in source_data.values():
+            fields.update([mapping['match'], mapping['from'], mapping['to']])
+
+    for mapping in utils.load_resource('has_relations').values():
+        fields.update(mapping.values())
+
+    return sorted(fields)
+
+
+def load_changes(searcher: SolrCollection, state: RelationState) -> bool:
+    """
+    Brings the relation state up to date with the collection. The IDs and
+    `_version_` of every document are compared with the state: objects that
+    are missing from the collection are removed from the state, objects that
+    are new or of which the version changed are read again. Any update
+    changes the version, so objects changed by processes that do not bump
+    `sys_modified`, such as the community rules of
+    `synchronize_collections.py`, are picked up as well.
+
+    :param SolrCollection searcher: The collection to read the changes from
+    :param RelationState state: The state to update
+    :rtype: bool
+    :return: Whether or not the state matches the collection
+    """
+    versions = {document['sys_id']: document.get('_version_')
+                for document in searcher.iter_documents(
+                    fl=['sys_id', '_version_'], id_field='sys_id',
+                    export=True)}
+
+    # An incomplete scan would remove the objects that were not read
+    if searcher.document_count() != len(versions):
+        return False
+
+    logging.info(' deleted: %s', state.retain(set(versions)))
+
+    stored = state.versions()
+    changed = sorted(object_id for object_id, version in versions.items()
+                     if stored.get(object_id) != version)
+    read = 0
+    created = 0
+
+    for offset in range(0, len(changed), CHANGED_OBJECTS_PER_REQUEST):
+        fq = ' OR '.join('sys_id:"{0}"'.format(
+            object_id.replace('\\', '\\\\').replace('"', '\\"'))
+            for object_id in changed[offset:offset
+                                     + CHANGED_OBJECTS_PER_REQUEST])
+
+        for batch in searcher.iter_batches(fq, state.fields,
+                                           id_field='sys_id', export=True):
+            read += len(batch)
+            created += state.apply_documents(batch)
+
+    logging.info(' changed: %s (%s new)', read, created)
+
+    return read == len(changed)
+
+
+def send_updates(searcher: SolrCollection,
+                 state: RelationState,
+                 diff: UpdateDiff) -> None:
+    """
+    Sends the updates of an incremental phase to the collection and applies
+    them to the relation state, so that later phases see them.
+
+    Phases that do not conflict (see `relation_phases()`) read the state
+    while this function changes it. Only the fields written by the phase are
+    changed, objects are neither added nor removed, and the phases read the
+    fields of the stored objects by name; the state is thus never changed in
+    a way another running phase observes.
+
+    :param SolrCollection searcher: The collection to send the updates to
+    :param RelationState state: The relation state to keep in sync
+    :param UpdateDiff diff: The updates determined by the phase
+    """
+    searcher.index_documents(diff.updates, commit=False)
+    state.apply_updates(diff.updates)
+
+    logging.info('results')
+    diff.log_results()
+
+
+def incremental_reverse_relations(state: RelationState) -> UpdateDiff:
+    """
+    Determines the reverse relations like `update_reverse_relations()`, based
+    on the relation state. Only the objects that changed or that a changed
+    object referred to, before or after its change, are recomputed.
+
+    :param RelationState state: The up to date relation state
+    :rtype: UpdateDiff
+    """
+    relations = utils.load_resource('relations')
+    graph = RelationGraph.from_documents(state.objects.values(),
+                                         reverse_relation_fields(relations))
+    affected = state.changed_values()
+    diff = UpdateDiff('relation_*')
+
+    for source_object, source_data in relations.items():
+        for relation, mapping in source_data.items():
+            diff.extend(diff_reverse_relations(graph, source_object, relation,
+                                               mapping, affected)[0])
+
+    return diff
+
+
+def incremental_relations(state: RelationState) -> UpdateDiff:
+    """
+    Determines the `related_to` types like `update_relations()`, based on the
+    relation state. Only the objects that changed or that a changed object
+    referred to are recomputed.
+
+    :param RelationState state: The up to date relation state
+    :rtype: UpdateDiff
+    """
+    objects = state.objects_by_type()
+    affected = state.changed_values()
+    diff = UpdateDiff('related_to')
+
+    for relation_source, mapping in utils.load_resource(
+            'has_relations').items():
+        diff_related_to(mapping, [relation for target in mapping
+                                  for relation in objects.get(target, [])],
+                        [source for source in objects.get(relation_source, [])
+                         if source.get('sys_uri') in affected], diff)
+
+    return diff
+
+
+def incremental_authority_kind(state: RelationState) -> UpdateDiff:
+    """
+    Determines the `authority_kind` values like `update_authority_kind()`,
+    based on the relation state. Only the objects that changed or of which
+    an authority changed are recomputed.
+
+    :param RelationState state: The up to date relation state
+    :rtype: UpdateDiff
+    """
+    changed = state.changed_ids()
+    affected = state.changed_values()
+
+    return diff_authority_kind(
+        state.objects_by_type().get('organization', []),
+        [donl_object for donl_object in state.objects.values()
+         if 'authority' in donl_object
+         and (donl_object['sys_id'] in changed
+              or not affected.isdisjoint(as_values(donl_object['authority'])))]
+    )
+
+
+def incremental_popularity(searcher: SolrCollection,
+                           state: RelationState) -> UpdateDiff:
+    """
+    Determines the popularity like `update_popularity()`, comparing the facet
+    counts with the popularity in the relation state. The counts are a single
+    facet request and the comparison needs no other data, so every object is
+    compared.
+
+    :param SolrCollection searcher: The collection to retrieve the facet
+                                    counts from
+    :param RelationState state: The up to date relation state
+    :rtype: UpdateDiff
+    """
+    return diff_popularity(searcher.get_facet_counts('relation'),
+                           state.objects.values())
+
+
+def relation_phases(reverse_relations: Callable[[], None],
+                    related_to: Callable[[], None],
+                    authority_kind: Callable[[], None],
+                    popularity: Callable[[], None]) -> list:
+    """
+    Declares the phases of `generate_relations.py` with the fields they read
+    and write, based on `relations.json` and `has_relations.json`. The
+    popularity reads the `relation` copy field of the `relation_*` fields
+    through the facet counts, which only reflect committed writes.
+
+    :param Callable reverse_relations: Runs the reverse relations phase
+    :param Callable related_to: Runs the `related_to` phase
+    :param Callable authority_kind: Runs the `authority_kind` phase
+    :param Callable popularity: Runs the popularity phase
+    :rtype: list of Phase
+    """
+    reverse_reads = {'sys_id', 'sys_type'}
+    reverse_writes = set()
+
+    for source_data in utils.load_resource('relations').values():
+        for mapping in source_data.values():
+            reverse_reads.update([mapping['match'], mapping['from']])
+            reverse_writes.add(mapping['to'])
+
+    related_to_reads = {'sys_id', 'sys_type', 'sys_uri', 'related_to'}
+
+    for mapping in utils.load_resource('has_relations').values():
+        related_to_reads.update(mapping.values())
+
+    return [
+        Phase('reverse relations', reverse_relations,
+              reverse_reads | reverse_writes, reverse_writes),
+        Phase('related_to', related_to, related_to_reads, ['related_to']),
+        Phase('authority_kind', authority_kind,
+              ['sys_id', 'sys_type', 'sys_uri', 'kind', 'authority',
+               'authority_kind'], ['authority_kind']),
+        Phase('popularity', popularity,
+              ['sys_id', 'sys_uri', 'popularity', 'relation_*'],
+              ['popularity'], committed=True)
+    ]
+
+
+def update_incrementally(searcher: SolrCollection,
+                         state: RelationState,
+                         concurrency: int = None) -> None:
+    """
+    Updates the relations of the objects affected by the changes recorded in
+    the relation state. Every phase is computed from the state and only the
+    objects of which the outcome differs from the stored values are updated,
+    the state is kept in sync with every update sent. The phases are
+    scheduled like in `update_all()`.
+
+    :param SolrCollection searcher: The collection to update
+    :param RelationState state: The up to date relation state
+    :param int concurrency: The maximum amount of phases to run at the same
+                            time, see `PhaseScheduler`
+    """
+    with searcher.buffered_updates('sys_id'):
+        PhaseScheduler(relation_phases(
+            lambda: send_updates(searcher, state,
+                                 incremental_reverse_relations(state)),
+            lambda: send_updates(searcher, state,
+                                 incremental_relations(state)),
+            lambda: send_updates(searcher, state,
+                                 incremental_authority_kind(state)),
+            lambda: send_updates(searcher, state,
+                                 incremental_popularity(searcher, state))
+        ), lambda fields: searcher.commit(visible=True, fields=fields),
+            concurrency).run()
+
+
+def update_all(searcher: SolrCollection, concurrency: int = None) -> None:
+    """
+    Recomputes the relations of every object in the collection. Phases that
+    do not conflict with each other run concurrently (see `relation_phases()`
+    and `PhaseScheduler`), the updates are coalesced per object. Only the
+    fields the popularity reads are flushed before its commit, the other
+    updates are coalesced with the popularity updates.
+
+    :param SolrCollection searcher: The collection to update
+    :param int concurrency: The maximum amount of phases to run at the same
+                            time, see `PhaseScheduler`
+    """
+    with searcher.buffered_updates('sys_id'):
+        PhaseScheduler(relation_phases(
+            lambda: update_reverse_relations(searcher),
+            lambda: update_relations(searcher),
+            lambda: update_authority_kind(searcher),
+            lambda: update_popularity(searcher)
+        ), lambda fields: searcher.commit(visible=True, fields=fields),
+            concurrency).run()
 
 
 def main():
     utils.setup_logger(__file__)
 
+    parser = argparse.ArgumentParser(description='Generates the relations '
+                                                 'between the objects in the '
+                                                 'donl_search collection')
+    parser.add_argument('--commit_policy', type=CommitPolicy.from_string,
+                        default=CommitPolicy.from_environment(),
+                        help='How to commit between phases: hard, soft, '
+                             'deferred or none, optionally followed by '
+                             ':{commitWithin in ms}')
+    parser.add_argument('--incremental', type=bool, nargs='?', const=True,
+                        default=False, help='Only update the relations '
+                                            'affected by the objects changed '
+                                            'since the previous incremental '
+                                            'run')
+    parser.add_argument('--phase_concurrency', type=int, default=None,
+                        help='The maximum amount of non-conflicting phases '
+                             'to run at the same time, 1 runs the phases one '
+                             'after another')
+
+    input_arguments = vars(parser.parse_args())
+
     logging.info('generate_relations.py -- starting')
+    logging.info(' > commit policy: %s', input_arguments['commit_policy'])
+    logging.info(' > incremental' if input_arguments['incremental']
+                 else ' > full recompute')
 
-    collection = SolrCollection(os.getenv('SOLR_COLLECTION_SEARCH'))
-    update_reverse_relations(collection)
+    collection = SolrCollection(os.getenv('SOLR_COLLECTION_SEARCH'),
+                                commit_policy=input_arguments['commit_policy'])
+    state = None
 
-    logging.info('committing index changes')
-    collection.index_documents([], commit=True)
+    if input_arguments['incremental']:
+        state_file = relation_state_file(collection.collection)
+        state = RelationState.load(state_file, relation_state_fields())
 
-    update_relations(collection)
+        if state is not None:
+            logging.info('loading changes')
 
-    logging.info('committing index changes')
-    collection.index_documents([], commit=True)
+            if not load_changes(collection, state):
+                logging.info('relation state does not match the collection, '
+                             'falling back to a full recompute')
+                state = None
 
-    update_authority_kind(collection)
+    if state is not None:
+        update_incrementally(collection, state,
+                             input_arguments['phase_concurrency'])
+    else:
+        update_all(collection, input_arguments['phase_concurrency'])
 
     logging.info('committing index changes')
-    collection.index_documents([], commit=True)
+    collection.commit(final=True)
 
-    update_popularity(collection)
+    if input_arguments['incremental']:
+        # The updates sent changed the versions of the updated objects
+        if state is not None and not load_changes(collection, state):
+            state = None
 
-    logging.info('committing index changes')
-    collection.index_documents([], commit=True)
+        if state is None:
+            logging.info('recording relation state')
+            state = RelationState.scan(collection, relation_state_fields(),
+                                       export=True)
+
+        state.save(state_file)
+
+    collection.log_transfer_statistics()
+
+    dump_metrics(__file__)
 
     logging.info('generate_relations.py -- finished')
 
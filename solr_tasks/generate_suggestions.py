@@ -1,22 +1,174 @@
 # encoding: utf-8
 
 
+import argparse
+import hashlib
+import json
 import logging
 import os
+from typing import Iterable
 from solr_tasks.lib import utils
+from solr_tasks.lib.bluegreen import BlueGreenDeployment
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.diff import DocumentDiff, content_hash
+from solr_tasks.lib.graph import RelationGraph
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection
 from solr_tasks.lib.mapper import DictMapper
 
 
+def identify_suggestion(suggestion: dict, *key: str) -> dict:
+    """
+    Assigns a deterministic ID to a suggestion, derived from the given key,
+    and the hash of its contents, which are compared with the suggestions in
+    the suggester to determine which suggestions changed.
+
+    :param dict[str, Any] suggestion: The suggestion
+    :param str key: The parts of the key that identify the suggestion, such
+    as its kind, context and the ID of the document it was derived from
+    :return: The suggestion
+    """
+    suggestion['content_hash'] = content_hash(suggestion,
+                                              ['id', 'content_hash'])
+    suggestion['id'] = hashlib.sha1(
+        json.dumps(key, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    return suggestion
+
+
+def plan_scans(suggestion_types: dict) -> dict:
+    """
+    Determines which fields of the documents of each type the suggestions
+    read, per pass over the documents of that type: the title, user defined
+    synonym and context suggestions, the community names and the themes of
+    the datasets.
+
+    :param dict suggestion_types: The suggestion types configuration
+    :rtype: dict[str, list of list of str]
+    :return: The fields read by each pass, keyed by document type
+    """
+    scans = {}
+
+    for doc_type, config in suggestion_types.items():
+        scans.setdefault(doc_type, []).append(list(config['mapping']))
+
+        if 'user_defined_synonyms' in config:
+            scans[doc_type].append(list(config['user_defined_synonyms'])
+                                   + ['user_defined_synonyms'])
+
+        for relation in config['relations']:
+            scans.setdefault(relation, []).append(
+                list(suggestion_types[relation]['mapping']))
+
+    scans.setdefault('community', []).append(['sys_name'])
+    scans.setdefault('dataset', []).append(['theme'])
+
+    return scans
+
+
+def read_documents(search_core: SolrCollection, scans: dict) -> dict:
+    """
+    Reads the documents of each type with a single scan, selecting the fields
+    of all its passes. The documents of a type that is read by more than one
+    pass are kept in memory and shared between the passes, the documents of
+    the other types are streamed to their only pass.
+
+    :param SolrCollection search_core: The search core to read from
+    :param dict[str, list of list of str] scans: The fields read by each pass,
+                                                 keyed by document type, see
+                                                 `plan_scans()`
+    :rtype: dict[str, Iterable[dict[str, Any]]]
+    :return: The documents keyed by document type
+    """
+    documents = {}
+
+    for doc_type, passes in scans.items():
+        fields = sorted({'sys_id', 'sys_uri'}.union(*passes))
+        fq = 'sys_type:"{0}"'.format(doc_type)
+
+        if len(passes) > 1:
+            documents[doc_type] = search_core.select_all_documents(
+                fq, fields, id_field='sys_id')
+        else:
+            documents[doc_type] = search_core.iter_documents(
+                fq, fields, id_field='sys_id')
+
+    return documents
+
+
+def get_context_counts(search_core: SolrCollection,
+                       in_context: str,
+                       uris: list) -> dict:
+    """
+    Count the objects of the context type that relate to each URI, with a
+    facet on the `relation` field filtered on the context type. When the facet
+    counts cannot be retrieved the objects of the context type are read
+    instead, and counted through the reverse edges of their relation graph.
+
+    :param SolrCollection search_core: The search core to count in
+    :param str in_context: The context type
+    :param list of str uris: The URIs to count the related objects of, only
+                             used when counting locally
+    :rtype: dict[str, int]
+    :return: The amount of related objects keyed by URI, URIs without related
+             objects are omitted
+    """
+    counts = search_core.get_facet_counts(
+        'relation', 'sys_type:"{0}"'.format(in_context), mincount=1)
+
+    if counts is not None:
+        return counts
+
+    logging.warning('facet counts in context of %s are not available, '
+                    'counting locally', in_context)
+
+    return count_context_relations(RelationGraph.load(
+        search_core,
+        'sys_type:"{0}" AND relation:[* TO *]'.format(in_context),
+        ['relation'],
+        id_field='sys_id'
+    ), in_context, uris)
+
+
+def count_context_relations(context_graph: RelationGraph,
+                            in_context: str,
+                            uris: list) -> dict:
+    """
+    Count the objects of the context type that relate to each URI, through
+    the reverse edges of the `relation` field of their graph.
+
+    :param RelationGraph context_graph: The graph of the objects of the
+                                        context type
+    :param str in_context: The context type
+    :param list of str uris: The URIs to count the related objects of
+    :rtype: dict[str, int]
+    :return: The amount of related objects keyed by URI, URIs without related
+             objects are omitted
+    """
+    counts = {}
+
+    for uri in uris:
+        node = context_graph.node(uri)
+        count = 0 if node is None else context_graph.degree(
+            node, 'relation', in_context, reverse=True, distinct=True)
+
+        if count:
+            counts[uri] = count
+
+    return counts
+
+
 def get_suggestions(search_core: SolrCollection,
                     in_context: str, doc_type: str,
+                    documents: Iterable[dict],
                     mappings: dict, communities: dict) -> list:
     """
     Get suggestions of a given doc_type in a given context from the search core
 
-    :param search_core: The search core to get suggestions from
+    :param search_core: The search core to count the context objects in
     :param in_context: The context
     :param doc_type: The doc type
+    :param Iterable[dict] documents: The documents of the doc type
     :param mappings: The mappings of the given context
     :param dict communities: A dictionary with community URIs as keys and
     community names as value
@@ -34,24 +186,12 @@ def get_suggestions(search_core: SolrCollection,
     mappings['sys_uri'] = ['payload']
 
     dict_mapper = DictMapper(mappings)
-    doc_entities = search_core.select_all_documents(
-        'sys_type:"{0}" AND sys_uri:[* TO *]'.format(doc_type),
-        id_field='sys_id'
+    doc_entities = [document for document in documents
+                    if 'sys_uri' in document]
+    counts = get_context_counts(
+        search_core, in_context,
+        [doc_entity['sys_uri'] for doc_entity in doc_entities]
     )
-    context_entities = search_core.select_all_documents(
-        'sys_type:"{0}" AND relation:[* TO *]'.format(in_context),
-        ['relation'],
-        id_field='sys_id'
-    )
-
-    counts = {}
-
-    for doc_entity in doc_entities:
-        for context_entity in context_entities:
-            if doc_entity['sys_uri'] in context_entity['relation']:
-                counts[doc_entity['sys_uri']] = \
-                    counts[doc_entity['sys_uri']] + 1 \
-                        if doc_entity['sys_uri'] in counts else 1
 
     suggestions = []
 
@@ -77,24 +217,23 @@ def get_suggestions(search_core: SolrCollection,
                      for suggestion_type in entity['type']]
             if 'type' in entity else ['filter']
         })
-        suggestions.append(entity)
+        suggestions.append(identify_suggestion(
+            entity, 'context', in_context, doc_type, doc_entity['sys_id']))
 
     return suggestions
 
 
-def get_theme_suggestions(search_core: SolrCollection, in_context: str) -> list:
+def get_theme_suggestions(search_core: SolrCollection, in_context: str,
+                          context_entities: Iterable[dict]) -> list:
     """
     Get theme suggestions within a given context and use the number of
     occurrences of a theme within the context as weight
 
-    :param search_core: The search core to get theme suggestions from
+    :param search_core: The search core to get the theme synonyms from
     :param in_context: The context
+    :param Iterable[dict] context_entities: The documents of the context type
     :return: The list of theme suggestions
     """
-    context_entities = search_core.select_all_documents(
-        'sys_type:"{0}"'.format(in_context), ['theme'], id_field='sys_id'
-    )
-
     counts = {}
 
     for context_entity in context_entities:
@@ -109,48 +248,44 @@ def get_theme_suggestions(search_core: SolrCollection, in_context: str) -> list:
 
     synonyms_uri_nl = search_core.select_managed_synonyms('uri_nl')
 
-    return [{
+    return [identify_suggestion({
         'theme': synonyms_uri_nl[theme] if theme in synonyms_uri_nl else theme,
         'weight': count,
         'payload': theme,
         'type': 'theme',
         'language': ['nl', 'en'],
         'in_context_of': in_context
-    } for theme, count in counts.items()]
+    }, 'theme', in_context, theme) for theme, count in counts.items()]
 
 
-def get_doc_suggestions(search_core: SolrCollection, doc_type: str,
+def get_doc_suggestions(doc_type: str, documents: Iterable[dict],
                         mappings: dict, relation_counts: dict,
-                        communities: dict, fq: str = None) -> list:
+                        communities: dict, required: str = None,
+                        source: str = 'title') -> list:
     """
     Get suggestions of a given doc_type from the search core
 
-    :param SolrCollection search_core: The search core to get suggestions from
     :param str doc_type: The document type to get suggestions for
+    :param Iterable[dict] documents: The documents of the document type
     :param dict mappings: The mapping from the search core to the suggester core
     :param dict relation_counts: A dictionary of the relation facet field
     :param dict communities: A dictionary with community URIs as keys and
     community names as value
-    :param str fq: An optional string used for filtering documents for which
-    suggestions are returned
+    :param str required: An optional field, only the documents with a value
+    for it are suggested
+    :param str source: The kind of suggestions, which distinguishes their IDs
+    from the IDs of other suggestions for the same documents
     :return: The list of doc suggestions
     """
     dict_mapper = DictMapper(mappings)
     suggestions = []
 
-    filter_all_docs = 'sys_type:"{0}"'.format(doc_type)
-
-    if fq is not None:
-        filter_all_docs += ' AND ' + fq
-
-    entities = search_core.select_all_documents(
-        filter_all_docs,
-        list(mappings.keys()) + ['sys_uri'],
-        id_field='sys_id'
-    )
+    for entity in documents:
+        if required is not None and required not in entity:
+            continue
 
-    for entity in entities:
         sys_uri = entity['sys_uri']
+        sys_id = entity['sys_id']
 
         if sys_uri not in relation_counts:
             continue
@@ -168,62 +303,115 @@ def get_doc_suggestions(search_core: SolrCollection, doc_type: str,
         entity['language'] = ['nl', 'en']
         entity['in_context_of'] = 'self'
 
-        suggestions.append(entity)
+        suggestions.append(identify_suggestion(entity, 'self', source,
+                                               doc_type, sys_id))
 
     return suggestions
 
 
+def index_suggestions(suggest: SolrCollection,
+                      diffs: list,
+                      suggestions: list) -> None:
+    """
+    Indexes the new and changed suggestions, without a commit. The
+    suggestions are compared with every given diff, the first of which holds
+    the current contents of the given collection.
+
+    :param SolrCollection suggest: The collection to index the suggestions in
+    :param list of DocumentDiff diffs: The diffs to compare the suggestions
+                                       with
+    :param list of dict suggestions: The suggestions
+    """
+    for diff in diffs[1:]:
+        diff.compare(suggestions)
+
+    suggest.index_documents(diffs[0].compare(suggestions), commit=False)
+
+
 def main() -> None:
     utils.setup_logger(__file__)
 
+    parser = argparse.ArgumentParser(description='Generates the suggestions in '
+                                                 'the donl_suggester '
+                                                 'collection')
+    parser.add_argument('--commit_policy', type=CommitPolicy.from_string,
+                        default=CommitPolicy.from_environment(),
+                        help='How to commit between phases: hard, soft, '
+                             'deferred or none, optionally followed by '
+                             ':{commitWithin in ms}')
+    parser.add_argument('--blue_green', type=bool, nargs='?', const=True,
+                        default=False, help='Index into the staging '
+                                            'collection of the suggester '
+                                            'alias and switch the alias to '
+                                            'it once validated')
+
+    input_arguments = vars(parser.parse_args())
+
     logging.info('generate_suggestions.py -- starting')
 
-    suggest = SolrCollection(os.getenv('SOLR_COLLECTION_SUGGESTER'))
+    suggest = SolrCollection(os.getenv('SOLR_COLLECTION_SUGGESTER'),
+                             commit_policy=input_arguments['commit_policy'])
     search = SolrCollection(os.getenv('SOLR_COLLECTION_SEARCH'))
+    deployment = None
+
+    if input_arguments['blue_green']:
+        deployment = BlueGreenDeployment(
+            os.getenv('SOLR_COLLECTION_SUGGESTER'),
+            commit_policy=input_arguments['commit_policy']
+        )
+        suggest = deployment.prepare()
 
-    logging.info('clearing suggestions')
-    suggest.delete_documents('*:*', commit=False)
+    logging.info('reading current suggestions')
+    diff = DocumentDiff.load(suggest)
+    diffs = [diff]
+
+    # The staging collection may lag behind, whether the suggestions changed
+    # is determined by comparing them with the live collection.
+    if deployment is not None and deployment.live is not None:
+        logging.info('reading live suggestions')
+        diffs.append(DocumentDiff.load(deployment.live))
 
     relation_counts = search.get_facet_counts('relation')
+    suggestion_types = utils.load_resource('suggestions')
 
-    community_uri_to_name = search.select_all_documents(
-        fq='sys_type:community',
-        fl=['sys_uri', 'sys_name'],
-        id_field='sys_id'
-    )
+    # Every document type is scanned once, the types read by several passes
+    # are shared between them.
+    documents = read_documents(search, plan_scans(suggestion_types))
 
     community_uri_to_name = {community['sys_uri']: community['sys_name']
-                             for community in community_uri_to_name}
+                             for community in documents['community']
+                             if 'sys_name' in community}
 
-    suggestion_types = utils.load_resource('suggestions')
     doc_suggestions = {doc_type: get_doc_suggestions(
-        search, doc_type, config['mapping'], relation_counts,
+        doc_type, documents[doc_type], config['mapping'], relation_counts,
         community_uri_to_name)
         for doc_type, config in suggestion_types.items()}
 
     logging.info('adding title suggestions:')
 
     for doc_type, doc_type_suggestions in doc_suggestions.items():
-        suggest.index_documents(doc_type_suggestions, commit=False)
+        index_suggestions(suggest, diffs, doc_type_suggestions)
         logging.info(' titles: %s of type %s',
                      len(doc_type_suggestions), doc_type)
 
     user_defined_synonym_suggestions = {doc_type: get_doc_suggestions(
-        search, doc_type, config['user_defined_synonyms'], relation_counts,
-        community_uri_to_name, 'user_defined_synonyms:[* TO *]')
+        doc_type, documents[doc_type], config['user_defined_synonyms'],
+        relation_counts, community_uri_to_name, 'user_defined_synonyms',
+        'user_defined_synonyms')
         for doc_type, config in suggestion_types.items()
         if 'user_defined_synonyms' in config}
 
     logging.info('adding user defined synonym suggestions:')
 
     for doc_type, doc_type_suggestions in user_defined_synonym_suggestions.items():
-        suggest.index_documents(doc_type_suggestions, commit=False)
+        index_suggestions(suggest, diffs, doc_type_suggestions)
         logging.info(' user defined synonyms: %s of type %s',
                      len(doc_type_suggestions), doc_type)
 
     context_suggestions = {
         doc_type: {
             relation: get_suggestions(search, doc_type, relation,
+                                      documents[relation],
                                       suggestion_types[relation]['mapping'],
                                       community_uri_to_name)
         } for doc_type, config in suggestion_types.items()
@@ -233,21 +421,45 @@ def main() -> None:
 
     for doc_type, relations in context_suggestions.items():
         for relation, suggestions in relations.items():
-            suggest.index_documents(suggestions, commit=False)
+            index_suggestions(suggest, diffs, suggestions)
             logging.info(' titles: %s of type %s in context of %s',
                          len(suggestions), relation, doc_type)
 
     logging.info('adding theme suggestions:')
-    theme_suggestions = get_theme_suggestions(search, 'dataset')
-    suggest.index_documents(theme_suggestions, commit=False)
+    theme_suggestions = get_theme_suggestions(search, 'dataset',
+                                              documents['dataset'])
+    index_suggestions(suggest, diffs, theme_suggestions)
     logging.info(' themes: %s in context of %s',
                  len(theme_suggestions), 'dataset')
 
-    logging.info('committing changes to index')
-    suggest.index_documents([], commit=True)
+    logging.info('deleting outdated suggestions')
+    suggest.delete_documents_by_id(diff.deletes(), commit=False)
+
+    logging.info('results')
+    diff.log_results()
+
+    if diff.has_changes():
+        logging.info('committing changes to index')
+        suggest.commit(final=True)
+
+    if diffs[-1].has_changes() or deployment is not None \
+            and deployment.live is None:
+        logging.info('building Solr suggester')
+        suggest.build_suggestions('build_suggest')
+
+        if deployment is not None and deployment.validate(len(diff.seen)):
+            deployment.swap()
+    else:
+        logging.info('suggestions unchanged, skipping the Solr suggester '
+                     'build')
+
+    search.log_transfer_statistics()
+    suggest.log_transfer_statistics()
+
+    if deployment is not None and deployment.live is not None:
+        deployment.live.log_transfer_statistics()
 
-    logging.info('building Solr suggester')
-    suggest.build_suggestions('build_suggest')
+    dump_metrics(__file__)
 
     logging.info('generate_suggestions.py -- finished')
 
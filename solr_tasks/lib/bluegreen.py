@@ -0,0 +1,176 @@
+# encoding: utf-8
+
+
+import logging
+import os
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.solr import SolrCollection
+
+
+def solr_blue_green_suffixes() -> list:
+    """
+    Returns the suffixes of the two collections behind a blue/green alias,
+    this information is based on the `SOLR_BLUE_GREEN_SUFFIXES` environment
+    variable and defaults to `_blue,_green`.
+    """
+    return os.getenv('SOLR_BLUE_GREEN_SUFFIXES', '_blue,_green').split(',')
+
+
+class BlueGreenDeployment:
+    def __init__(self,
+                 alias: str,
+                 commit_policy: CommitPolicy = None,
+                 suffixes: list = None):
+        """
+        Initialize a BlueGreenDeployment instance. The alias points at one of
+        two collections, named after the alias followed by one of the
+        suffixes. The collection it points at is live, the other one is used
+        to stage the next version of the contents. Once the staging
+        collection is validated the alias is switched to it, the previously
+        live collection is left untouched so that the alias can be switched
+        back.
+
+        :param str alias: The alias the clients of the collection use
+        :param CommitPolicy commit_policy: The commit policy of the staging
+                                           collection
+        :param list of str suffixes: The suffixes of the two collections,
+                                     defaults to `solr_blue_green_suffixes()`
+        :rtype: BlueGreenDeployment
+        """
+        self.alias = alias
+        self.collections = [alias + suffix for suffix in
+                            (suffixes or solr_blue_green_suffixes())]
+        self.commit_policy = commit_policy
+        self.live = None
+        self.staging = None
+
+    def prepare(self) -> SolrCollection:
+        """
+        Determines the live and the staging collection from the aliases of
+        the SolrCloud cluster.
+
+        :rtype: SolrCollection
+        :return: The staging collection
+        :raises ValueError: When Solr does not run in SolrCloud mode, the
+                            alias points at another collection or the staging
+                            collection does not exist
+        """
+        if 'true' != os.getenv('SOLR_CLOUD'):
+            raise ValueError('blue/green deployments require SolrCloud')
+
+        cluster = SolrCollection(self.alias)
+        aliases = cluster.list_aliases()
+        collections = cluster.list_collections()
+
+        if aliases is None or collections is None:
+            raise ValueError('the aliases and collections of the cluster '
+                             'could not be retrieved')
+
+        live = aliases.get(self.alias)
+
+        if live is not None and (len(live) != 1
+                                 or live[0] not in self.collections):
+            raise ValueError('alias {0} points at {1} instead of one of {2}'
+                             .format(self.alias, ','.join(live),
+                                     ', '.join(self.collections)))
+
+        staging = [collection for collection in self.collections
+                   if live is None or collection != live[0]][0]
+
+        if staging not in collections:
+            raise ValueError('staging collection {0} does not exist'
+                             .format(staging))
+
+        self.live = SolrCollection(live[0]) if live else None
+        self.staging = SolrCollection(staging,
+                                      commit_policy=self.commit_policy)
+
+        logging.info(' > blue/green: %s points at %s, staging in %s',
+                     self.alias, live[0] if live else 'nothing', staging)
+
+        return self.staging
+
+    def copy_live(self, id_field: str = 'id') -> int:
+        """
+        Replaces the contents of the staging collection with the documents of
+        the live collection, without a commit. Copy field destinations and
+        the `_version_` field are left out, every other field has to be
+        stored.
+
+        :param str id_field: The ID field of the collections
+        :rtype: int
+        :return: The amount of copied documents
+        :raises ValueError: When the copy fields of the live collection could
+                            not be retrieved
+        """
+        self.staging.delete_documents('*:*', commit=False)
+
+        if self.live is None:
+            logging.warning('%s does not point at a collection yet, staging '
+                            'starts empty', self.alias)
+
+            return 0
+
+        ignored = self.live.copy_field_destinations()
+
+        if ignored is None:
+            raise ValueError('the copy fields of {0} could not be retrieved'
+                             .format(self.live.collection))
+
+        ignored.add('_version_')
+        copied = 0
+
+        for batch in self.live.iter_batches(id_field=id_field):
+            self.staging.index_documents([
+                {field: value for field, value in document.items()
+                 if field not in ignored} for document in batch
+            ], commit=False)
+            copied += len(batch)
+
+        logging.info(' copied %s documents from %s to %s', copied,
+                     self.live.collection, self.staging.collection)
+
+        return copied
+
+    def validate(self, expected: int) -> bool:
+        """
+        Checks whether the staging collection holds the expected amount of
+        documents, once its changes are committed.
+
+        :param int expected: The expected amount of documents
+        :rtype: bool
+        """
+        count = self.staging.document_count()
+
+        if count != expected:
+            logging.error('%s holds %s documents instead of %s, keeping %s '
+                          'live', self.staging.collection, count, expected,
+                          self.live.collection if self.live else 'nothing')
+
+            return False
+
+        logging.info(' %s holds the expected %s documents',
+                     self.staging.collection, count)
+
+        return True
+
+    def swap(self) -> bool:
+        """
+        Switches the alias to the staging collection. The previously live
+        collection is kept as it is, to roll back to.
+
+        :rtype: bool
+        :return: Whether or not the alias was switched
+        """
+        if not self.staging.create_alias(self.alias):
+            logging.error('switching %s to %s failed', self.alias,
+                          self.staging.collection)
+
+            return False
+
+        logging.info('%s now points at %s%s', self.alias,
+                     self.staging.collection,
+                     ', {0} is kept for rollback'.format(
+                         self.live.collection) if self.live else '')
+
+        return True
@@ -0,0 +1,342 @@
+# encoding: utf-8
+
+
+import threading
+from fnmatch import fnmatchcase
+from typing import Any, Union
+
+
+class UpdateBuffer:
+    def __init__(self, id_field: str = 'id'):
+        """
+        Initialize an UpdateBuffer instance, which coalesces the atomic updates
+        of documents in memory. Updates of the same document are merged into a
+        single update per field, so that Solr rewrites every document once when
+        the buffer is flushed:
+
+        - a `set` replaces all earlier operations on the field
+        - operations following a `set` are applied to the value being set
+        - consecutive `add`, `add-distinct` or `remove` operations are combined
+
+        Operations that cannot be merged, such as a `remove` following an
+        `add`, start a new update of the document, which is sent after the
+        earlier one.
+
+        :param str id_field: The ID field of the collection
+        :rtype: UpdateBuffer
+        """
+        self.id_field = id_field
+        self.documents = {}
+        self.received = 0
+        self.lock = threading.Lock()
+
+    def add(self, document: dict) -> None:
+        """
+        Adds an update, or an entire document, to the buffer. Entire documents
+        replace all earlier updates of the document.
+
+        :param dict[str, Any] document: The document or atomic update
+        """
+        document_id = document[self.id_field]
+
+        with self.lock:
+            self.received += 1
+            pending = self.documents.setdefault(document_id, [])
+
+            if not is_atomic_update(document, self.id_field):
+                pending[:] = [dict(document)]
+
+                return
+
+            merged = merge_updates(pending[-1], document, self.id_field) \
+                if pending else None
+
+            if merged is None:
+                pending.append({field: dict(value)
+                                if isinstance(value, dict) else value
+                                for field, value in document.items()})
+            else:
+                pending[-1] = merged
+
+    def overlay(self, document: dict, fields: Union[list, None]) -> dict:
+        """
+        Applies the buffered updates of a document to a copy of it as read
+        from Solr, so that reads reflect the updates that were not sent yet.
+
+        :param dict[str, Any] document: The document as read from Solr
+        :param list of str|None fields: The fields that were read, which may
+                                        contain wildcards, None for all
+                                        fields
+        :rtype: dict[str, Any]
+        """
+        with self.lock:
+            pending = list(self.documents.get(document.get(self.id_field), []))
+
+        if not pending:
+            return document
+
+        document = dict(document)
+
+        for update in pending:
+            for field, operation in update.items():
+                if field == self.id_field or (fields is not None and not any(
+                        fnmatchcase(field, pattern) for pattern in fields)):
+                    continue
+
+                if not isinstance(operation, dict):
+                    operation = {'set': operation}
+
+                value = document.get(field)
+
+                for modifier, operand in operation.items():
+                    value = apply_operation(value, modifier, operand)
+
+                if value is None or value == []:
+                    document.pop(field, None)
+                else:
+                    document[field] = value
+
+        return document
+
+    def drain(self, fields: list = None) -> list:
+        """
+        Empties the buffer, returning the merged updates in rounds: the n-th
+        round holds the n-th update of every document, so that the updates of
+        a document are applied in order when the rounds are sent one after
+        another.
+
+        With fields, only the operations on those fields are drained, the
+        operations on other fields stay buffered to be coalesced with later
+        updates of the same documents. Entire documents are drained as a
+        whole.
+
+        :param list of str fields: The fields to drain, which may contain
+                                   wildcards, None for all fields
+        :rtype: list of list of dict[str, Any]
+        """
+        with self.lock:
+            if fields is None:
+                documents, self.documents = self.documents, {}
+                self.received = 0
+            else:
+                documents = {}
+
+                for document_id, pending in list(self.documents.items()):
+                    drained, kept = split_updates(pending, fields,
+                                                  self.id_field)
+
+                    if drained:
+                        documents[document_id] = drained
+
+                    if kept:
+                        self.documents[document_id] = kept
+                    else:
+                        del self.documents[document_id]
+
+        rounds = []
+
+        for pending in documents.values():
+            for number, update in enumerate(pending):
+                if number == len(rounds):
+                    rounds.append([])
+
+                rounds[number].append(update)
+
+        return rounds
+
+    def __len__(self) -> int:
+        return sum(len(pending) for pending in self.documents.values())
+
+
+def is_atomic_update(document: dict, id_field: str) -> bool:
+    """
+    Returns whether or not the given document is an atomic update, rather than
+    an entire document.
+
+    :param dict[str, Any] document: The document
+    :param str id_field: The ID field of the collection
+    :rtype: bool
+    """
+    return any(isinstance(value, dict) and field != id_field
+               for field, value in document.items())
+
+
+def is_idempotent(document: dict) -> bool:
+    """
+    Returns whether or not sending the given document, or atomic update, more
+    than once has the same outcome as sending it once. That holds for entire
+    documents and for atomic updates that only `set` fields, but not for
+    operations such as `add` or `inc`.
+
+    :param dict[str, Any] document: The document or atomic update
+    :rtype: bool
+    """
+    return all(set(value) <= {'set'}
+               for value in document.values() if isinstance(value, dict))
+
+
+def split_updates(pending: list, fields: list, id_field: str) -> tuple:
+    """
+    Splits the pending updates of a document into the operations on the given
+    fields and the operations on other fields. The operations on a field keep
+    their order; operations on different fields do not depend on each other.
+
+    :param list of dict pending: The pending updates of the document
+    :param list of str fields: The fields to split off, which may contain
+                               wildcards
+    :param str id_field: The ID field of the collection
+    :rtype: tuple of (list of dict, list of dict)
+    :return: The updates of the given fields and the updates of the other
+             fields, both without empty updates
+    """
+    if not is_atomic_update(pending[0], id_field):
+        return pending, []
+
+    matching, other = [], []
+
+    for update in pending:
+        # A plain value in an atomic update is a `set`, which it would no
+        # longer be in an update of that field alone
+        operations = {field: operation if isinstance(operation, dict)
+                      else {'set': operation}
+                      for field, operation in update.items()
+                      if field != id_field}
+        matched = {field: operation for field, operation in operations.items()
+                   if any(fnmatchcase(field, pattern) for pattern in fields)}
+        rest = {field: operation for field, operation in operations.items()
+                if field not in matched}
+
+        for part, updates in [(matched, matching), (rest, other)]:
+            if part:
+                part[id_field] = update[id_field]
+                updates.append(part)
+
+    return matching, other
+
+
+def merge_updates(pending: dict,
+                  update: dict,
+                  id_field: str) -> Union[dict, None]:
+    """
+    Merges an atomic update into a pending update of the same document.
+
+    :param dict[str, Any] pending: The pending update or document
+    :param dict[str, Any] update: The atomic update to merge
+    :param str id_field: The ID field of the collection
+    :rtype: dict[str, Any]|None
+    :return: The merged update, or None if the updates cannot be merged
+    """
+    merged = dict(pending)
+    atomic = is_atomic_update(pending, id_field)
+
+    for field, operation in update.items():
+        if field == id_field:
+            continue
+
+        if not isinstance(operation, dict):
+            operation = {'set': operation}
+
+        if not atomic:
+            value = merged.get(field)
+
+            for modifier, operand in operation.items():
+                value = apply_operation(value, modifier, operand)
+
+            merged[field] = value
+
+            continue
+
+        combined = merge_operations(merged.get(field), operation)
+
+        if combined is None:
+            return None
+
+        merged[field] = combined
+
+    return merged
+
+
+def merge_operations(pending: Union[dict, Any, None],
+                     operation: dict) -> Union[dict, None]:
+    """
+    Merges an atomic operation on a field into the pending operation on the
+    same field.
+
+    :param dict|Any|None pending: The pending operation, None if there is none
+    :param dict[str, Any] operation: The operation to merge
+    :rtype: dict[str, Any]|None
+    :return: The merged operation, or None if they cannot be merged
+    """
+    if pending is None or 'set' in operation and len(operation) == 1:
+        return dict(operation)
+
+    if not isinstance(pending, dict):
+        pending = {'set': pending}
+
+    if list(pending.keys()) == ['set']:
+        value = pending['set']
+
+        for modifier, operand in operation.items():
+            value = apply_operation(value, modifier, operand)
+
+        return {'set': value}
+
+    if len(pending) == 1 and len(operation) == 1:
+        modifier = next(iter(operation))
+
+        if modifier in pending and modifier in ['add', 'add-distinct',
+                                                'remove']:
+            return {modifier: as_list(pending[modifier]) +
+                    as_list(operation[modifier])}
+
+    return None
+
+
+def apply_operation(value: Any, modifier: str, operand: Any) -> Any:
+    """
+    Applies an atomic operation to a field value, like Solr does.
+
+    :param Any value: The current value of the field, None if it has none
+    :param str modifier: The atomic operation, such as `set` or `remove`
+    :param Any operand: The value of the operation
+    :rtype: Any
+    :raises ValueError: When the operation is not supported
+    """
+    if 'set' == modifier:
+        return list(operand) if isinstance(operand, tuple) else operand
+
+    current = as_list(value)
+
+    if 'add' == modifier:
+        return current + as_list(operand)
+
+    if 'add-distinct' == modifier:
+        return current + [single_value for single_value in as_list(operand)
+                          if single_value not in current]
+
+    if 'remove' == modifier:
+        removals = as_list(operand)
+
+        return [single_value for single_value in current
+                if single_value not in removals]
+
+    if 'inc' == modifier:
+        return (value or 0) + operand
+
+    raise ValueError('unsupported atomic operation: {0}'.format(modifier))
+
+
+def as_list(value: Any) -> list:
+    """
+    Returns a field value, or operand, as a list of values.
+
+    :param Any value: The value
+    :rtype: list
+    """
+    if value is None:
+        return []
+
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return [value]
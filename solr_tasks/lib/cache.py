@@ -0,0 +1,105 @@
+# encoding: utf-8
+
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Union
+
+
+def cache_max_bytes() -> int:
+    """
+    Returns the amount of bytes of Solr responses a SolrCollection may keep in
+    memory, this information is based on the `SOLR_CACHE_MAX_BYTES`
+    environment variable and defaults to 64 MiB. A value of 0 disables the
+    cache.
+    """
+    return int(os.getenv('SOLR_CACHE_MAX_BYTES', 67108864))
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = None):
+        """
+        Initialize a ResponseCache instance. The cache holds raw response
+        bodies up to a total amount of bytes, evicting the least recently used
+        responses first. Bodies are stored undecoded, so every caller decodes
+        its own copy and can modify it freely.
+
+        Every invalidation starts a new generation. Responses to reads that
+        were sent in an earlier generation are not cached, as they may have
+        been read before the change that invalidated the cache.
+
+        :param int max_bytes: The maximum amount of bytes to keep, defaults to
+                              `cache_max_bytes()`
+        :rtype: ResponseCache
+        """
+        self.max_bytes = cache_max_bytes() if max_bytes is None else max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Union[bytes, None]:
+        """
+        Returns the response cached under the given key and marks it as most
+        recently used.
+
+        :param Hashable key: The key of the response
+        :rtype: bytes|None
+        :return: The cached response, or None if it is not cached
+        """
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+
+                return None
+
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+            return self.entries[key]
+
+    def put(self,
+            key: Hashable,
+            response: bytes,
+            generation: int = None) -> None:
+        """
+        Caches the given response under the given key, evicting the least
+        recently used responses until the cache fits within its bounds.
+        Responses larger than the entire cache, or read in an earlier
+        generation, are not cached.
+
+        :param Hashable key: The key of the response
+        :param bytes response: The response body to cache
+        :param int generation: The generation in which the read was sent,
+                               defaults to the current generation
+        """
+        if len(response) > self.max_bytes:
+            return
+
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+
+            self.entries[key] = response
+            self.size += len(response)
+
+            while self.size > self.max_bytes:
+                self.size -= len(self.entries.popitem(last=False)[1])
+                self.evictions += 1
+
+    def invalidate(self) -> None:
+        """
+        Removes all the cached responses and starts a new generation, so that
+        the responses to reads that are still in flight are not cached.
+        """
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+            self.size = 0
@@ -0,0 +1,105 @@
+# encoding: utf-8
+
+
+import os
+from typing import Union
+
+
+COMMIT_MODES = ['hard', 'soft', 'deferred', 'none']
+
+
+class CommitPolicy:
+    def __init__(self,
+                 mode: str = 'hard',
+                 commit_within: int = None):
+        """
+        Initialize a CommitPolicy instance. The policy determines how the
+        intermediate commits between the phases of a task are executed, the
+        final commit of a task is always a hard commit that opens a new
+        searcher.
+
+        Supported modes for intermediate commits:
+        - `hard`: a hard commit that opens a new searcher
+        - `soft`: a soft commit, visible but not flushed to disk
+        - `deferred`: a hard commit with `openSearcher=false`, flushed to disk
+          but not visible, so the caches of the serving searcher stay intact
+        - `none`: no intermediate commit at all
+
+        Intermediate commits of which the changes are read by the next phase,
+        for example through facet counts, are requested as visible commits:
+        `deferred` and `none` are upgraded to a soft commit for those.
+
+        :param str mode: The mode used for intermediate commits
+        :param int commit_within: The optional amount of milliseconds within
+                                  which Solr should commit each update
+        :rtype: CommitPolicy
+        """
+        if mode not in COMMIT_MODES:
+            raise ValueError('unknown commit mode: {0}'.format(mode))
+
+        self.mode = mode
+        self.commit_within = commit_within
+
+    @classmethod
+    def from_string(cls, policy: str) -> 'CommitPolicy':
+        """
+        Creates a CommitPolicy from a string formatted as
+        `{mode}[:{commit_within}]`, for example `deferred` or `soft:60000`.
+
+        :param str policy: The string representation of the policy
+        :rtype: CommitPolicy
+        """
+        mode, _, commit_within = policy.partition(':')
+
+        return cls(mode, int(commit_within) if commit_within else None)
+
+    @classmethod
+    def from_environment(cls) -> 'CommitPolicy':
+        """
+        Creates a CommitPolicy based on the `SOLR_COMMIT_POLICY` environment
+        variable, see `from_string()`. Defaults to `hard`.
+
+        :rtype: CommitPolicy
+        """
+        return cls.from_string(os.getenv('SOLR_COMMIT_POLICY', 'hard'))
+
+    def update_parameters(self) -> dict:
+        """
+        Returns the request parameters to add to every update request.
+
+        :rtype: dict[str, Any]
+        """
+        if self.commit_within is None:
+            return {}
+
+        return {'commitWithin': self.commit_within}
+
+    def commit_parameters(self,
+                          final: bool = False,
+                          visible: bool = False) -> Union[dict, None]:
+        """
+        Returns the request parameters of a commit.
+
+        :param bool final: Whether this is the final commit of a task, which
+                           always makes all changes visible
+        :param bool visible: Whether the changes have to be visible after the
+                             commit, because they are read afterwards
+        :rtype: dict[str, Any]|None
+        :return: The commit parameters, or None if no commit should be issued
+        """
+        if final or 'hard' == self.mode:
+            return {'commit': 'true'}
+
+        if 'soft' == self.mode or visible:
+            return {'softCommit': 'true'}
+
+        if 'deferred' == self.mode:
+            return {'commit': 'true', 'openSearcher': 'false'}
+
+        return None
+
+    def __str__(self) -> str:
+        if self.commit_within is None:
+            return self.mode
+
+        return '{0}:{1}'.format(self.mode, self.commit_within)
@@ -0,0 +1,233 @@
+# encoding: utf-8
+
+
+import hashlib
+import json
+import logging
+from typing import Any, Iterable
+from solr_tasks.lib.filters import format_value
+
+
+class UpdateDiff:
+    def __init__(self, field: str, id_field: str = 'sys_id'):
+        """
+        Initialize an UpdateDiff instance, which collects the atomic updates of
+        a single field for the documents of which the computed value differs
+        from the current value. Identical values are skipped, as every atomic
+        update forces Solr to rewrite the entire document.
+
+        :param str field: The field to update
+        :param str id_field: The ID field of the collection
+        :rtype: UpdateDiff
+        """
+        self.field = field
+        self.id_field = id_field
+        self.updates = []
+        self.removed = 0
+        self.skipped = 0
+
+    def compare(self, document: dict, value: Any) -> bool:
+        """
+        Compares the computed value of the field with the current value in the
+        given document, and adds an update when they differ. Multi-valued
+        fields are compared regardless of the order of their values. An empty
+        value removes the current values.
+
+        :param dict[str, Any] document: The document holding the ID and the
+                                        current value of the field
+        :param Any value: The computed value of the field
+        :rtype: bool
+        :return: Whether or not an update was added
+        """
+        current = document.get(self.field)
+
+        if same_values(current, value):
+            self.skipped += 1
+
+            return False
+
+        if as_values(value):
+            operation = {'set': value}
+        else:
+            operation = {'remove': as_values(current)}
+            self.removed += 1
+
+        self.updates.append({self.id_field: document[self.id_field],
+                             self.field: operation})
+
+        return True
+
+    def extend(self, diff: 'UpdateDiff') -> None:
+        """
+        Adds the updates and counts of another diff, for example of another
+        field, to this diff.
+
+        :param UpdateDiff diff: The diff to add
+        """
+        self.updates += diff.updates
+        self.removed += diff.removed
+        self.skipped += diff.skipped
+
+    def log_results(self) -> None:
+        """
+        Logs the amount of updated, removed and skipped values.
+        """
+        logging.info(' updated:         %s', len(self.updates) - self.removed)
+        logging.info(' removed:         %s', self.removed)
+        logging.info(' skipped:         %s', self.skipped)
+
+
+class DocumentDiff:
+    def __init__(self,
+                 current: dict,
+                 id_field: str = 'id',
+                 hash_field: str = 'content_hash'):
+        """
+        Initialize a DocumentDiff instance, which compares entire documents
+        with the documents in a collection by their content hash. Documents
+        that are new or of which the hash differs have to be indexed,
+        documents in the collection that are not compared at all have to be
+        deleted.
+
+        :param dict[str, str|None] current: The content hash of every document
+                                            in the collection, keyed by ID
+        :param str id_field: The ID field of the collection
+        :param str hash_field: The field holding the content hash
+        :rtype: DocumentDiff
+        """
+        self.current = current
+        self.id_field = id_field
+        self.hash_field = hash_field
+        self.seen = set()
+        self.added = 0
+        self.changed = 0
+        self.unchanged = 0
+
+    @classmethod
+    def load(cls,
+             collection,
+             id_field: str = 'id',
+             hash_field: str = 'content_hash') -> 'DocumentDiff':
+        """
+        Creates a diff against the documents in the given collection.
+
+        :param SolrCollection collection: The collection to compare with
+        :param str id_field: The ID field of the collection
+        :param str hash_field: The field holding the content hash
+        :rtype: DocumentDiff
+        """
+        current = {}
+
+        for document in collection.iter_documents(fl=[id_field, hash_field],
+                                                  id_field=id_field):
+            current[document[id_field]] = document.get(hash_field)
+
+        return cls(current, id_field, hash_field)
+
+    def compare(self, documents: Iterable) -> list:
+        """
+        Compares the given documents, which hold their ID and content hash,
+        with the documents in the collection.
+
+        :param Iterable[dict[str, Any]] documents: The documents
+        :rtype: list of dict[str, Any]
+        :return: The documents that are new or changed
+        """
+        updates = []
+
+        for document in documents:
+            document_id = document[self.id_field]
+
+            if document_id in self.seen:
+                logging.warning('document %s occurs more than once',
+                                document_id)
+
+            self.seen.add(document_id)
+
+            if document_id not in self.current:
+                self.added += 1
+            elif self.current[document_id] != document[self.hash_field]:
+                self.changed += 1
+            else:
+                self.unchanged += 1
+
+                continue
+
+            updates.append(document)
+
+        return updates
+
+    def deletes(self) -> list:
+        """
+        Returns the IDs of the documents in the collection that were not
+        compared.
+
+        :rtype: list of str
+        """
+        return [document_id for document_id in self.current
+                if document_id not in self.seen]
+
+    def has_changes(self) -> bool:
+        """
+        Returns whether or not any document is added, changed or deleted.
+
+        :rtype: bool
+        """
+        return bool(self.added or self.changed or self.deletes())
+
+    def log_results(self) -> None:
+        """
+        Logs the amount of added, changed, unchanged and deleted documents.
+        """
+        logging.info(' added:           %s', self.added)
+        logging.info(' changed:         %s', self.changed)
+        logging.info(' unchanged:       %s', self.unchanged)
+        logging.info(' deleted:         %s', len(self.deletes()))
+
+
+def content_hash(document: dict, ignore: Iterable = ()) -> str:
+    """
+    Returns a hash of the contents of a document, regardless of the order of
+    its fields.
+
+    :param dict[str, Any] document: The document
+    :param Iterable[str] ignore: The fields to leave out, such as the ID
+    :rtype: str
+    """
+    ignore = set(ignore)
+
+    return hashlib.sha1(json.dumps(
+        {field: value for field, value in document.items()
+         if field not in ignore}, sort_keys=True, ensure_ascii=False
+    ).encode('utf-8')).hexdigest()
+
+
+def as_values(value: Any) -> list:
+    """
+    Returns a field value as a list of values, None being no values at all.
+
+    :param Any value: The field value
+    :rtype: list
+    """
+    if value is None:
+        return []
+
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return [value]
+
+
+def same_values(current: Any, value: Any) -> bool:
+    """
+    Returns whether or not two field values are equal, regardless of the order
+    of the values of multi-valued fields. Values are compared as Solr compares
+    them, so `1` equals `'1'`.
+
+    :param Any current: The current field value
+    :param Any value: The computed field value
+    :rtype: bool
+    """
+    return sorted(format_value(single_value)
+                  for single_value in as_values(current)) == \
+        sorted(format_value(single_value) for single_value in as_values(value))
@@ -0,0 +1,256 @@
+# encoding: utf-8
+
+
+import re
+from functools import lru_cache
+from typing import Any, Union
+
+
+TOKEN = re.compile(r'''\s*(?:
+    (?P<open>\() | (?P<close>\)) |
+    (?P<operator>AND|OR)(?=[\s(]) |
+    (?P<all>\*:\*) |
+    (?P<field>[\w.]+):(?:
+        "(?P<phrase>(?:[^"\\]|\\.)*)" |
+        (?P<exists>\[\*\ TO\ \*\]|\*(?=[\s)]|$)) |
+        (?P<term>(?:[^\s()"\\\[\]{}*?~^:]|\\.)+)
+    )
+)''', re.VERBOSE)
+
+
+class Filter:
+    """
+    A filter query that is evaluated against documents locally. Only filters
+    of which the outcome does not depend on the analysis of the fields are
+    supported: `*:*`, exact terms and phrases, `field:*` and
+    `field:[* TO *]`, combined with `AND`, `OR` and parentheses.
+    """
+
+    def matches(self, document: dict) -> bool:
+        """
+        Returns whether or not the given document matches this filter.
+
+        :param dict[str, Any] document: The document to evaluate
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def fields(self) -> set:
+        """
+        Returns the names of the fields this filter reads.
+
+        :rtype: set of str
+        """
+        return set()
+
+
+class MatchAllFilter(Filter):
+    def matches(self, document: dict) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return '*:*'
+
+
+class TermFilter(Filter):
+    def __init__(self, field: str, value: Union[str, None]):
+        """
+        Initialize a TermFilter instance, matching documents of which any value
+        of the field equals the given value.
+
+        :param str field: The field to match
+        :param str|None value: The value to match, None matches any value
+        :rtype: TermFilter
+        """
+        self.field = field
+        self.value = value
+
+    def matches(self, document: dict) -> bool:
+        values = field_values(document, self.field)
+
+        return bool(values) if self.value is None else self.value in values
+
+    def fields(self) -> set:
+        return {self.field}
+
+    def __repr__(self) -> str:
+        return '{0}:{1}'.format(self.field, '*' if self.value is None
+                                else '"{0}"'.format(self.value))
+
+
+class BooleanFilter(Filter):
+    def __init__(self, operator: str, clauses: list):
+        """
+        Initialize a BooleanFilter instance.
+
+        :param str operator: Either 'AND' or 'OR'
+        :param list of Filter clauses: The clauses to combine
+        :rtype: BooleanFilter
+        """
+        self.operator = operator
+        self.clauses = clauses
+
+    def matches(self, document: dict) -> bool:
+        if 'AND' == self.operator:
+            return all(clause.matches(document) for clause in self.clauses)
+
+        return any(clause.matches(document) for clause in self.clauses)
+
+    def fields(self) -> set:
+        return set().union(*[clause.fields() for clause in self.clauses])
+
+    def __repr__(self) -> str:
+        return '({0})'.format(' {0} '.format(self.operator).join(
+            repr(clause) for clause in self.clauses))
+
+
+@lru_cache(maxsize=1024)
+def parse_filter(query: str) -> Filter:
+    """
+    Parses a single filter query, see `Filter` for the supported syntax. Any
+    other syntax, such as ranges, prefixes, negations or local parameters, is
+    rejected, as is a query without operators between its clauses.
+
+    :param str query: The filter query to parse
+    :rtype: Filter
+    :raises ValueError: When the filter uses unsupported syntax
+    """
+    tokens = []
+    position = 0
+
+    while query[position:].strip():
+        match = TOKEN.match(query, position)
+
+        if match is None:
+            raise ValueError('unsupported syntax at position {0} of filter: '
+                             '{1}'.format(position, query))
+
+        tokens.append(match)
+        position = match.end()
+
+    if not tokens:
+        return MatchAllFilter()
+
+    parsed, position = _parse_or(tokens, 0, query)
+
+    if position != len(tokens):
+        raise ValueError('unexpected input in filter: {0}'.format(query))
+
+    return parsed
+
+
+def parse_filters(filters: Union[str, list, None]) -> Filter:
+    """
+    Parses the given filter query, or filter queries, into a single filter
+    that matches the documents matching all of them.
+
+    :param str|list of str|None filters: The filter queries to parse
+    :rtype: Filter
+    :raises ValueError: When a filter uses unsupported syntax
+    """
+    if filters is None:
+        return MatchAllFilter()
+
+    if isinstance(filters, str):
+        return parse_filter(filters)
+
+    parsed = [parse_filter(single) for single in filters]
+
+    if not parsed:
+        return MatchAllFilter()
+
+    return parsed[0] if len(parsed) == 1 else BooleanFilter('AND', parsed)
+
+
+def _parse_or(tokens: list, position: int, query: str) -> tuple:
+    clauses = []
+
+    while True:
+        clause, position = _parse_and(tokens, position, query)
+        clauses.append(clause)
+
+        if position == len(tokens) or 'OR' != tokens[position]['operator']:
+            break
+
+        position += 1
+
+    return (clauses[0] if len(clauses) == 1
+            else BooleanFilter('OR', clauses)), position
+
+
+def _parse_and(tokens: list, position: int, query: str) -> tuple:
+    clauses = []
+
+    while True:
+        clause, position = _parse_clause(tokens, position, query)
+        clauses.append(clause)
+
+        if position == len(tokens) or 'AND' != tokens[position]['operator']:
+            break
+
+        position += 1
+
+    return (clauses[0] if len(clauses) == 1
+            else BooleanFilter('AND', clauses)), position
+
+
+def _parse_clause(tokens: list, position: int, query: str) -> tuple:
+    if position == len(tokens):
+        raise ValueError('missing clause in filter: {0}'.format(query))
+
+    token = tokens[position]
+
+    if token['open']:
+        clause, position = _parse_or(tokens, position + 1, query)
+
+        if position == len(tokens) or not tokens[position]['close']:
+            raise ValueError('missing closing parenthesis in filter: {0}'
+                             .format(query))
+
+        return clause, position + 1
+
+    if token['all']:
+        return MatchAllFilter(), position + 1
+
+    if token['field'] is None:
+        raise ValueError('unexpected {0} in filter: {1}'.format(
+            token.group().strip(), query))
+
+    if token['exists']:
+        value = None
+    else:
+        value = re.sub(r'\\(.)', r'\1', token['phrase']
+                       if token['phrase'] is not None else token['term'])
+
+    return TermFilter(token['field'], value), position + 1
+
+
+def field_values(document: dict, field: str) -> list:
+    """
+    Returns the values of a document field as a list of strings, as they are
+    compared by Solr. Booleans are represented as `true` and `false`.
+
+    :param dict[str, Any] document: The document
+    :param str field: The name of the field
+    :rtype: list of str
+    """
+    value = document.get(field)
+
+    if value is None:
+        return []
+
+    return [format_value(single_value) for single_value in
+            (value if isinstance(value, list) else [value])]
+
+
+def format_value(value: Any) -> str:
+    """
+    Formats a single field value as a string, as it is compared by Solr.
+
+    :param Any value: The value to format
+    :rtype: str
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+
+    return str(value)
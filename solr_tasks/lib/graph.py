@@ -0,0 +1,316 @@
+# encoding: utf-8
+
+
+import logging
+import sys
+from array import array
+from itertools import accumulate
+from typing import Iterable, Union
+
+
+class RelationGraph:
+    def __init__(self,
+                 fields: Iterable,
+                 uri_field: str = 'sys_uri',
+                 type_field: str = 'sys_type',
+                 key_field: str = 'sys_id'):
+        """
+        Initialize a RelationGraph instance, the relations between objects as
+        a directed graph with an edge per value of a relation field. Every URI
+        is interned to an integer node, URIs that are referred to without
+        being added as an object are nodes without a type.
+
+        Edges are stored per field as two arrays of nodes, which are turned
+        into compressed sparse rows on the first query: an array of offsets
+        per node into an array of adjacent nodes, in both directions. The
+        order of the values of the relation fields is preserved, so are
+        duplicate values.
+
+        :param Iterable[str] fields: The relation fields holding the URIs of
+                                     other objects
+        :param str uri_field: The field holding the URI of an object
+        :param str type_field: The field holding the type of an object
+        :param str key_field: The field holding the ID of an object
+        :rtype: RelationGraph
+        """
+        self.fields = sorted(set(fields))
+        self.uri_field = uri_field
+        self.type_field = type_field
+        self.key_field = key_field
+        self.ids = {}
+        self.uris = []
+        self.keys = []
+        self.types = array('h')
+        self.type_ids = {}
+        self.members = []
+        self.edges = {field: (array('i'), array('i')) for field in self.fields}
+        self.compressed = {}
+
+    @classmethod
+    def load(cls,
+             collection,
+             fq: Union[str, None],
+             fields: Iterable,
+             id_field: str = 'sys_id',
+             export: bool = False,
+             partitions: int = None) -> 'RelationGraph':
+        """
+        Creates the graph of the objects matching the filter query with a
+        single scan of the collection.
+
+        :param SolrCollection collection: The collection to read
+        :param str|None fq: The filter query selecting the objects
+        :param Iterable[str] fields: The relation fields
+        :param str id_field: The ID field of the collection, which is stored
+                             as the key of every object
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable, see
+                            `SolrCollection.iter_batches()`
+        :param int partitions: The amount of partitions to read concurrently,
+                               see `SolrCollection.iter_batches()`
+        :rtype: RelationGraph
+        """
+        graph = cls(fields, key_field=id_field)
+        fl = graph.fields + [graph.uri_field, graph.type_field, id_field]
+
+        for batch in collection.iter_batches(fq, sorted(set(fl)),
+                                             id_field=id_field,
+                                             partitions=partitions,
+                                             export=export):
+            for document in batch:
+                graph.add(document)
+
+        logging.info(' graph of %s objects with %s relations',
+                     sum(len(members) for members in graph.members),
+                     graph.edge_count())
+
+        return graph
+
+    @classmethod
+    def from_documents(cls,
+                       documents: Iterable,
+                       fields: Iterable,
+                       **kwargs) -> 'RelationGraph':
+        """
+        Creates the graph of the given documents.
+
+        :param Iterable[dict] documents: The objects
+        :param Iterable[str] fields: The relation fields
+        :param kwargs: See `RelationGraph.__init__()`
+        :rtype: RelationGraph
+        """
+        graph = cls(fields, **kwargs)
+
+        for document in documents:
+            graph.add(document)
+
+        return graph
+
+    def intern(self, uri: str) -> int:
+        """
+        Returns the node of the given URI, creating a node without a type when
+        the URI is not known yet.
+
+        :param str uri: The URI
+        :rtype: int
+        """
+        node = self.ids.get(uri)
+
+        if node is None:
+            uri = sys.intern(uri)
+            node = self.ids[uri] = len(self.uris)
+            self.uris.append(uri)
+            self.keys.append(None)
+            self.types.append(-1)
+
+        return node
+
+    def add(self, document: dict) -> Union[int, None]:
+        """
+        Adds an object and the values of its relation fields to the graph.
+        Objects without a URI are ignored.
+
+        :param dict[str, Any] document: The object
+        :rtype: int|None
+        :return: The node of the object, None if it has no URI
+        """
+        uri = document.get(self.uri_field)
+
+        if not isinstance(uri, str):
+            return None
+
+        node = self.intern(uri)
+        sys_type = document.get(self.type_field)
+
+        if isinstance(sys_type, (list, tuple)):
+            sys_type = sys_type[0] if sys_type else None
+
+        if sys_type is not None and self.types[node] == -1:
+            if sys_type not in self.type_ids:
+                self.type_ids[sys_type] = len(self.members)
+                self.members.append(array('i'))
+
+            self.types[node] = self.type_ids[sys_type]
+            self.members[self.types[node]].append(node)
+
+        self.keys[node] = document.get(self.key_field)
+
+        for field in self.fields:
+            values = document.get(field)
+
+            if values is None:
+                continue
+
+            sources, targets = self.edges[field]
+
+            for value in values if isinstance(values, (list, tuple)) \
+                    else [values]:
+                sources.append(node)
+                targets.append(self.intern(value))
+
+        self.compressed = {}
+
+        return node
+
+    def node(self, uri: str) -> Union[int, None]:
+        """
+        Returns the node of the given URI.
+
+        :param str uri: The URI
+        :rtype: int|None
+        :return: The node, None if the URI is not part of the graph
+        """
+        return self.ids.get(uri)
+
+    def uri(self, node: int) -> str:
+        """
+        Returns the URI of the given node.
+
+        :param int node: The node
+        :rtype: str
+        """
+        return self.uris[node]
+
+    def key(self, node: int) -> Union[str, None]:
+        """
+        Returns the ID of the object of the given node.
+
+        :param int node: The node
+        :rtype: str|None
+        :return: The ID, None for URIs that were only referred to
+        """
+        return self.keys[node]
+
+    def nodes(self, sys_type: str) -> array:
+        """
+        Returns the nodes of the objects of the given type, in the order they
+        were added.
+
+        :param str sys_type: The type of the objects
+        :rtype: array
+        """
+        if sys_type not in self.type_ids:
+            return array('i')
+
+        return self.members[self.type_ids[sys_type]]
+
+    def neighbours(self,
+                   node: int,
+                   field: str,
+                   sys_type: str = None,
+                   reverse: bool = False) -> list:
+        """
+        Returns the nodes the given node refers to through the given field,
+        or with `reverse` the nodes that refer to the given node through it.
+
+        :param int node: The node
+        :param str field: The relation field
+        :param str sys_type: Only return the nodes of objects of this type
+        :param bool reverse: Whether to follow the edges backwards
+        :rtype: list of int
+        """
+        offsets, adjacent = self._compressed(field, reverse)
+        neighbours = adjacent[offsets[node]:offsets[node + 1]]
+
+        if sys_type is None:
+            return neighbours.tolist()
+
+        type_id = self.type_ids.get(sys_type)
+
+        return [neighbour for neighbour in neighbours
+                if self.types[neighbour] == type_id]
+
+    def degree(self,
+               node: int,
+               field: str,
+               sys_type: str = None,
+               reverse: bool = False,
+               distinct: bool = False) -> int:
+        """
+        Returns the amount of edges of the given node through the given field,
+        see `neighbours()`.
+
+        :param int node: The node
+        :param str field: The relation field
+        :param str sys_type: Only count the edges with objects of this type
+        :param bool reverse: Whether to count the edges towards the node
+        :param bool distinct: Whether to count every adjacent node once
+        :rtype: int
+        """
+        if sys_type is None and not distinct:
+            offsets, _ = self._compressed(field, reverse)
+
+            return offsets[node + 1] - offsets[node]
+
+        neighbours = self.neighbours(node, field, sys_type, reverse)
+
+        return len(set(neighbours)) if distinct else len(neighbours)
+
+    def edge_count(self, field: str = None) -> int:
+        """
+        Returns the amount of edges through the given field, or through all
+        fields.
+
+        :param str field: The relation field, None for all fields
+        :rtype: int
+        """
+        return sum(len(self.edges[edge_field][0])
+                   for edge_field in ([field] if field else self.fields))
+
+    def _compressed(self, field: str, reverse: bool) -> tuple:
+        """
+        Returns the compressed sparse rows of the edges through the given
+        field, building them when needed. The adjacent nodes of node `n` are
+        `adjacent[offsets[n]:offsets[n + 1]]`, in the order the edges were
+        added.
+
+        :param str field: The relation field
+        :param bool reverse: Whether to return the rows of the reverse edges
+        :rtype: tuple of (array, array)
+        :return: The offsets and the adjacent nodes
+        """
+        if (field, reverse) in self.compressed:
+            return self.compressed[(field, reverse)]
+
+        sources, targets = self.edges[field]
+
+        if reverse:
+            sources, targets = targets, sources
+
+        counts = array('q', [0]) * (len(self.uris) + 1)
+
+        for source in sources:
+            counts[source + 1] += 1
+
+        offsets = array('q', accumulate(counts))
+        positions = array('q', offsets)
+        adjacent = array('i', [0]) * len(targets)
+
+        for source, target in zip(sources, targets):
+            adjacent[positions[source]] = target
+            positions[source] += 1
+
+        self.compressed[(field, reverse)] = offsets, adjacent
+
+        return offsets, adjacent
+
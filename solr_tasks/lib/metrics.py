@@ -0,0 +1,248 @@
+# encoding: utf-8
+
+
+import json
+import logging
+import os
+import threading
+from bisect import bisect_left
+
+
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0, 30.0]
+COUNTERS = ['requests', 'errors', 'retries', 'bytes_sent', 'bytes_received',
+            'documents_read', 'documents_written', 'latency_seconds_sum']
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Initialize a MetricsRegistry instance. The registry keeps counters and
+        a latency histogram per combination of Solr collection and endpoint.
+
+        :rtype: MetricsRegistry
+        """
+        self.endpoints = {}
+        self.lock = threading.Lock()
+
+    def record_request(self,
+                       collection: str,
+                       endpoint: str,
+                       seconds: float,
+                       bytes_sent: int = 0,
+                       bytes_received: int = 0,
+                       failed: bool = False) -> None:
+        """
+        Records a single request to a Solr endpoint.
+
+        :param str collection: The Solr collection the request was sent to
+        :param str endpoint: The endpoint of the request, such as `select`
+        :param float seconds: The duration of the request
+        :param int bytes_sent: The amount of bytes sent on the wire
+        :param int bytes_received: The amount of bytes received on the wire
+        :param bool failed: Whether or not the request failed
+        """
+        with self.lock:
+            metrics = self._metrics(collection, endpoint)
+            metrics['requests'] += 1
+            metrics['errors'] += int(failed)
+            metrics['bytes_sent'] += bytes_sent
+            metrics['bytes_received'] += bytes_received
+            metrics['latency_seconds_sum'] += seconds
+            metrics['latency_buckets'][bisect_left(LATENCY_BUCKETS,
+                                                   seconds)] += 1
+
+    def record_documents(self,
+                         collection: str,
+                         endpoint: str,
+                         read: int = 0,
+                         written: int = 0) -> None:
+        """
+        Records the amount of documents read from or written to a Solr
+        endpoint.
+
+        :param str collection: The Solr collection
+        :param str endpoint: The endpoint the documents were transferred with
+        :param int read: The amount of documents read
+        :param int written: The amount of documents written
+        """
+        with self.lock:
+            metrics = self._metrics(collection, endpoint)
+            metrics['documents_read'] += read
+            metrics['documents_written'] += written
+
+    def record_retry(self, collection: str, endpoint: str) -> None:
+        """
+        Records a retry of a request to a Solr endpoint.
+
+        :param str collection: The Solr collection
+        :param str endpoint: The endpoint of the retried request
+        """
+        with self.lock:
+            self._metrics(collection, endpoint)['retries'] += 1
+
+    def to_dict(self) -> dict:
+        """
+        Returns the recorded metrics per collection and endpoint. Histogram
+        buckets are cumulative and keyed by their upper bound, like in the
+        Prometheus exposition format.
+
+        :rtype: dict[str, dict[str, dict[str, Any]]]
+        """
+        result = {}
+
+        with self.lock:
+            for (collection, endpoint), metrics in self.endpoints.items():
+                entry = {counter: metrics[counter] for counter in COUNTERS}
+                entry['latency_buckets'] = self._cumulative_buckets(
+                    metrics['latency_buckets'])
+                result.setdefault(collection, {})[endpoint] = entry
+
+        return result
+
+    def to_prometheus(self, task: str = None) -> str:
+        """
+        Returns the recorded metrics in the Prometheus text exposition format,
+        as read by the textfile collector of the node exporter.
+
+        :param str task: The task that recorded the metrics, added as the
+                         `task` label so that the files of different tasks
+                         do not hold the same series
+        :rtype: str
+        """
+        lines = []
+        metrics = self.to_dict()
+        series = [(self._labels(collection, endpoint, task), entry)
+                  for collection, endpoints in metrics.items()
+                  for endpoint, entry in endpoints.items()]
+
+        for counter in COUNTERS[:-1]:
+            name = 'solr_tasks_{0}_total'.format(counter)
+            lines.append('# TYPE {0} counter'.format(name))
+            lines += ['{0}{{{1}}} {2}'.format(name, labels, entry[counter])
+                      for labels, entry in series]
+
+        name = 'solr_tasks_request_latency_seconds'
+        lines.append('# TYPE {0} histogram'.format(name))
+
+        for labels, entry in series:
+            lines += ['{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                name, labels, bound, count)
+                for bound, count in entry['latency_buckets'].items()]
+            lines.append('{0}_sum{{{1}}} {2}'.format(
+                name, labels, entry['latency_seconds_sum']))
+            lines.append('{0}_count{{{1}}} {2}'.format(
+                name, labels, entry['requests']))
+
+        return '\n'.join(lines) + '\n'
+
+    def _metrics(self, collection: str, endpoint: str) -> dict:
+        """
+        Returns the metrics of the given collection and endpoint, creating
+        them when needed. The caller must hold the lock of this registry.
+
+        :param str collection: The Solr collection
+        :param str endpoint: The Solr endpoint
+        :rtype: dict[str, Any]
+        """
+        key = (collection, endpoint)
+
+        if key not in self.endpoints:
+            self.endpoints[key] = dict.fromkeys(COUNTERS, 0)
+            self.endpoints[key]['latency_buckets'] = \
+                [0] * (len(LATENCY_BUCKETS) + 1)
+
+        return self.endpoints[key]
+
+    @staticmethod
+    def _cumulative_buckets(buckets: list) -> dict:
+        """
+        Converts the given bucket counts into cumulative counts keyed by the
+        upper bound of each bucket.
+
+        :param list of int buckets: The amount of observations per bucket
+        :rtype: dict[str, int]
+        """
+        cumulative = {}
+        total = 0
+
+        for bound, count in zip(LATENCY_BUCKETS + ['+Inf'], buckets):
+            total += count
+            cumulative[str(bound)] = total
+
+        return cumulative
+
+    @staticmethod
+    def _labels(collection: str, endpoint: str, task: str = None) -> str:
+        """
+        Formats the Prometheus labels of the given collection and endpoint,
+        and optionally the task.
+
+        :param str collection: The Solr collection
+        :param str endpoint: The Solr endpoint
+        :param str task: The task that recorded the metrics
+        :rtype: str
+        """
+        labels = [('collection', collection), ('endpoint', endpoint)]
+
+        if task is not None:
+            labels.insert(0, ('task', task))
+
+        return ','.join('{0}="{1}"'.format(name, value.replace('"', '\\"'))
+                        for name, value in labels)
+
+
+def metrics_registry() -> MetricsRegistry:
+    """
+    Returns the MetricsRegistry shared by all SolrCollection instances of this
+    process, creating it on first use.
+
+    :rtype: MetricsRegistry
+    """
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+
+        return _registry
+
+
+def dump_metrics(caller: str) -> None:
+    """
+    Writes the metrics recorded by this process to `{caller}.json` and
+    `{caller}.prom` in the directory set by the `METRICS_LOCATION` environment
+    variable, which defaults to `LOGGING_FILE_LOCATION`. The files are written
+    atomically, so that the node exporter never reads a partial file.
+
+    No files are written if the `METRICS_ENABLE` environment variable is set
+    to `'false'`.
+
+    :param str caller: The script that recorded the metrics, will be used as
+                       the filename of the output
+    """
+    if 'false' == os.getenv('METRICS_ENABLE'):
+        return
+
+    caller = os.path.splitext(os.path.basename(caller))[0]
+    location = os.getenv('METRICS_LOCATION',
+                         os.getenv('LOGGING_FILE_LOCATION', '.'))
+    registry = metrics_registry()
+
+    os.makedirs(location, exist_ok=True)
+
+    for extension, contents in [
+        ('json', json.dumps(registry.to_dict(), indent=2)),
+        ('prom', registry.to_prometheus(caller))
+    ]:
+        filename = os.path.join(location, '{0}.{1}'.format(caller, extension))
+
+        with open(filename + '.tmp', 'w') as fh:
+            fh.write(contents)
+
+        os.replace(filename + '.tmp', filename)
+
+    logging.info('metrics written to %s', os.path.join(location, caller))
@@ -0,0 +1,194 @@
+# encoding: utf-8
+
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatchcase
+from typing import Callable, Iterable
+
+
+class Phase:
+    def __init__(self,
+                 name: str,
+                 run: Callable[[], None],
+                 reads: Iterable,
+                 writes: Iterable,
+                 committed: bool = False):
+        """
+        Initialize a Phase instance, a step of a task declared with the fields
+        it reads and the fields it writes. Field names may contain wildcards,
+        such as `relation_*`.
+
+        :param str name: The name of the phase, used in the timing report
+        :param Callable run: The function executing the phase
+        :param Iterable[str] reads: The fields the phase reads
+        :param Iterable[str] writes: The fields the phase writes
+        :param bool committed: Whether or not the phase reads the index by
+                               other means than scans, such as facet counts,
+                               which only reflect committed writes
+        :rtype: Phase
+        """
+        self.name = name
+        self.run = run
+        self.reads = set(reads)
+        self.writes = set(writes)
+        self.committed = committed
+
+    def conflicts(self, other: 'Phase') -> bool:
+        """
+        Returns whether or not the outcome of this phase, or of the other
+        phase, depends on the order in which they run: one of them writes a
+        field the other reads or writes.
+
+        :param Phase other: The other phase
+        :rtype: bool
+        """
+        return overlaps(self.writes, other.reads | other.writes) \
+            or overlaps(other.writes, self.reads)
+
+    def __repr__(self) -> str:
+        return 'Phase({0})'.format(self.name)
+
+
+class PhaseScheduler:
+    def __init__(self,
+                 phases: list,
+                 commit: Callable[[set], None] = None,
+                 concurrency: int = None):
+        """
+        Initialize a PhaseScheduler instance, which runs phases concurrently
+        whenever they do not conflict, with the same outcome as running them
+        one after another in the given order.
+
+        The phases are divided into waves: every phase runs in the wave after
+        the last wave holding an earlier phase it conflicts with. The phases
+        of a wave run concurrently, waves run one after another. Before a wave
+        with a phase that reads committed data, and depends on earlier
+        phases, `commit` is called with the fields those phases read, which
+        has to make the earlier writes of those fields visible.
+
+        :param list of Phase phases: The phases, in the order they would run
+                                     one after another
+        :param Callable commit: The function committing the writes of the
+                                given fields and opening a searcher on them,
+                                such as `SolrCollection.commit` with `visible`
+                                and `fields`
+        :param int concurrency: The maximum amount of phases to run at the
+                                same time, defaults to the size of the
+                                largest wave
+        :rtype: PhaseScheduler
+        """
+        self.phases = phases
+        self.commit = commit
+        self.concurrency = concurrency
+        self.timings = {}
+
+    def waves(self) -> list:
+        """
+        Divides the phases into waves of phases that can run concurrently.
+
+        :rtype: list of list of Phase
+        """
+        waves = []
+        wave_of = {}
+
+        for number, phase in enumerate(self.phases):
+            wave = 1 + max([wave_of[earlier.name]
+                            for earlier in self.phases[:number]
+                            if phase.conflicts(earlier)], default=-1)
+            wave_of[phase.name] = wave
+
+            if wave == len(waves):
+                waves.append([])
+
+            waves[wave].append(phase)
+
+        return waves
+
+    def run(self) -> None:
+        """
+        Runs all phases wave by wave, and logs the timing report afterwards.
+        An exception raised by a phase is raised once the phases running at
+        the same time have finished, later waves are not started.
+        """
+        waves = self.waves()
+        concurrency = self.concurrency or max(len(wave) for wave in waves)
+        self.timings = {}
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            for number, wave in enumerate(waves):
+                if number > 0 and self.commit is not None \
+                        and any(phase.committed for phase in wave):
+                    logging.info('committing index changes')
+                    self.commit(set().union(*[phase.reads for phase in wave
+                                              if phase.committed]))
+
+                logging.info('running %s', ', '.join(phase.name
+                                                     for phase in wave))
+
+                futures = [executor.submit(self._run_phase, phase, number,
+                                           started) for phase in wave]
+
+                for future in futures:
+                    future.exception()
+
+                for future in futures:
+                    future.result()
+
+        self.log_report(time.monotonic() - started)
+
+    def _run_phase(self, phase: Phase, wave: int, started: float) -> None:
+        """
+        Runs a single phase, recording its start and end relative to the start
+        of the scheduler.
+
+        :param Phase phase: The phase to run
+        :param int wave: The wave the phase is part of
+        :param float started: The start of the scheduler
+        """
+        start = time.monotonic() - started
+
+        try:
+            phase.run()
+        finally:
+            self.timings[phase.name] = (wave, start,
+                                        time.monotonic() - started)
+
+    def log_report(self, elapsed: float) -> None:
+        """
+        Logs the start, end and duration of every phase, and the time saved
+        by running phases concurrently.
+
+        :param float elapsed: The total duration of the phases
+        """
+        serial = sum(end - start for _, start, end in self.timings.values())
+
+        logging.info('phase timings:')
+
+        for phase in self.phases:
+            if phase.name not in self.timings:
+                continue
+
+            wave, start, end = self.timings[phase.name]
+
+            logging.info(' %-24s wave %s  %8.2fs - %8.2fs  (%.2fs)',
+                         phase.name, wave, start, end, end - start)
+
+        logging.info(' elapsed %.2fs, %.2fs one after another, %.2fs '
+                     'overlapped', elapsed, serial, max(serial - elapsed, 0))
+
+
+def overlaps(fields: set, other_fields: set) -> bool:
+    """
+    Returns whether or not any field in one set matches a field in the other
+    set, both of which may contain wildcards.
+
+    :param set of str fields: The fields
+    :param set of str other_fields: The other fields
+    :rtype: bool
+    """
+    return any(field == other_field or fnmatchcase(field, other_field)
+               or fnmatchcase(other_field, field)
+               for field in fields for other_field in other_fields)
@@ -0,0 +1,318 @@
+# encoding: utf-8
+
+
+import gzip
+import json
+import logging
+import os
+import sys
+import threading
+from typing import Any, Union
+
+
+STATE_VERSION = 2
+
+
+def relation_state_file(collection: str) -> str:
+    """
+    Returns the path of the relation state of the given collection, located in
+    the directory set by the `RELATION_STATE_LOCATION` environment variable,
+    which defaults to `LOGGING_FILE_LOCATION`.
+
+    :param str collection: The name of the collection
+    :rtype: str
+    """
+    location = os.getenv('RELATION_STATE_LOCATION',
+                         os.getenv('LOGGING_FILE_LOCATION', '.'))
+
+    return os.path.join(location, '{0}.relations.json.gz'.format(collection))
+
+
+class RelationState:
+    def __init__(self,
+                 fields: list,
+                 objects: dict = None,
+                 id_field: str = 'sys_id',
+                 type_field: str = 'sys_type',
+                 version_field: str = '_version_'):
+        """
+        Initialize a RelationState instance, the relation fields of every
+        object in a collection as they were left by the last run of
+        `generate_relations.py`. Solr changes the `_version_` of a document on
+        every update, whichever process sends it, so an object of which the
+        stored version differs from the version in the collection is not
+        reflected by the state.
+
+        The objects changed since the state was loaded are tracked along with
+        their previously stored fields, see `changed_ids()` and
+        `changed_values()`.
+
+        :param list of str fields: The fields stored per object, besides the
+                                   ID, type and version
+        :param dict[str, dict] objects: The stored fields, keyed by object ID
+        :param str id_field: The ID field of the collection
+        :param str type_field: The field holding the type of an object
+        :param str version_field: The field holding the version of an object
+        :rtype: RelationState
+        """
+        self.fields = sorted(set(fields) | {id_field, type_field,
+                                            version_field})
+        self.objects = objects if objects is not None else {}
+        self.id_field = id_field
+        self.type_field = type_field
+        self.version_field = version_field
+        self.changed = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def load(cls, filename: str, fields: list) -> Union['RelationState', None]:
+        """
+        Loads a state written by `save()`.
+
+        :param str filename: The file to load the state from
+        :param list of str fields: The fields the state must store
+        :rtype: RelationState|None
+        :return: The state, or None if the file does not exist, cannot be read
+                 or stores different fields
+        """
+        try:
+            with gzip.open(filename, 'rt') as fh:
+                contents = json.load(fh)
+        except (OSError, ValueError) as e:
+            logging.info('no usable relation state in %s: %s', filename, e)
+
+            return None
+
+        state = cls(fields)
+
+        if STATE_VERSION != contents.get('version') \
+                or state.fields != contents.get('fields'):
+            logging.info('relation state in %s is outdated', filename)
+
+            return None
+
+        state.objects = {object_id: {field: compact(value)
+                                     for field, value in stored.items()}
+                         for object_id, stored in contents['objects'].items()}
+
+        return state
+
+    @classmethod
+    def scan(cls,
+             collection,
+             fields: list,
+             id_field: str = 'sys_id',
+             export: bool = False) -> 'RelationState':
+        """
+        Creates the state of the given collection with a single scan.
+
+        :param SolrCollection collection: The collection to read
+        :param list of str fields: The fields to store per object
+        :param str id_field: The ID field of the collection
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable
+        :rtype: RelationState
+        """
+        state = cls(fields, id_field=id_field)
+
+        for batch in collection.iter_batches(fl=state.fields,
+                                             id_field=id_field,
+                                             export=export):
+            state.apply_documents(batch)
+
+        state.changed.clear()
+
+        return state
+
+    def save(self, filename: str) -> None:
+        """
+        Writes the state to the given file, atomically.
+
+        :param str filename: The file to write the state to
+        """
+        os.makedirs(os.path.dirname(filename) or '.', exist_ok=True)
+
+        with gzip.open(filename + '.tmp', 'wt') as fh:
+            json.dump({
+                'version': STATE_VERSION,
+                'fields': self.fields,
+                'objects': self.objects
+            }, fh)
+
+        os.replace(filename + '.tmp', filename)
+
+        logging.info('relation state of %s objects written to %s',
+                     len(self.objects), filename)
+
+    def apply_documents(self, documents: list) -> int:
+        """
+        Stores the given documents, replacing the stored fields of objects
+        that are already known.
+
+        :param list of dict documents: The documents as read from Solr
+        :rtype: int
+        :return: The amount of objects that were not known yet
+        """
+        created = 0
+
+        for document in documents:
+            object_id = document[self.id_field]
+            previous = self.objects.get(object_id)
+
+            if previous is None:
+                created += 1
+
+            self.objects[object_id] = {
+                field: compact(value) for field, value in document.items()
+                if field in self.fields and value not in (None, [])
+            }
+
+            if previous is None or self._without_version(previous) != \
+                    self._without_version(self.objects[object_id]):
+                self._record_change(object_id, previous)
+
+        return created
+
+    def apply_updates(self, updates: list) -> None:
+        """
+        Applies atomic updates, as sent to Solr, to the stored objects.
+
+        :param list of dict updates: The atomic updates
+        """
+        for update in updates:
+            stored = self.objects.get(update[self.id_field])
+
+            if stored is None:
+                continue
+
+            self._record_change(update[self.id_field], dict(stored))
+
+            for field, operation in update.items():
+                if field == self.id_field or field not in self.fields:
+                    continue
+
+                if 'set' in operation:
+                    value = compact(operation['set'])
+                elif 'remove' in operation:
+                    removed = operation['remove'] \
+                        if isinstance(operation['remove'], list) \
+                        else [operation['remove']]
+                    value = tuple(single_value
+                                  for single_value in stored.get(field, ())
+                                  if single_value not in removed)
+                else:
+                    continue
+
+                if value in (None, ()):
+                    stored.pop(field, None)
+                else:
+                    stored[field] = value
+
+    def retain(self, object_ids: set) -> int:
+        """
+        Removes the objects that are not in the given set of IDs.
+
+        :param set of str object_ids: The IDs of the objects in the collection
+        :rtype: int
+        :return: The amount of removed objects
+        """
+        removed = [object_id for object_id in self.objects
+                   if object_id not in object_ids]
+
+        for object_id in removed:
+            self._record_change(object_id, self.objects.pop(object_id))
+
+        return len(removed)
+
+    def versions(self) -> dict:
+        """
+        Returns the stored version of every object.
+
+        :rtype: dict[str, Any]
+        """
+        return {object_id: stored.get(self.version_field)
+                for object_id, stored in self.objects.items()}
+
+    def changed_ids(self) -> set:
+        """
+        Returns the IDs of the objects that were created, changed or removed
+        since the state was loaded.
+
+        :rtype: set of str
+        """
+        with self.lock:
+            return set(self.changed)
+
+    def changed_values(self) -> set:
+        """
+        Returns every value of the changed objects, before and after their
+        change. Objects that refer to, or are referred to by, a changed
+        object share a URI with these values; the relations of any other
+        object are not affected by the changes.
+
+        :rtype: set of Any
+        """
+        with self.lock:
+            changes = [(previous, self.objects.get(object_id))
+                       for object_id, previous in self.changed.items()]
+
+        values = set()
+
+        for previous, current in changes:
+            for stored in (previous, current):
+                for field, value in (stored or {}).items():
+                    if field != self.version_field:
+                        values.update(value if isinstance(value, tuple)
+                                      else [value])
+
+        return values
+
+    def objects_by_type(self) -> dict:
+        """
+        Returns the stored objects grouped by their type. Multi-valued fields
+        are stored as tuples.
+
+        :rtype: dict[str, list of dict[str, Any]]
+        """
+        by_type = {}
+
+        for stored in self.objects.values():
+            by_type.setdefault(stored.get(self.type_field), []).append(stored)
+
+        return by_type
+
+    def _without_version(self, stored: dict) -> dict:
+        return {field: value for field, value in stored.items()
+                if field != self.version_field}
+
+    def _record_change(self, object_id: str, previous: Union[dict, None]) \
+            -> None:
+        """
+        Records that the given object changed, keeping the fields it had
+        before its first change.
+
+        :param str object_id: The ID of the changed object
+        :param dict|None previous: The stored fields before the change, None
+                                   for a new object
+        """
+        with self.lock:
+            self.changed.setdefault(object_id, previous)
+
+
+def compact(value: Any) -> Any:
+    """
+    Returns the compact representation of a field value: strings are interned
+    and lists are converted into tuples of interned strings.
+
+    :param Any value: The field value
+    :rtype: Any
+    """
+    if isinstance(value, str):
+        return sys.intern(value)
+
+    if isinstance(value, list):
+        return tuple(sys.intern(single_value)
+                     if isinstance(single_value, str) else single_value
+                     for single_value in value)
+
+    return value
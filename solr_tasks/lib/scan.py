@@ -0,0 +1,225 @@
+# encoding: utf-8
+
+
+import logging
+from fnmatch import fnmatchcase
+from typing import Callable, Union
+from solr_tasks.lib.filters import MatchAllFilter, parse_filters
+
+
+class ScanRequest:
+    def __init__(self,
+                 fq: Union[str, list, None],
+                 fl: Union[list, None],
+                 consumer: Callable = None):
+        """
+        Initialize a ScanRequest instance, the part of a `ScanPlan` that
+        selects the documents matching `fq` with the fields in `fl`. The
+        documents are appended to `documents`, or passed to `consumer` one at a
+        time when given.
+
+        :param str|list of str|None fq: The filter query, or filter queries,
+                                        to apply
+        :param list of str|None fl: The fields to select per document, which
+                                    may contain wildcards, defaults to all
+                                    fields
+        :param Callable consumer: The optional callable that receives every
+                                  matching document
+        :rtype: ScanRequest
+        """
+        self.fq = fq
+        self.fl = list(fl) if fl else None
+        self.consumer = consumer
+        self.documents = []
+        self.query = None
+        self.patterns = [field for field in self.fl if '*' in field] \
+            if self.fl else []
+
+    def accept(self, document: dict, id_field: str) -> bool:
+        """
+        Projects the given document onto the fields of this request and hands
+        it to the consumer, if the document matches the filters.
+
+        :param dict[str, Any] document: The document as read by the scan
+        :param str id_field: The ID field, which is always kept
+        :rtype: bool
+        :return: Whether or not the document matches the filters
+        """
+        if not self.query.matches(document):
+            return False
+
+        if self.fl is None:
+            projection = dict(document)
+        else:
+            projection = {field: value for field, value in document.items()
+                          if field == id_field or field in self.fl
+                          or any(fnmatchcase(field, pattern)
+                                 for pattern in self.patterns)}
+
+        if self.consumer:
+            self.consumer(projection)
+        else:
+            self.documents.append(projection)
+
+        return True
+
+
+class ScanPlan:
+    def __init__(self,
+                 collection,
+                 id_field: str = 'id',
+                 export: bool = False,
+                 partitions: int = None):
+        """
+        Initialize a ScanPlan instance. A plan collects the (fq, fl) requests
+        of a task and executes them as a single scan of the collection: the
+        filters are combined with `OR`, the field lists are merged and every
+        document read is routed to the requests it matches by evaluating
+        their filters locally (see `solr_tasks.lib.filters`).
+
+        Local evaluation compares field values exactly and only supports
+        terms, phrases and existence checks, requests with any other filter
+        are scanned separately. Filters on analyzed text fields are evaluated
+        differently by Solr, documents read by the combined scan that match
+        none of the requests are therefore reported as a warning.
+
+        :param SolrCollection collection: The collection to scan
+        :param str id_field: The ID field of the collection
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable, see
+                            `SolrCollection.iter_batches()`
+        :param int partitions: The amount of partitions to read concurrently,
+                               see `SolrCollection.iter_batches()`
+        :rtype: ScanPlan
+        """
+        self.collection = collection
+        self.id_field = id_field
+        self.export = export
+        self.partitions = partitions
+        self.requests = {}
+
+    def add(self,
+            fq: Union[str, list, None] = None,
+            fl: list = None,
+            consumer: Callable = None) -> ScanRequest:
+        """
+        Adds a request to the plan. Identical requests without a consumer are
+        only planned once and share their ScanRequest.
+
+        :param str|list of str|None fq: The filter query, or filter queries,
+                                        to apply
+        :param list of str fl: The fields to select per document, defaults to
+                               all fields
+        :param Callable consumer: The optional callable that receives every
+                                  matching document, instead of collecting
+                                  them in `ScanRequest.documents`
+        :rtype: ScanRequest
+        """
+        request = ScanRequest(fq, fl, consumer)
+        key = (repr(fq), tuple(sorted(request.fl)) if request.fl else None,
+               id(consumer) if consumer else None)
+
+        return self.requests.setdefault(key, request)
+
+    def execute(self) -> list:
+        """
+        Executes the plan, populating or feeding every request. Requests of
+        which the filters cannot be evaluated locally are executed as scans of
+        their own.
+
+        :rtype: list of ScanRequest
+        :return: The requests of the plan, in the order they were added
+        """
+        requests = list(self.requests.values())
+        combined = []
+
+        for request in requests:
+            try:
+                request.query = parse_filters(request.fq)
+                combined.append(request)
+            except ValueError as e:
+                logging.debug('scanning %s separately: %s', request.fq, e)
+
+                # Solr applies the filters of a separate scan
+                request.query = MatchAllFilter()
+                self._scan(request.fq, request.fl, [request])
+
+        if combined:
+            self._scan(combined_filter(combined), combined_fields(combined),
+                       combined)
+
+        return requests
+
+    def _scan(self,
+              fq: Union[str, list, None],
+              fl: Union[list, None],
+              requests: list) -> None:
+        scanned = 0
+        unmatched = []
+
+        for batch in self.collection.iter_batches(
+                fq, fl, id_field=self.id_field, partitions=self.partitions,
+                export=self.export):
+            scanned += len(batch)
+
+            for document in batch:
+                if not [request for request in requests
+                        if request.accept(document, self.id_field)]:
+                    unmatched.append(document.get(self.id_field))
+
+        logging.info(' scanned %s documents for %s requests', scanned,
+                     len(requests))
+
+        if unmatched:
+            logging.warning('%s documents matching %s match none of the '
+                            'requests when evaluated locally, their filters '
+                            'may address analyzed fields; first: %s',
+                            len(unmatched), fq, unmatched[0])
+
+
+def combined_filter(requests: list) -> Union[str, None]:
+    """
+    Returns a filter query matching every document that matches the filters of
+    at least one of the given requests.
+
+    :param list of ScanRequest requests: The requests to combine
+    :rtype: str|None
+    :return: The combined filter query, or None when a request has no filter
+    """
+    filters = []
+
+    for request in requests:
+        if request.fq is None or request.fq == []:
+            return None
+
+        single = request.fq if isinstance(request.fq, str) \
+            else ' AND '.join('({0})'.format(fq) for fq in request.fq)
+
+        if single not in filters:
+            filters.append(single)
+
+    if len(filters) == 1:
+        return filters[0]
+
+    return ' OR '.join('({0})'.format(single) for single in filters)
+
+
+def combined_fields(requests: list) -> Union[list, None]:
+    """
+    Returns the union of the field lists of the given requests, including the
+    fields their filters are evaluated on.
+
+    :param list of ScanRequest requests: The requests to combine
+    :rtype: list of str|None
+    :return: The combined fields, or None when a request selects all fields
+    """
+    fields = set()
+
+    for request in requests:
+        if request.fl is None:
+            return None
+
+        fields.update(request.fl)
+        fields.update(request.query.fields())
+
+    return sorted(fields)
@@ -0,0 +1,138 @@
+# encoding: utf-8
+
+
+import logging
+import os
+import threading
+
+
+def adaptive_batches() -> bool:
+    """
+    Returns whether or not batch sizes are adapted to the measured requests,
+    this information is based on the `SOLR_ADAPTIVE_BATCHES` environment
+    variable and defaults to `True`.
+    """
+    return 'false' != os.getenv('SOLR_ADAPTIVE_BATCHES')
+
+
+def batch_target_bytes() -> int:
+    """
+    Returns the amount of bytes a single batch should contain, this information
+    is based on the `SOLR_BATCH_TARGET_BYTES` environment variable and defaults
+    to 1 MiB.
+    """
+    return int(os.getenv('SOLR_BATCH_TARGET_BYTES', 1048576))
+
+
+def batch_target_latency() -> float:
+    """
+    Returns the amount of seconds a single batch request should take, this
+    information is based on the `SOLR_BATCH_TARGET_LATENCY` environment
+    variable and defaults to 1 second.
+    """
+    return float(os.getenv('SOLR_BATCH_TARGET_LATENCY', 1.0))
+
+
+class AdaptiveBatchSizer:
+    def __init__(self,
+                 name: str,
+                 initial_size: int,
+                 minimum_size: int = 10,
+                 maximum_size: int = 10000,
+                 target_bytes: int = None,
+                 target_latency: float = None):
+        """
+        Initialize an AdaptiveBatchSizer instance. The sizer keeps a moving
+        average of the bytes and seconds per document of the measured requests
+        and sizes the next batch so that it stays within both the byte budget
+        and the latency target. A batch grows or shrinks by at most a factor 2
+        per measurement.
+
+        :param str name: The name used when logging the batch sizes
+        :param int initial_size: The size of the first batch
+        :param int minimum_size: The smallest batch size to use
+        :param int maximum_size: The largest batch size to use
+        :param int target_bytes: The amount of bytes per batch to aim for,
+                                 defaults to `batch_target_bytes()`
+        :param float target_latency: The amount of seconds per request to aim
+                                     for, defaults to `batch_target_latency()`
+        :rtype: AdaptiveBatchSizer
+        """
+        self.name = name
+        self.current_size = initial_size
+        self.minimum_size = minimum_size
+        self.maximum_size = maximum_size
+        self.target_bytes = batch_target_bytes() if target_bytes is None \
+            else target_bytes
+        self.target_latency = batch_target_latency() \
+            if target_latency is None else target_latency
+        self.bytes_per_document = None
+        self.seconds_per_document = None
+        self.measurements = 0
+        self.lock = threading.Lock()
+
+    def size(self) -> int:
+        """
+        Returns the amount of documents to put in the next batch.
+
+        :rtype: int
+        """
+        with self.lock:
+            return self.current_size
+
+    def record(self,
+               documents: int,
+               size: int,
+               seconds: float) -> None:
+        """
+        Records the measurements of a completed batch request and adjusts the
+        size of the next batch accordingly.
+
+        :param int documents: The amount of documents in the batch
+        :param int size: The amount of bytes sent or received for the batch
+        :param float seconds: The duration of the request
+        """
+        if documents <= 0:
+            return
+
+        with self.lock:
+            self.bytes_per_document = self._average(self.bytes_per_document,
+                                                    size / documents)
+            self.seconds_per_document = self._average(
+                self.seconds_per_document, seconds / documents)
+            self.measurements += 1
+
+            ideal_size = min(
+                self.target_bytes / max(self.bytes_per_document, 1),
+                self.target_latency / max(self.seconds_per_document, 1e-6)
+            )
+            ideal_size = min(max(ideal_size, self.current_size / 2),
+                             self.current_size * 2)
+
+            self.current_size = int(min(max(ideal_size, self.minimum_size),
+                                        self.maximum_size))
+
+    def log_settled_size(self) -> None:
+        """
+        Logs the batch size this sizer settled on, along with the measured
+        averages it is based on.
+        """
+        if self.measurements < 2:
+            return
+
+        logging.info('%s: batch size settled at %s documents (%.0f bytes, '
+                     '%.2f ms per document over %s requests)', self.name,
+                     self.current_size, self.bytes_per_document,
+                     self.seconds_per_document * 1000, self.measurements)
+
+    @staticmethod
+    def _average(average: float, value: float) -> float:
+        """
+        Returns the exponential moving average of the given average and the
+        new value.
+
+        :param float|None average: The current average, if any
+        :param float value: The value to add to the average
+        :rtype: float
+        """
+        return value if average is None else 0.7 * average + 0.3 * value
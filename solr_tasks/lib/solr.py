@@ -1,13 +1,51 @@
 # encoding: utf-8
 
 
+import codecs
+import gzip
 import json
 import logging
 import os
-from typing import Union
-from solr_tasks.lib.utils import setup_request_session
+import queue
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, Union
+from urllib.parse import quote, urlencode
+from solr_tasks.lib.buffer import UpdateBuffer, is_idempotent
+from solr_tasks.lib.cache import ResponseCache
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.metrics import metrics_registry
+from solr_tasks.lib.sizing import AdaptiveBatchSizer, adaptive_batches
+from solr_tasks.lib.utils import shared_request_session
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+COMPRESSION_MIN_SIZE = 1024
+
+DEFAULT_BATCH_SIZE = 200
+
+DEFAULT_DOCUMENTS_PER_REQUEST = 500
+
+MANAGED_RESOURCES = {
+    'stopwords': ('wordSet', 'managedList'),
+    'synonyms': ('synonymMappings', 'managedMap'),
+}
+MANAGED_RESOURCE_CLASSES = {
+    'stopwords': 'org.apache.solr.rest.schema.analysis.'
+                 'ManagedWordSetResource',
+    'synonyms': 'org.apache.solr.rest.schema.analysis.'
+                'ManagedSynonymGraphFilterFactory$SynonymManager',
+}
+
 
 def solr_collections() -> list:
     """
@@ -46,21 +84,270 @@ def solr_auth() -> tuple:
     return os.getenv('SOLR_USERNAME'), os.getenv('SOLR_PASSWORD')
 
 
+def solr_compression() -> bool:
+    """
+    Returns whether or not to compress the requests to and responses from Solr
+    with gzip, this information is based on the `SOLR_HTTP_COMPRESSION`
+    environment variable and defaults to `False`.
+    """
+    return 'true' == os.getenv('SOLR_HTTP_COMPRESSION')
+
+
+def solr_scan_partitions() -> int:
+    """
+    Returns the amount of partitions a full scan of a Solr collection is split
+    into, this information is based on the `SOLR_SCAN_PARTITIONS` environment
+    variable and defaults to 1.
+    """
+    return int(os.getenv('SOLR_SCAN_PARTITIONS', 1))
+
+
+def solr_index_concurrency() -> int:
+    """
+    Returns the amount of update requests to keep in flight while indexing
+    documents, this information is based on the `SOLR_INDEX_CONCURRENCY`
+    environment variable and defaults to 1.
+    """
+    return int(os.getenv('SOLR_INDEX_CONCURRENCY', 1))
+
+
+def solr_index_retries() -> int:
+    """
+    Returns the amount of times a batch of documents that failed transiently
+    is retried, this information is based on the `SOLR_INDEX_RETRIES`
+    environment variable and defaults to 3.
+    """
+    return int(os.getenv('SOLR_INDEX_RETRIES', 3))
+
+
+def solr_index_retry_backoff() -> float:
+    """
+    Returns the amount of seconds to wait before the first retry of a batch
+    of documents, doubled for every subsequent retry. This information is
+    based on the `SOLR_INDEX_RETRY_BACKOFF` environment variable and defaults
+    to 1 second.
+    """
+    return float(os.getenv('SOLR_INDEX_RETRY_BACKOFF', 1.0))
+
+
+def solr_managed_concurrency() -> int:
+    """
+    Returns the amount of DELETE requests to keep in flight while removing
+    values from a managed resource, this information is based on the
+    `SOLR_MANAGED_CONCURRENCY` environment variable and defaults to 4.
+    """
+    return int(os.getenv('SOLR_MANAGED_CONCURRENCY', 4))
+
+
+def solr_managed_replace_threshold() -> int:
+    """
+    Returns the amount of values from which a removal from a managed resource
+    replaces the entire resource rather than deleting the values one by one,
+    this information is based on the `SOLR_MANAGED_REPLACE_THRESHOLD`
+    environment variable and defaults to 1000.
+    """
+    return int(os.getenv('SOLR_MANAGED_REPLACE_THRESHOLD', 1000))
+
+
+def hash_range_filters(field: str, partitions: int) -> list:
+    """
+    Returns a list of `{!hash_range}` filter queries that split the 32-bit hash
+    space of the given field into the given amount of disjoint partitions.
+
+    :param str field: The field to hash, must have docValues
+    :param int partitions: The amount of partitions to create
+    :rtype: list of str
+    """
+    lower_bound = -2 ** 31
+    size = 2 ** 32 // partitions
+    filters = []
+
+    for partition in range(partitions):
+        lower = lower_bound + partition * size
+        upper = lower + size - 1 if partition < partitions - 1 \
+            else 2 ** 31 - 1
+
+        filters.append('{{!hash_range f={0} l={1} u={2}}}'.format(
+            field, lower, upper))
+
+    return filters
+
+
+class JsonSerializer:
+    """
+    Encodes Solr request bodies and decodes Solr responses using the `json`
+    module of the standard library.
+    """
+    name = 'json'
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        """
+        Decodes the given JSON document.
+
+        :param bytes|str data: The UTF-8 encoded JSON document
+        :rtype: Any
+        """
+        return json.loads(data)
+
+    def dumps(self, data: Any) -> bytes:
+        """
+        Encodes the given data as a UTF-8 encoded JSON document.
+
+        :param Any data: The data to encode
+        :rtype: bytes
+        """
+        return json.dumps(data, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
+
+
+class OrjsonSerializer(JsonSerializer):
+    """
+    Encodes Solr request bodies and decodes Solr responses using the optional
+    `orjson` package, which parses directly from bytes.
+    """
+    name = 'orjson'
+
+    def loads(self, data: Union[bytes, str]) -> Any:
+        return orjson.loads(data)
+
+    def dumps(self, data: Any) -> bytes:
+        return orjson.dumps(data)
+
+
+def json_serializer() -> JsonSerializer:
+    """
+    Returns the JSON serializer to use, this information is based on the
+    `SOLR_JSON_BACKEND` environment variable:
+
+    - `'auto'` (default): `orjson` when it is installed, `json` otherwise
+    - `'orjson'`: `orjson`, which must be installed
+    - `'json'`: the `json` module of the standard library
+    """
+    backend = os.getenv('SOLR_JSON_BACKEND', 'auto')
+
+    if 'orjson' == backend or ('auto' == backend and orjson is not None):
+        return OrjsonSerializer()
+
+    return JsonSerializer()
+
+
+def iter_export_documents(chunks: Iterable) -> Iterator[dict]:
+    """
+    Incrementally parses the JSON output of the Solr /export handler, yielding
+    the documents of `response.docs` as soon as they have been received
+    completely. Only the most recently received chunk is held in memory.
+
+    :param Iterable[bytes] chunks: The chunks of the response body
+    :rtype: Iterator[dict[str, Any]]
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    chunks = iter(chunks)
+    buffer = ''
+    docs = None
+
+    while docs is None:
+        chunk = next(chunks, None)
+
+        if chunk is None:
+            raise ValueError('export response contains no documents')
+
+        buffer += utf8.decode(chunk)
+        docs = re.search(r'"docs"\s*:\s*\[', buffer)
+
+    index = docs.end()
+
+    while True:
+        while index < len(buffer) and buffer[index] in ' \t\r\n,':
+            index += 1
+
+        if index < len(buffer) and buffer[index] == ']':
+            return
+
+        try:
+            if index == len(buffer):
+                raise ValueError('incomplete document')
+
+            document, index = decoder.raw_decode(buffer, index)
+        except ValueError:
+            chunk = next(chunks, None)
+
+            if chunk is None:
+                raise ValueError('export response ended unexpectedly')
+
+            buffer = buffer[index:] + utf8.decode(chunk)
+            index = 0
+
+            continue
+
+        if 'EXCEPTION' in document:
+            raise ValueError('export failed: {0}'.format(
+                document['EXCEPTION']))
+
+        yield document
+
+
 class SolrCollection:
-    def __init__(self, collection: str):
+    def __init__(self,
+                 collection: str,
+                 serializer: 'JsonSerializer' = None,
+                 commit_policy: CommitPolicy = None):
         """
         Initialize a SolrCollection instance.
 
         :param str collection: The name of the Solr collection
+        :param JsonSerializer serializer: The serializer used for the JSON
+                                          requests and responses, defaults to
+                                          `json_serializer()`
+        :param CommitPolicy commit_policy: The policy used for commits and
+                                           updates, defaults to
+                                           `CommitPolicy.from_environment()`
         :rtype: SolrCollection
         """
         self.solr_host = solr_host()
         self.collection = collection
-        self.request_session = setup_request_session()
-        self.request_session.auth = solr_auth()
+        self.request_session = shared_request_session()
+        self.auth = solr_auth()
+        self.serializer = json_serializer() if serializer is None \
+            else serializer
+        self.commit_policy = CommitPolicy.from_environment() \
+            if commit_policy is None else commit_policy
+        self.exportable_fields = {}
+        self.dead_letter_lock = threading.Lock()
+        self.response_cache = ResponseCache()
+        self.update_buffer = None
+        self.buffer_lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.metrics = metrics_registry()
+        self.compression = solr_compression()
+        self.transfer_lock = threading.Lock()
+        self.transfer_statistics = {
+            'requests': 0,
+            'bytes_sent': 0,
+            'bytes_sent_uncompressed': 0,
+            'bytes_received': 0,
+            'bytes_received_decompressed': 0,
+        }
 
-    def get_facet_counts(self, field: str) -> dict:
-        return self.select_documents({
+    def get_facet_counts(self,
+                         field: str,
+                         fq: str = None,
+                         mincount: int = None) -> Union[dict, None]:
+        """
+        Retrieve the amount of documents per value of the given field.
+
+        :param str field: The field to facet on
+        :param str fq: An optional filter query, restricting the documents
+                       that are counted
+        :param int mincount: The minimum amount of documents of the returned
+                             values, Solr returns every indexed value by
+                             default, including those that only occur in
+                             documents excluded by `fq`
+        :rtype: dict[str, int]|None
+        :return: The amount of documents keyed by value, or None if the
+                 request failed
+        """
+        query = {
             'facet': 'true',
             'facet.field': field,
             'f.{0}.facet.limit'.format(field): -1,
@@ -70,7 +357,20 @@ class SolrCollection:
             'wt': 'json',
             'json.nl': 'map',
             'spellcheck': 'false',
-        })['facet_counts']['facet_fields'][field]
+        }
+
+        if fq is not None:
+            query['fq'] = fq
+
+        if mincount is not None:
+            query['facet.mincount'] = mincount
+
+        response = self._select_documents(query, cache=True)[0]
+
+        if response is None:
+            return None
+
+        return response['facet_counts']['facet_fields'][field]
 
     def document_count(self,
                        selector: str = '*:*') -> Union[int, None]:
@@ -104,104 +404,735 @@ class SolrCollection:
         :return: The response as a JSON dictionary, or None if the request
                  failed
         """
-        response = self._execute_request(self._create_collection_request(
-            handler, {'params': query})
+        return self._select_documents(query, handler)[0]
+
+    def _select_documents(self,
+                          query: dict,
+                          handler: str = 'select',
+                          cache: bool = False) -> tuple:
+        """
+        Select and return documents from the Solr index that match the given
+        query, along with the size of the response.
+
+        :param dict[str, Any] query: The Solr query to perform to identify the
+                                     documents to select
+        :param str handler: The Solr requestHandler to use
+        :param bool cache: Whether or not to cache the response, see
+                           `_execute_read_request()`
+        :rtype: tuple[dict[str, Any]|None, int]
+        :return: The response as a JSON dictionary, or None if the request
+                 failed, and the size of the response body in bytes
+        """
+        response = self._execute_read_request(
+            self._create_collection_request(handler, {'params': query}), cache
         )
 
         if not response:
-            return None
+            return None, 0
 
-        return json.loads(response)
+        return self.serializer.loads(response), len(response)
 
     def select_all_documents(self,
                              fq: str = None,
                              fl: list = None,
-                             documents_per_request: int = 500,
-                             id_field: str = 'id') -> list:
+                             documents_per_request: int = None,
+                             id_field: str = 'id',
+                             partitions: int = None,
+                             export: bool = False) -> list:
         """
         Selects all the documents from the Solr collection and returns them as a
         JSON object. Uses a Solr cursor to iterate over the entire index.
 
+        Prefer `iter_documents()` or `iter_batches()` when the documents can be
+        processed one at a time, as this method keeps the entire result set in
+        memory.
+
         :param str fq: The filter query to apply
         :param list of str fl: The fields to select per document, defaults to
                                '*'
         :param int documents_per_request: The amount of documents to retrieve
-                                          per request
+                                          per request, adapted to the
+                                          measured requests when omitted
         :param str id_field: The ID field of the collection to sort on
+        :param int partitions: The amount of partitions to read concurrently,
+                               see `iter_batches()`
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable, see `iter_batches()`
         :rtype: list of dict[str, Any]
         :return: The complete list of documents selected from the Solr
                  collection
         """
-        selected_documents = []
-        got_all_documents = False
-        cursor = '*'
+        return list(self.iter_documents(fq, fl, documents_per_request,
+                                        id_field, partitions, export))
+
+    def iter_documents(self,
+                       fq: str = None,
+                       fl: list = None,
+                       documents_per_request: int = None,
+                       id_field: str = 'id',
+                       partitions: int = None,
+                       export: bool = False) -> Iterator[dict]:
+        """
+        Lazily selects all the documents from the Solr collection, one document
+        at a time. See `iter_batches()` for the details of the iteration.
+
+        :param str fq: The filter query to apply
+        :param list of str fl: The fields to select per document, defaults to
+                               '*'
+        :param int documents_per_request: The amount of documents to retrieve
+                                          per request, adapted to the
+                                          measured requests when omitted
+        :param str id_field: The ID field of the collection to sort on
+        :param int partitions: The amount of partitions to read concurrently,
+                               see `iter_batches()`
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable, see `iter_batches()`
+        :rtype: Iterator[dict[str, Any]]
+        """
+        for batch in self.iter_batches(fq, fl, documents_per_request,
+                                       id_field, partitions, export):
+            yield from batch
+
+    def iter_batches(self,
+                     fq: str = None,
+                     fl: list = None,
+                     documents_per_request: int = None,
+                     id_field: str = 'id',
+                     partitions: int = None,
+                     export: bool = False) -> Iterator[list]:
+        """
+        Lazily selects all the documents from the Solr collection, yielding
+        them one cursor page at a time. Uses a Solr cursor to iterate over the
+        entire index, the next page is only requested once the previous page
+        has been consumed.
+
+        When more than one partition is requested the index is split into
+        disjoint `{!hash_range}` partitions on the `id_field`, which are read
+        concurrently by separate cursors. The pages of all partitions are
+        merged into a single stream, in no particular order. Hash range
+        filters require docValues on the `id_field`.
+
+        When `export` is set and every field in `fl` is exportable (see
+        `exportable()`), the documents are streamed from the /export handler
+        instead of being paged through with a cursor. A scan falls back to a
+        cursor when a field is not exportable or the /export request fails.
 
+        :param str fq: The filter query to apply
+        :param list of str fl: The fields to select per document, defaults to
+                               '*'
+        :param int documents_per_request: The amount of documents to retrieve
+                                          per request, adapted to the
+                                          measured requests when omitted
+        :param str id_field: The ID field of the collection to sort on
+        :param int partitions: The amount of partitions to read concurrently,
+                               defaults to `solr_scan_partitions()`
+        :param bool export: Whether to use the /export handler when all the
+                            fields are exportable
+        :rtype: Iterator[list of dict[str, Any]]
+        """
         if fl and id_field not in fl:
-            fl.append(id_field)
-
-        while not got_all_documents:
-            query = {k: v for k, v in {
-                'q': '*:*',
-                'fq': fq,
-                'fl': '*' if not fl else ','.join(fl),
-                'rows': documents_per_request,
-                'sort': '{0} asc'.format(id_field),
-                'cursorMark': cursor,
-                'omitHeader': 'true',
-                'wt': 'json'
-            }.items() if v is not None}
+            fl = list(fl) + [id_field]
+
+        if partitions is None:
+            partitions = solr_scan_partitions()
+
+        if export and fl and self.exportable(fl):
+            reader = self._iter_export_batches
+        else:
+            reader = self._iter_cursor_batches
+
+        if partitions <= 1:
+            batches = reader(fq, fl, documents_per_request, id_field)
+        else:
+            batches = self._iter_partitioned_batches(reader, fq, fl,
+                                                     documents_per_request,
+                                                     id_field, partitions)
 
-            results = self.select_documents(query)
-            new_cursor = results['nextCursorMark']
-            documents = results['response']['docs']
+        if self.update_buffer is not None:
+            return self._overlay_batches(batches, fl)
 
-            logging.debug('found %s documents for cursor %s, next cursor: %s',
-                          str(len(documents)), cursor, new_cursor)
+        return batches
 
-            if len(documents) > 0:
-                selected_documents.append(documents)
+    def _overlay_batches(self,
+                         batches: Iterator[list],
+                         fl: Union[list, None]) -> Iterator[list]:
+        """
+        Applies the buffered updates to the documents read, see
+        `buffered_updates()`.
+
+        :param Iterator[list of dict] batches: The batches as read from Solr
+        :param list of str|None fl: The fields that were read
+        :rtype: Iterator[list of dict[str, Any]]
+        """
+        for batch in batches:
+            update_buffer = self.update_buffer
 
-            if cursor == new_cursor:
-                got_all_documents = True
+            yield batch if update_buffer is None else \
+                [update_buffer.overlay(document, fl) for document in batch]
 
-            if len(documents) < documents_per_request:
-                got_all_documents = True
+    def exportable(self, fields: list) -> bool:
+        """
+        Determines whether all the given fields can be read with the /export
+        handler, which requires every field to have docValues. The field
+        definitions are retrieved from the Schema API, including dynamic fields,
+        and are remembered for the lifetime of this instance.
 
-            cursor = new_cursor
+        :param list of str fields: The names of the fields to check
+        :rtype: bool
+        :return: Whether or not all the fields have docValues
+        """
+        if any('*' in field for field in fields):
+            return False
+
+        unknown_fields = [field for field in fields
+                          if field not in self.exportable_fields]
+
+        if unknown_fields:
+            response = self._execute_read_request(
+                self._create_collection_request('schema/fields?{0}'.format(
+                    urlencode({
+                        'fl': ','.join(unknown_fields),
+                        'includeDynamic': 'true',
+                        'showDefaults': 'true',
+                        'wt': 'json'
+                    })
+                ))
+            )
+            definitions = self.serializer.loads(response)['fields'] \
+                if response else []
+            doc_values = {definition['name']: definition.get('docValues',
+                                                             False)
+                          for definition in definitions}
+
+            for field in unknown_fields:
+                self.exportable_fields[field] = doc_values.get(field, False)
+
+        return all(self.exportable_fields[field] for field in fields)
+
+    def _iter_cursor_batches(self,
+                             fq: Union[str, list, None],
+                             fl: Union[list, None],
+                             documents_per_request: Union[int, None],
+                             id_field: str) -> Iterator[list]:
+        """
+        Iterates over the documents matching the given filter queries with a
+        single Solr cursor.
+
+        :param str|list of str|None fq: The filter query, or filter queries,
+                                        to apply
+        :param list of str|None fl: The fields to select per document
+        :param int|None documents_per_request: The amount of documents to
+                                               retrieve per request, adapted to
+                                               the measured requests if None
+        :param str id_field: The ID field of the collection to sort on
+        :rtype: Iterator[list of dict[str, Any]]
+        """
+        cursor = '*'
+        sizer = self._create_batch_sizer('scan', documents_per_request,
+                                         DEFAULT_DOCUMENTS_PER_REQUEST)
 
-        return [document for batch in selected_documents for document in batch]
+        if documents_per_request is None:
+            documents_per_request = DEFAULT_DOCUMENTS_PER_REQUEST
+
+        try:
+            while True:
+                rows = sizer.size() if sizer else documents_per_request
+                query = {k: v for k, v in {
+                    'q': '*:*',
+                    'fq': fq,
+                    'fl': '*' if not fl else ','.join(fl),
+                    'rows': rows,
+                    'sort': '{0} asc'.format(id_field),
+                    'cursorMark': cursor,
+                    'omitHeader': 'true',
+                    'wt': 'json'
+                }.items() if v is not None}
+
+                start = time.monotonic()
+                results, size = self._select_documents(query)
+                new_cursor = results['nextCursorMark']
+                documents = results['response']['docs']
+
+                if sizer:
+                    sizer.record(len(documents), size,
+                                 time.monotonic() - start)
+
+                self.metrics.record_documents(self.collection, 'select',
+                                              read=len(documents))
+                logging.debug('found %s documents for cursor %s, next '
+                              'cursor: %s', str(len(documents)), cursor,
+                              new_cursor)
+
+                if len(documents) > 0:
+                    yield documents
+
+                if cursor == new_cursor:
+                    return
+
+                if len(documents) < rows:
+                    return
+
+                cursor = new_cursor
+        finally:
+            if sizer:
+                sizer.log_settled_size()
+
+    def _create_batch_sizer(self,
+                            operation: str,
+                            size: Union[int, None],
+                            initial_size: int) \
+            -> Union[AdaptiveBatchSizer, None]:
+        """
+        Creates the AdaptiveBatchSizer for a scan or indexing operation when no
+        fixed size is given and adaptive batch sizes are enabled.
+
+        :param str operation: The name of the operation, used for logging
+        :param int|None size: The fixed size requested by the caller, if any
+        :param int initial_size: The size of the first adaptive batch
+        :rtype: AdaptiveBatchSizer|None
+        :return: The sizer to use, or None if a fixed size should be used,
+                 which is `initial_size` when no size is given
+        """
+        if size is not None or not adaptive_batches():
+            return None
+
+        return AdaptiveBatchSizer('{0} {1}'.format(self.collection, operation),
+                                  initial_size)
+
+    def _iter_export_batches(self,
+                             fq: Union[str, list, None],
+                             fl: list,
+                             documents_per_request: int,
+                             id_field: str) -> Iterator[list]:
+        """
+        Iterates over the documents matching the given filter queries by
+        streaming them from the /export handler. The response is parsed
+        incrementally and yielded in batches of `documents_per_request`
+        documents. Falls back to a cursor when the /export request fails before
+        any documents have been read.
+
+        :param str|list of str|None fq: The filter query, or filter queries,
+                                        to apply
+        :param list of str fl: The exportable fields to select per document
+        :param int|None documents_per_request: The amount of documents to
+                                               yield per batch
+        :param str id_field: The ID field of the collection to sort on
+        :rtype: Iterator[list of dict[str, Any]]
+        """
+        request = self._create_collection_request('export')
+        query = {k: v for k, v in {
+            'q': '*:*',
+            'fq': fq,
+            'fl': ','.join(fl),
+            'sort': '{0} asc'.format(id_field),
+            'wt': 'json'
+        }.items() if v is not None}
+
+        try:
+            response = self.request_session.request(
+                method='GET', url=request.get('url'), params=query,
+                auth=self.auth, headers=request.get('headers'), stream=True
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            self.metrics.record_request(self.collection, 'export',
+                                        e.response.elapsed.total_seconds()
+                                        if e.response is not None else 0,
+                                        failed=True)
+            logging.warning('export failed, falling back to a cursor;')
+            logging.warning(' call:     %s', request.get('url'))
+            logging.warning(' error:    %s', e)
+
+            yield from self._iter_cursor_batches(fq, fl, documents_per_request,
+                                                 id_field)
+            return
+
+        received = [0]
+
+        def chunks() -> Iterator[bytes]:
+            for chunk in response.iter_content(chunk_size=65536):
+                received[0] += len(chunk)
+
+                yield chunk
+
+        with response:
+            documents = iter_export_documents(chunks())
+            batch_size = documents_per_request or \
+                DEFAULT_DOCUMENTS_PER_REQUEST
+            batches = iter(lambda: list(islice(documents, batch_size)), [])
+
+            for batch in batches:
+                self.metrics.record_documents(self.collection, 'export',
+                                              read=len(batch))
+                logging.debug('exported %s documents', str(len(batch)))
+
+                yield batch
+
+        self._record_transfer(request, response, received[0])
+        self.metrics.record_request(self.collection, 'export',
+                                    response.elapsed.total_seconds(),
+                                    bytes_received=received[0])
+
+    def _iter_partitioned_batches(self,
+                                  reader: Callable,
+                                  fq: Union[str, None],
+                                  fl: Union[list, None],
+                                  documents_per_request: Union[int, None],
+                                  id_field: str,
+                                  partitions: int) -> Iterator[list]:
+        """
+        Iterates over the documents matching the given filter query with one
+        reader per hash range partition of the `id_field`. The partitions are
+        read concurrently, at most two pages per partition are buffered before
+        the readers wait for the pages to be consumed.
+
+        :param Callable reader: The method reading the batches of a single
+                                partition
+        :param str|None fq: The filter query to apply
+        :param list of str|None fl: The fields to select per document
+        :param int|None documents_per_request: The amount of documents to
+                                               retrieve per request
+        :param str id_field: The ID field of the collection to sort on
+        :param int partitions: The amount of partitions to read concurrently
+        :rtype: Iterator[list of dict[str, Any]]
+        """
+        pages = queue.Queue(maxsize=partitions * 2)
+        stopped = threading.Event()
+        finished = object()
+
+        def read_partition(partition_fq: str) -> None:
+            try:
+                for batch in reader([fq, partition_fq] if fq
+                                    else partition_fq, fl,
+                                    documents_per_request, id_field):
+                    while not stopped.is_set():
+                        try:
+                            pages.put(batch, timeout=0.1)
+                            break
+                        except queue.Full:
+                            continue
+
+                    if stopped.is_set():
+                        return
+            except Exception as e:
+                pages.put(e)
+            finally:
+                pages.put(finished)
+
+        with ThreadPoolExecutor(max_workers=partitions) as executor:
+            for partition_fq in hash_range_filters(id_field, partitions):
+                executor.submit(read_partition, partition_fq)
+
+            remaining = partitions
+
+            try:
+                while remaining > 0:
+                    page = pages.get()
+
+                    if page is finished:
+                        remaining -= 1
+                    elif isinstance(page, Exception):
+                        raise page
+                    else:
+                        yield page
+            finally:
+                stopped.set()
+
+                while remaining > 0:
+                    if pages.get() is finished:
+                        remaining -= 1
 
     def index_documents(self,
-                        documents: list,
+                        documents: Iterable,
                         commit: bool = True,
-                        batch_size: int = 200) -> bool:
+                        batch_size: int = None,
+                        concurrency: int = None) -> bool:
         """
         Add the given documents to the index of the Solr collection.
 
-        :param list of dict[str, Any] documents: The list of dictionaries that
-                                                 represent the documents to
-                                                 index
-        :param bool commit: Whether or not to commit the changes made to the
-                            Solr collection to the index
+        With a concurrency larger than 1 the batches are sent by a pool of
+        threads, keeping at most `concurrency` update requests in flight. The
+        commit is only issued once all batches have been processed.
+
+        :param Iterable[dict[str, Any]] documents: The dictionaries that
+                                                   represent the documents to
+                                                   index, consumed one batch
+                                                   at a time
+        :param bool commit: Whether or not to issue a final commit, making the
+                            changes made to the Solr collection visible
         :param int batch_size: The amount of documents to send to Solr per
-                               batch, defaults to 200
+                               batch, adapted to the measured requests when
+                               omitted
+        :param int concurrency: The amount of update requests to keep in
+                                flight, defaults to `solr_index_concurrency()`
         :rtype: bool
         :return: Whether or not the documents were added to the index
         """
-        batches = [documents[i:i+batch_size]
-                   for i in range(0, len(documents), batch_size)]
+        with self.buffer_lock:
+            update_buffer = self.update_buffer
+
+        if update_buffer is not None:
+            for document in documents:
+                update_buffer.add(document)
+
+            return self.commit(final=True) if commit else True
 
-        results = [self._execute_request(self._create_collection_request(
-            'update', batch)
-        ) for batch in batches]
+        result = self._send_documents(documents, batch_size, concurrency)
 
         if commit:
-            self._execute_request(self._create_collection_request(
-                'update?commit=true')
-            )
+            self.commit(final=True)
+
+        return result
+
+    def _send_documents(self,
+                        documents: Iterable,
+                        batch_size: int = None,
+                        concurrency: int = None) -> bool:
+        """
+        Sends the given documents to the update handler of the Solr collection
+        in batches, bypassing the update buffer, without a commit. See
+        `index_documents()`.
+
+        :param Iterable[dict[str, Any]] documents: The documents to index
+        :param int batch_size: The amount of documents to send to Solr per
+                               batch, adapted to the measured requests when
+                               omitted
+        :param int concurrency: The amount of update requests to keep in
+                                flight, defaults to `solr_index_concurrency()`
+        :rtype: bool
+        :return: Whether or not the documents were added to the index
+        """
+        if concurrency is None:
+            concurrency = solr_index_concurrency()
+
+        sizer = self._create_batch_sizer('index', batch_size,
+                                         DEFAULT_BATCH_SIZE)
+        documents = iter(documents)
+
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
+
+        batches = enumerate(iter(lambda: list(islice(
+            documents, sizer.size() if sizer else batch_size
+        )), []))
+
+        if concurrency <= 1:
+            results = [self._index_batch(number, batch, sizer)
+                       for number, batch in batches]
+        else:
+            results = []
+
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                in_flight = set()
+
+                for number, batch in batches:
+                    if len(in_flight) >= concurrency:
+                        done, in_flight = wait(in_flight,
+                                               return_when=FIRST_COMPLETED)
+                        results += [future.result() for future in done]
+
+                    in_flight.add(executor.submit(self._index_batch, number,
+                                                  batch, sizer))
+
+                results += [future.result() for future in in_flight]
+
+        if sizer:
+            sizer.log_settled_size()
 
         return all(results)
 
+    def _index_batch(self,
+                     number: int,
+                     batch: list,
+                     sizer: AdaptiveBatchSizer = None) -> bool:
+        """
+        Sends a single batch of documents to the update handler of the Solr
+        collection.
+
+        :param int number: The sequence number of the batch, used for reporting
+        :param list of dict[str, Any] batch: The documents to index
+        :param AdaptiveBatchSizer sizer: The sizer to report the request
+                                         measurements to, if any
+        :rtype: bool
+        :return: Whether or not the batch was added to the index
+        """
+        indexed, error = self._submit_batch(batch, sizer)
+
+        if indexed is True:
+            logging.debug('indexed batch %s: %s documents', number, len(batch))
+
+            return True
+
+        if indexed is None:
+            self._write_dead_letters(batch, 'transient', error)
+            failed = batch
+        elif not all(is_idempotent(document) for document in batch):
+            logging.warning('batch %s was rejected and holds updates that '
+                            'cannot be resent safely, not bisecting %s '
+                            'documents: %s', number, len(batch), error)
+            self._write_dead_letters(batch, 'rejected', error)
+            failed = batch
+        else:
+            logging.warning('batch %s was rejected, bisecting %s documents: '
+                            '%s', number, len(batch), error)
+            failed = self._bisect_batch(batch, error)
+
+        logging.error('batch %s: %s of %s documents could not be indexed, '
+                      'written to %s', number, len(failed), len(batch),
+                      self._dead_letter_file())
+
+        return not failed
+
+    def _submit_batch(self,
+                      batch: list,
+                      sizer: AdaptiveBatchSizer = None) -> tuple:
+        """
+        Sends a batch of documents to the update handler of the Solr
+        collection. Transient failures (connection errors, HTTP 429 and HTTP
+        5xx) are retried with an exponential backoff, the retries reuse the
+        encoded request body.
+
+        :param list of dict[str, Any] batch: The documents to index
+        :param AdaptiveBatchSizer sizer: The sizer to report the request
+                                         measurements to, if any
+        :rtype: (bool|None, str|None)
+        :return: True if the batch was indexed, False if Solr rejected the
+                 batch and None if the batch still failed transiently after
+                 all retries, along with the error of the failure
+        """
+        request = self._create_collection_request(
+            self._update_handler(self.commit_policy.update_parameters()), batch
+        )
+        retries = solr_index_retries()
+
+        for attempt in range(retries + 1):
+            start = time.monotonic()
+
+            try:
+                response = self._send_request(request)
+            except requests.exceptions.RequestException as e:
+                response = e.response
+
+                if response is not None and response.status_code < 500 \
+                        and 429 != response.status_code:
+                    return False, self._error_message(response)
+
+                if attempt == retries:
+                    return None, str(e)
+
+                delay = solr_index_retry_backoff() * 2 ** attempt
+                self.metrics.record_retry(self.collection, 'update')
+
+                if response is not None and \
+                        response.headers.get('Retry-After', '').isdigit():
+                    delay = max(delay, int(response.headers['Retry-After']))
+
+                logging.warning('transient failure indexing %s documents, '
+                                'retrying in %.1fs: %s', len(batch), delay, e)
+                time.sleep(delay)
+
+                continue
+
+            if sizer:
+                sizer.record(len(batch), request.get('size'),
+                             time.monotonic() - start)
+
+            self.metrics.record_documents(self.collection, 'update',
+                                          written=len(batch))
+
+            return True, None
+
+    def _bisect_batch(self, batch: list, error: str = None) -> list:
+        """
+        Indexes the given failed batch by splitting it in halves until the
+        documents Solr rejects are isolated. Documents that are rejected, or
+        that keep failing transiently, are written to the dead letter file.
+
+        Solr processes the documents of a batch in order, so documents
+        preceding a rejected document may already have been indexed. Resending
+        them is only harmless for idempotent updates, so only batches of
+        entire documents and atomic `set` updates are bisected, see
+        `is_idempotent()`.
+
+        :param list of dict[str, Any] batch: The documents of the failed batch
+        :param str error: The error Solr reported for the batch, if known
+        :rtype: list of dict[str, Any]
+        :return: The documents that could not be indexed
+        """
+        if len(batch) == 1:
+            self._write_dead_letters(batch, 'rejected', error)
+
+            return batch
+
+        failed = []
+        middle = len(batch) // 2
+
+        for half in [batch[:middle], batch[middle:]]:
+            indexed, error = self._submit_batch(half)
+
+            if indexed is True:
+                continue
+
+            if indexed is None:
+                self._write_dead_letters(half, 'transient', error)
+                failed += half
+            else:
+                failed += self._bisect_batch(half, error)
+
+        return failed
+
+    def _write_dead_letters(self,
+                            documents: list,
+                            reason: str,
+                            error: str = None) -> None:
+        """
+        Appends the given documents to the dead letter file of this collection
+        as JSON lines, along with the reason and the last error reported by
+        Solr, so that they can be inspected and replayed.
+
+        :param list of dict[str, Any] documents: The documents to write
+        :param str reason: Why the documents were not indexed, either
+                           'rejected' or 'transient'
+        :param str error: The error reported for the documents, if any
+        """
+        lines = b''.join(self.serializer.dumps({
+            'collection': self.collection,
+            'reason': reason,
+            'error': error,
+            'document': document
+        }) + b'\n' for document in documents)
+
+        with self.dead_letter_lock:
+            with open(self._dead_letter_file(), 'ab') as fh:
+                fh.write(lines)
+
+    def _dead_letter_file(self) -> str:
+        """
+        Returns the path of the dead letter file of this collection, located
+        in the directory set by the `SOLR_DEAD_LETTER_LOCATION` environment
+        variable, which defaults to `LOGGING_FILE_LOCATION`.
+
+        :rtype: str
+        """
+        location = os.getenv('SOLR_DEAD_LETTER_LOCATION',
+                             os.getenv('LOGGING_FILE_LOCATION', '.'))
+
+        return os.path.join(location, '{0}.dead_letter.jsonl'.format(
+            self.collection))
+
+    def _error_message(self, response: requests.Response) -> str:
+        """
+        Returns the error message of a failed Solr response, or the response
+        body when it does not contain a Solr error.
+
+        :param requests.Response response: The failed response
+        :rtype: str
+        """
+        try:
+            return self.serializer.loads(response.content)['error']['msg']
+        except (ValueError, KeyError, TypeError):
+            return response.text
+
     def delete_documents(self,
                          query: str,
                          commit: bool = True) -> bool:
@@ -210,17 +1141,172 @@ class SolrCollection:
         given query.
 
         :param str query: The Solr query to identify the documents to delete
-        :param bool commit: Whether or not to write the changes to the Solr
-                            index
+        :param bool commit: Whether or not to issue a final commit, making the
+                            changes visible
         :rtype: bool
         :return: Whether or not the documents that match the query were deleted
                  from the Solr collection
         """
+        self.flush_updates()
+
+        parameters = self.commit_policy.commit_parameters(final=True) \
+            if commit else self.commit_policy.update_parameters()
+
         return self._execute_request(self._create_collection_request(
-            'update{0}'.format('?commit=true' if commit else ''), 
-            {'delete': {'query': query}})
+            self._update_handler(parameters), {'delete': {'query': query}})
         ) is not None
 
+    def delete_documents_by_id(self,
+                               ids: Iterable,
+                               commit: bool = True,
+                               batch_size: int = DEFAULT_BATCH_SIZE) -> bool:
+        """
+        Delete the documents with the given IDs from the Solr collection's
+        index, `batch_size` IDs per request.
+
+        :param Iterable[str] ids: The IDs of the documents to delete
+        :param bool commit: Whether or not to issue a final commit, making the
+                            changes visible
+        :param int batch_size: The amount of IDs to delete per request
+        :rtype: bool
+        :return: Whether or not all the documents were deleted
+        """
+        self.flush_updates()
+
+        ids = iter(ids)
+        results = []
+
+        for batch in iter(lambda: list(islice(ids, batch_size)), []):
+            results.append(self._execute_request(
+                self._create_collection_request(self._update_handler(
+                    self.commit_policy.update_parameters()), {'delete': batch})
+            ) is not None)
+
+        if commit:
+            results.append(self.commit(final=True))
+
+        return all(results)
+
+    @contextmanager
+    def buffered_updates(self, id_field: str = 'id') -> Iterator[None]:
+        """
+        Buffers the documents passed to `index_documents()` within the context
+        instead of sending them, merging the atomic updates of the same
+        document (see `UpdateBuffer`). Scans within the context see the
+        buffered updates of the documents they read. The buffer is flushed
+        when the context is left, by a commit or by a delete.
+
+        Reads that are not scans, such as facet counts, do not reflect the
+        buffered updates; flush the buffer and commit before relying on them.
+
+        :param str id_field: The ID field of the collection
+        :rtype: Iterator[None]
+        """
+        with self.buffer_lock:
+            self.update_buffer = UpdateBuffer(id_field)
+
+        try:
+            yield
+            self.flush_updates()
+        finally:
+            with self.buffer_lock:
+                self.update_buffer = None
+
+    def flush_updates(self, fields: list = None) -> bool:
+        """
+        Sends the updates buffered by `buffered_updates()`, if any, without a
+        commit. Documents with updates that could not be merged are sent in
+        multiple rounds, so that their updates are applied in order.
+
+        A flush of all fields swaps in an empty buffer, so that updates added
+        while the buffered ones are sent are kept for the next flush. With
+        fields, only the operations on those fields are sent, the other
+        operations stay buffered, see `UpdateBuffer.drain()`. Scans during
+        the flush may miss updates that are being sent.
+
+        :param list of str fields: The fields to flush, which may contain
+                                   wildcards, None for all fields
+        :rtype: bool
+        :return: Whether or not all the updates were sent
+        """
+        with self.flush_lock:
+            with self.buffer_lock:
+                update_buffer = self.update_buffer
+
+                if not update_buffer:
+                    return True
+
+                if fields is None:
+                    self.update_buffer = UpdateBuffer(update_buffer.id_field)
+
+            received = update_buffer.received
+            rounds = update_buffer.drain(fields)
+            results = [self._send_documents(documents)
+                       for documents in rounds]
+
+        if fields is None:
+            logging.info('%s: coalesced %s updates into %s updates of %s '
+                         'documents', self.collection, received,
+                         sum(len(documents) for documents in rounds),
+                         len(rounds[0]) if rounds else 0)
+        else:
+            logging.info('%s: flushed %s updates of %s documents of fields '
+                         '%s', self.collection,
+                         sum(len(documents) for documents in rounds),
+                         len(rounds[0]) if rounds else 0,
+                         ', '.join(sorted(fields)))
+
+        return all(results)
+
+    def commit(self,
+               final: bool = False,
+               visible: bool = False,
+               fields: list = None) -> bool:
+        """
+        Commits the changes made to the Solr collection according to the
+        commit policy of this instance. Intermediate commits, for example
+        between the phases of a task, may be soft, invisible or skipped
+        entirely. The final commit always makes all changes visible, so does
+        an intermediate commit requested as visible. Buffered updates are
+        flushed first, see `buffered_updates()`.
+
+        :param bool final: Whether or not this is the final commit
+        :param bool visible: Whether or not the changes have to be visible
+                             after the commit, see
+                             `CommitPolicy.commit_parameters()`
+        :param list of str fields: The fields of which the buffered updates
+                                   are flushed before an intermediate commit,
+                                   None for all fields; the final commit
+                                   flushes all fields
+        :rtype: bool
+        :return: Whether or not the commit succeeded
+        """
+        self.flush_updates(None if final else fields)
+
+        parameters = self.commit_policy.commit_parameters(final, visible)
+
+        if parameters is None:
+            logging.debug('skipping intermediate commit (policy: %s)',
+                          self.commit_policy)
+
+            return True
+
+        return self._execute_request(self._create_collection_request(
+            self._update_handler(parameters)
+        )) is not None
+
+    def _update_handler(self, parameters: dict = None) -> str:
+        """
+        Returns the update handler request including the given parameters.
+
+        :param dict[str, Any] parameters: The request parameters to add
+        :rtype: str
+        """
+        if not parameters:
+            return 'update'
+
+        return 'update?{0}'.format(urlencode(parameters))
+
     def reload(self):
         """
         Reloads this Solr collection.
@@ -237,6 +1323,78 @@ class SolrCollection:
             '{0}{1}'.format(http_call, self.collection)
         )) is not None
 
+    def list_collections(self) -> Union[list, None]:
+        """
+        Retrieve the names of all the collections of the SolrCloud cluster.
+
+        :rtype: list of str|None
+        :return: The names of the collections, or None if the request failed
+        """
+        response = self._execute_request(self._create_solr_request(
+            'admin/collections?action=LIST&wt=json'
+        ))
+
+        if response is None:
+            return None
+
+        return self.serializer.loads(response).get('collections', [])
+
+    def list_aliases(self) -> Union[dict, None]:
+        """
+        Retrieve the aliases of the SolrCloud cluster.
+
+        :rtype: dict[str, list of str]|None
+        :return: The collections every alias points at, keyed by alias, or
+                 None if the request failed
+        """
+        response = self._execute_request(self._create_solr_request(
+            'admin/collections?action=LISTALIASES&wt=json'
+        ))
+
+        if response is None:
+            return None
+
+        return {alias: collections.split(',') for alias, collections in
+                self.serializer.loads(response).get('aliases', {}).items()}
+
+    def create_alias(self, alias: str) -> bool:
+        """
+        Points the given alias at this Solr collection, replacing the
+        collections it pointed at before. Requests to the alias switch to this
+        collection at once.
+
+        :param str alias: The name of the alias
+        :rtype: bool
+        :return: Whether or not the alias was created or updated
+        """
+        return self._execute_request(self._create_solr_request(
+            'admin/collections?{0}'.format(urlencode({
+                'action': 'CREATEALIAS',
+                'name': alias,
+                'collections': self.collection,
+                'wt': 'json'
+            }))
+        )) is not None
+
+    def copy_field_destinations(self) -> Union[set, None]:
+        """
+        Retrieve the destinations of the copy fields of this Solr collection
+        from the Schema API. Copy field destinations are filled by Solr, so
+        they are left out when documents are copied to another collection.
+
+        :rtype: set of str|None
+        :return: The destination fields, or None if the request failed
+        """
+        response = self._execute_read_request(
+            self._create_collection_request('schema/copyfields?wt=json')
+        )
+
+        if not response:
+            return None
+
+        return {copy_field['dest'] for copy_field in
+                self.serializer.loads(response).get('copyFields', [])}
+
     def select_managed_stopwords(self,
                                  name: str) -> Union[list, None]:
         """
@@ -247,14 +1405,15 @@ class SolrCollection:
         :rtype: list of str|None
         :return: The list of managed stopwords, or None if the request failed
         """
-        response = self._execute_request(self._create_collection_request(
-            'schema/analysis/stopwords/{0}'.format(name)
-        ))
+        response = self._execute_read_request(
+            self._create_collection_request(
+                'schema/analysis/stopwords/{0}'.format(name))
+        )
 
         if not response:
             return None
 
-        return json.loads(response)['wordSet']['managedList']
+        return self.serializer.loads(response)['wordSet']['managedList']
 
     def add_managed_stopwords(self,
                               name: str,
@@ -281,9 +1440,7 @@ class SolrCollection:
         :param list of str values: The list of stopwords to remove
         :rtype: bool
         """
-        return all([self._execute_request(self._create_collection_request(
-            'schema/analysis/stopwords/{0}/{1}'.format(name, value)
-        ), method='DELETE') for value in values])
+        return not self.remove_managed_values('stopwords', name, values)
 
     def select_managed_synonyms(self,
                                 name: str) -> Union[dict, list, None]:
@@ -296,14 +1453,16 @@ class SolrCollection:
                  keys and their synonyms as a list of strings, or None if the
                  request failed
         """
-        response = self._execute_request(self._create_collection_request(
-            'schema/analysis/synonyms/{0}'.format(name)
-        ))
+        response = self._execute_read_request(
+            self._create_collection_request(
+                'schema/analysis/synonyms/{0}'.format(name))
+        )
 
         if not response:
             return None
 
-        return json.loads(response)['synonymMappings']['managedMap']
+        return self.serializer.loads(response)['synonymMappings'][
+            'managedMap']
 
     def add_managed_synonyms(self,
                              name: str,
@@ -332,9 +1491,150 @@ class SolrCollection:
         :param list values: The list of synonyms to remove
         :rtype: bool
         """
-        return all([self._execute_request(self._create_collection_request(
-            'schema/analysis/synonyms/{0}/{1}'.format(name, value)
-        ), method='DELETE') for value in values])
+        return not self.remove_managed_values('synonyms', name, values)
+
+    def remove_managed_values(self,
+                              resource_type: str,
+                              name: str,
+                              values: list,
+                              concurrency: int = None) -> list:
+        """
+        Remove the given values from a managed resource in Solr. The values are
+        deleted one DELETE request at a time by a bounded pool of threads.
+        When at least `solr_managed_replace_threshold()` values are removed,
+        the whole resource is replaced instead (see
+        `_replace_managed_resource()`), falling back to individual deletes if
+        the replacement fails.
+
+        :param str resource_type: The type of the managed resource, either
+                                  'stopwords' or 'synonyms'
+        :param str name: The name of the managed resource
+        :param list of str values: The stopwords or synonym terms to remove
+        :param int concurrency: The amount of DELETE requests to keep in
+                                flight, defaults to
+                                `solr_managed_concurrency()`
+        :rtype: list of str
+        :return: The values that could not be removed
+        """
+        if not values:
+            return []
+
+        if len(values) >= solr_managed_replace_threshold():
+            failed = self._replace_managed_resource(resource_type, name,
+                                                    values)
+
+            if failed is not None:
+                return failed
+
+        if concurrency is None:
+            concurrency = solr_managed_concurrency()
+
+        def remove(value: str) -> bool:
+            return self._execute_request(self._create_collection_request(
+                'schema/analysis/{0}/{1}/{2}'.format(
+                    resource_type, name, quote(value, safe=''))
+            ), method='DELETE') is not None
+
+        with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+            removed = list(executor.map(remove, values))
+
+        failed = [value for value, success in zip(values, removed)
+                  if not success]
+
+        if failed:
+            logging.error('failed to remove %s of %s values from %s|%s',
+                          len(failed), len(values), resource_type, name)
+
+        return failed
+
+    def _replace_managed_resource(self,
+                                  resource_type: str,
+                                  name: str,
+                                  values: list) -> Union[list, None]:
+        """
+        Removes the given values from a managed resource by replacing its
+        contents: the remaining data is PUT over the existing resource in a
+        single request, so that the resource never disappears. Only when the
+        resource no longer exists it is registered again, with its initArgs.
+        Solr versions that merge a PUT into the existing data leave the values
+        in place, which is detected by reading the resource back. As with
+        individual deletes, the changes are only picked up by the analyzers
+        once the collection is reloaded.
+
+        :param str resource_type: The type of the managed resource, either
+                                  'stopwords' or 'synonyms'
+        :param str name: The name of the managed resource
+        :param list of str values: The stopwords or synonym terms to remove
+        :rtype: list of str|None
+        :return: The values that were not present in the resource, or None if
+                 the values were not removed by the replacement
+        """
+        resource = 'schema/analysis/{0}/{1}'.format(resource_type, name)
+        data_key, values_key = MANAGED_RESOURCES[resource_type]
+        current = self._execute_request(self._create_collection_request(
+            resource
+        ))
+
+        if not current:
+            return None
+
+        current = self.serializer.loads(current)[data_key]
+        removals = set(values)
+        remaining = current[values_key]
+        failed = [value for value in values if value not in remaining]
+
+        if isinstance(remaining, dict):
+            remaining = {key: value for key, value in remaining.items()
+                         if key not in removals}
+        else:
+            remaining = [value for value in remaining
+                         if value not in removals]
+
+        logging.info('replacing %s|%s: removing %s of %s values',
+                     resource_type, name, len(values) - len(failed),
+                     len(current[values_key]))
+
+        try:
+            self._send_request(self._create_collection_request(resource, {
+                'initArgs': current.get('initArgs', {}),
+                values_key: remaining
+            }), 'PUT')
+        except requests.exceptions.RequestException as e:
+            if e.response is None or 404 != e.response.status_code:
+                logging.error('failed to replace %s|%s: %s', resource_type,
+                              name, e)
+
+                return None
+
+            logging.warning('%s|%s no longer exists, registering it again',
+                            resource_type, name)
+
+            if not all(self._execute_request(
+                    self._create_collection_request(resource, data),
+                    method='PUT') is not None for data in [
+                        {'class': MANAGED_RESOURCE_CLASSES[resource_type]},
+                        {'initArgs': current.get('initArgs', {})},
+                        remaining
+                    ] if data):
+                logging.error('failed to register %s|%s again, the resource '
+                              'has to be restored manually', resource_type,
+                              name)
+
+                return list(values)
+
+        replaced = self._execute_request(self._create_collection_request(
+            resource
+        ))
+
+        if replaced is None or any(
+                value in self.serializer.loads(replaced)[data_key][values_key]
+                for value in removals):
+            logging.warning('replacing %s|%s did not remove the values, '
+                            'deleting them one by one', resource_type, name)
+
+            return None
+
+        return failed
 
     def build_suggestions(self,
                           handler: str) -> bool:
@@ -382,7 +1682,10 @@ class SolrCollection:
                              json_data: Union[dict, list] = None) -> dict:
         """
         Creates a urllib2 Request object based on the given Solr host and the
-        request string and possible JSON body.
+        request string and possible JSON body. The JSON body is encoded once,
+        so that retries of the request reuse the same bytes. When compression
+        is enabled, update bodies of at least `COMPRESSION_MIN_SIZE` bytes are
+        gzipped and gzipped responses are accepted.
 
         :param str request: The request, containing only the segments after
                             '{solr_host}/'
@@ -390,47 +1693,220 @@ class SolrCollection:
                                                      include in the request
         :rtype: dict[str, Any]
         """
+        data = None if json_data is None else self.serializer.dumps(json_data)
+        headers = {} if data is None \
+            else {'Content-Type': 'application/json'}
+
+        if self.compression:
+            headers['Accept-Encoding'] = 'gzip'
+
+            if data is not None and len(data) >= COMPRESSION_MIN_SIZE \
+                    and 'update' == request.split('?')[0].split('/')[-1]:
+                headers['Content-Encoding'] = 'gzip'
+
         return {
             'method': 'GET' if json_data is None else 'POST',
             'url': '{0}/{1}'.format(self.solr_host, request),
-            'json': json_data
+            'data': data if 'Content-Encoding' not in headers
+            else gzip.compress(data),
+            'headers': headers,
+            'size': 0 if data is None else len(data)
         }
 
-    def _execute_request(self,
+    def _record_transfer(self,
                          request: dict,
-                         method: str = None):
+                         response: requests.Response,
+                         decoded_size: int) -> int:
         """
-        Execute a request against the Solr installation. The HTTP method will be
-        either GET or POST depending on the presence of data in the request. if
-        'method' is provided, the given method will be used instead.
+        Adds the amount of bytes sent and received by the given request to the
+        transfer statistics of this instance. Received bytes are counted as
+        read from the connection, so before the response is decompressed.
+
+        :param dict[str, Any] request: The executed request object
+        :param requests.Response response: The response of the request
+        :param int decoded_size: The size of the decompressed response body
+        :rtype: int
+        :return: The amount of bytes received on the wire
+        """
+        data = request.get('data')
+        raw_size = response.raw.tell() if hasattr(response.raw, 'tell') \
+            else decoded_size
+
+        with self.transfer_lock:
+            self.transfer_statistics['requests'] += 1
+            self.transfer_statistics['bytes_sent'] += len(data or b'')
+            self.transfer_statistics['bytes_sent_uncompressed'] += \
+                request.get('size', 0)
+            self.transfer_statistics['bytes_received'] += raw_size or \
+                decoded_size
+            self.transfer_statistics['bytes_received_decompressed'] += \
+                decoded_size
+
+        return raw_size or decoded_size
+
+    def log_transfer_statistics(self) -> None:
+        """
+        Logs the amount of bytes sent to and received from Solr by this
+        instance, including the bytes saved by compression.
+        """
+        statistics = self.transfer_statistics
+
+        logging.info('transfer statistics for %s:', self.collection)
+        logging.info(' requests: %s', statistics['requests'])
+        logging.info(' cache: %s hits, %s misses, %s evictions',
+                     self.response_cache.hits, self.response_cache.misses,
+                     self.response_cache.evictions)
+
+        for direction in ['sent', 'received']:
+            wire = statistics['bytes_{0}'.format(direction)]
+            uncompressed = statistics['bytes_{0}_{1}'.format(
+                direction,
+                'uncompressed' if 'sent' == direction else 'decompressed'
+            )]
+
+            logging.info(' %s: %s bytes (%s bytes uncompressed, %.1f%% '
+                         'saved)', direction, wire, uncompressed,
+                         100 * (1 - wire / uncompressed) if uncompressed
+                         else 0)
+
+    def _send_request(self,
+                      request: dict,
+                      method: str = None) -> requests.Response:
+        """
+        Sends a request to the Solr installation, see `_execute_request()`.
 
-        :param dict[str, Any] request: The request object to execute
+        :param dict[str, Any] request: The request object to send
         :param str method: Which HTTP method to use
-        :rtype: Any|None
-        :return: The response of the request, or None if the request failed
+        :rtype: requests.Response
+        :raises requests.exceptions.RequestException: When the request failed
+                                                      or Solr responded with
+                                                      an error status
         """
-        data = request.get('json', None)
+        data = request.get('data', None)
+
+        endpoint = self._endpoint(request)
+        start = time.monotonic()
 
         try:
             if data is not None:
                 response = self.request_session.request(
                     method=method if method else request.get('method'),
-                    url=request.get('url'), json=data
+                    url=request.get('url'), data=data, auth=self.auth,
+                    headers=request.get('headers')
                 )
             else:
                 response = self.request_session.request(
                     method=method if method else request.get('method'),
-                    url=request.get('url')
+                    url=request.get('url'), auth=self.auth,
+                    headers=request.get('headers')
                 )
+        except requests.exceptions.RequestException:
+            self.metrics.record_request(self.collection, endpoint,
+                                        time.monotonic() - start,
+                                        bytes_sent=len(data or b''),
+                                        failed=True)
+            raise
+        finally:
+            # A change may have been applied even when its request failed,
+            # reads that started before it completed must not be cached.
+            if not request.get('read'):
+                self.response_cache.invalidate()
+
+        received = self._record_transfer(request, response,
+                                         len(response.content))
+        self.metrics.record_request(self.collection, endpoint,
+                                    time.monotonic() - start,
+                                    bytes_sent=len(data or b''),
+                                    bytes_received=received,
+                                    failed=not response.ok)
+
+        response.raise_for_status()
+
+        return response
+
+    def _endpoint(self, request: dict) -> str:
+        """
+        Returns the name of the Solr endpoint the given request is sent to,
+        used to group the request metrics. The path is stripped of its query
+        string and of the values of managed resources, so that every managed
+        resource is a single endpoint.
 
-            response.raise_for_status()
+        :param dict[str, Any] request: The request object
+        :rtype: str
+        """
+        path = request.get('url').split('?')[0]
+        path = path[len('{0}/'.format(self.solr_host)):]
+        segments = path.split('/')
 
-            return response.text
+        if self.collection == segments[0]:
+            segments = segments[1:]
+
+        if ['schema', 'analysis'] == segments[:2]:
+            segments = segments[:4]
+
+        return '/'.join(segments)
+
+    def _execute_read_request(self,
+                              request: dict,
+                              cache: bool = True) -> Union[bytes, None]:
+        """
+        Executes a request that only reads from Solr, see `_execute_request()`.
+        Successful responses are cached, keyed by the URL and the body of the
+        request, until any other request of this instance completes, such as
+        an update, a commit or a change to a managed resource. Responses to
+        reads that were sent before it completed are not cached. Reads that do
+        not repeat, such as the pages of a cursor, are not cached, so that a
+        scan does not evict the responses that are read again.
+
+        :param dict[str, Any] request: The request object to execute
+        :param bool cache: Whether or not to look up and cache the response
+        :rtype: bytes|None
+        :return: The body of the response, or None if the request failed
+        """
+        request['read'] = True
+
+        if not cache:
+            return self._execute_request(request)
+
+        key = (request.get('url'), request.get('data'))
+        generation = self.response_cache.generation
+        response = self.response_cache.get(key)
+
+        if response is None:
+            response = self._execute_request(request)
+
+            if response:
+                self.response_cache.put(key, response, generation)
+
+        return response
+
+    def _execute_request(self,
+                         request: dict,
+                         method: str = None):
+        """
+        Execute a request against the Solr installation. The HTTP method will be
+        either GET or POST depending on the presence of data in the request. if
+        'method' is provided, the given method will be used instead.
+
+        :param dict[str, Any] request: The request object to execute
+        :param str method: Which HTTP method to use
+        :rtype: bytes|None
+        :return: The body of the response, or None if the request failed
+        """
+        data = request.get('data', None)
+
+        try:
+            return self._send_request(request, method).content
         except requests.exceptions.RequestException as e:
+            if data is not None and 'Content-Encoding' in request.get(
+                    'headers', {}):
+                data = gzip.decompress(data)
+
             logging.error('request failed;')
             logging.error(' response: requests.exceptions.RequestException')
             logging.error(' call:     %s', request.get('url'))
-            logging.error(' data:     %s', data)
+            logging.error(' data:     %s',
+                          data.decode('utf-8', 'replace') if data else data)
             logging.error(' error:    %s', e)
 
         return None
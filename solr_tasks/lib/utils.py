@@ -6,11 +6,14 @@ import os
 import json
 import requests
 import sys
+import threading
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from typing import Union, Any, Dict
 
 root = os.path.join(os.path.dirname(__file__), '..', '..')
+_shared_session = None
+_shared_session_lock = threading.Lock()
 
 
 if not os.path.isfile('/.dockerenv'):
@@ -78,17 +81,36 @@ def load_json_file(filename: str) -> Union[dict, list]:
 
 def setup_request_session() -> requests.Session:
     """
-    Creates and configures a `requests.Session` object. HTTP proxy and HTTP
-    retry settings are configured when sufficient information is available from
-    the environment variables.
+    Creates and configures a `requests.Session` object. HTTP proxy, HTTP
+    retry, connection pool and keep-alive settings are configured when
+    sufficient information is available from the environment variables.
     """
     session = requests.Session()
     session = _set_request_proxy(session)
     session = _set_request_retry_policy(session)
+    session = _set_request_keep_alive(session)
 
     return session
 
 
+def shared_request_session() -> requests.Session:
+    """
+    Returns the `requests.Session` object shared by the entire process, so that
+    all the Solr collections and downloads reuse the same connection pools. The
+    session is created by `setup_request_session()` on first use.
+
+    The session is shared between threads, credentials should therefore be
+    passed per request rather than be set on the session.
+    """
+    global _shared_session
+
+    with _shared_session_lock:
+        if _shared_session is None:
+            _shared_session = setup_request_session()
+
+    return _shared_session
+
+
 def _set_request_proxy(session: requests.Session) -> requests.Session:
     """
     Ensures that the proxy settings of a given Session object are configured
@@ -116,9 +138,19 @@ def _set_request_proxy(session: requests.Session) -> requests.Session:
 
 def _set_request_retry_policy(session: requests.Session) -> requests.Session:
     """
-    Configures the retry policy for HTTP and HTTPS requests. The amount of
-    retries is based on the `HTTP_RETRY` environment variable and will default
-    to 3 if the environment variable is not present.
+    Configures the retry policy and connection pools for HTTP and HTTPS
+    requests. The amount of retries is based on the `HTTP_RETRY` environment
+    variable and will default to 3 if the environment variable is not present.
+
+    The connection pools are configured based on the following environment
+    variables:
+
+    - `HTTP_POOL_CONNECTIONS`: the amount of hosts to keep a pool for, defaults
+      to 10
+    - `HTTP_POOL_MAXSIZE`: the amount of connections to keep per host, defaults
+      to 32
+    - `HTTP_POOL_BLOCK`: whether to wait for a free connection rather than
+      opening a connection that is discarded afterwards, defaults to `'false'`
 
     :param requests.Session session: The session object to update
     :rtype requests.Session:
@@ -126,7 +158,26 @@ def _set_request_retry_policy(session: requests.Session) -> requests.Session:
     retry_policy = Retry(total=int(os.getenv('HTTP_RETRY', 3)))
 
     for protocol in ['http://', 'https://']:
-        session.mount(protocol, HTTPAdapter(max_retries=retry_policy))
+        session.mount(protocol, HTTPAdapter(
+            max_retries=retry_policy,
+            pool_connections=int(os.getenv('HTTP_POOL_CONNECTIONS', 10)),
+            pool_maxsize=int(os.getenv('HTTP_POOL_MAXSIZE', 32)),
+            pool_block='true' == os.getenv('HTTP_POOL_BLOCK')
+        ))
+
+    return session
+
+
+def _set_request_keep_alive(session: requests.Session) -> requests.Session:
+    """
+    Disables persistent connections when the `HTTP_KEEP_ALIVE` environment
+    variable is set to `'false'`. Connections are kept alive by default.
+
+    :param requests.Session session: The session object to update
+    :rtype requests.Session:
+    """
+    if 'false' == os.getenv('HTTP_KEEP_ALIVE'):
+        session.headers['Connection'] = 'close'
 
     return session
 
@@ -8,7 +8,7 @@ import os
 from solr_tasks.lib import utils
 
 
-request_session = utils.setup_request_session()
+request_session = utils.shared_request_session()
 
 
 def update_vocabulary(name: str,
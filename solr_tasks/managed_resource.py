@@ -5,6 +5,7 @@ import argparse
 import logging
 import os
 from solr_tasks.lib import utils
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection, solr_collections
 
 
@@ -171,6 +172,8 @@ def main() -> None:
         logging.info('reloading Solr collection')
         collection.reload()
 
+    dump_metrics(__file__)
+
     logging.info('managed_resource.py -- finished')
 
 
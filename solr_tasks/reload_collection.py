@@ -4,6 +4,7 @@
 import argparse
 import logging
 import solr_tasks.lib.utils as utils
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection, solr_collections
 
 
@@ -23,6 +24,8 @@ def main() -> None:
     collection = SolrCollection(input_arguments['collection'])
     collection.reload()
 
+    dump_metrics(__file__)
+
     logging.info('reload_collection.py -- finished')
 
 
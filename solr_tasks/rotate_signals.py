@@ -5,6 +5,7 @@ import argparse
 import logging
 import os
 from solr_tasks.lib import utils
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection
 
 
@@ -33,6 +34,8 @@ def main() -> None:
 
     collection.delete_documents(old_signals_query)
 
+    dump_metrics(__file__)
+
     logging.info('rotate_signals.py finished')
 
 
@@ -6,7 +6,10 @@ import logging
 import os
 import dateutil.parser as date_parser
 from solr_tasks.lib import utils
+from solr_tasks.lib.bluegreen import BlueGreenDeployment
+from solr_tasks.lib.commit import CommitPolicy
 from solr_tasks.lib.mapper import DictMapper
+from solr_tasks.lib.metrics import dump_metrics
 from solr_tasks.lib.solr import SolrCollection
 import json
 
@@ -39,19 +42,23 @@ def determine_dataset_mutations(solr_dataset: SolrCollection,
                                 solr_search: SolrCollection,
                                 mappings: dict,
                                 delta: bool = True) -> dict:
-    ckan_datasets = solr_dataset.select_all_documents(fq='private:false',
-                                                      fl=list(mappings.keys()),
-                                                      id_field='index_id')
+    mapper = DictMapper(mappings, {'sys_type': 'dataset'})
+    ckan_datasets = {dataset['id']: mapper.apply_map(dataset)
+                     for dataset in solr_dataset.iter_documents(
+            fq='private:false', fl=list(mappings.keys()), id_field='index_id'
+        )}
     logging.info('ckan datasets: %s', len(ckan_datasets))
 
-    solr_datasets = solr_search.select_all_documents(fq='sys_type:dataset',
-                                                     id_field='sys_id')
+    # Only the generated relation_* fields and the modified date of the
+    # indexed datasets are used when determining the mutations.
+    solr_datasets = {dataset['sys_id']: dataset
+                     for dataset in solr_search.iter_documents(
+            fq='sys_type:dataset',
+            fl=['relation_*', mappings['metadata_modified'][0]],
+            id_field='sys_id'
+        )}
     logging.info('solr datasets: %s', len(solr_datasets))
 
-    mapper = DictMapper(mappings, {'sys_type': 'dataset'})
-    ckan_datasets = {dataset['id']: mapper.apply_map(dataset)
-                     for dataset in ckan_datasets}
-
     # Get dataschema fields from resource description
     for dataset_id in ckan_datasets.keys():
         try:
@@ -63,8 +70,6 @@ def determine_dataset_mutations(solr_dataset: SolrCollection,
         except KeyError:
             continue
 
-    solr_datasets = {dataset['sys_id']: dataset for dataset in solr_datasets}
-
     logging.info('datasets mapped to search schema')
 
     return {
@@ -185,7 +190,7 @@ def build_group_community_rules(solr_search: SolrCollection,
 
     :return: An updated set of community rules
     """
-    groups = solr_search.select_all_documents(
+    groups = solr_search.iter_documents(
         'relation_community:[* TO *] AND sys_type:group',
         ['sys_uri', 'relation_community'], id_field='sys_id'
     )
@@ -212,15 +217,40 @@ def main() -> None:
                                                  'and donl_search collections')
     parser.add_argument('--delta', type=bool, nargs='?', const=True,
                         default=False, help='Only synchronize recent changes')
+    parser.add_argument('--commit_policy', type=CommitPolicy.from_string,
+                        default=CommitPolicy.from_environment(),
+                        help='How to commit between phases: hard, soft, '
+                             'deferred or none, optionally followed by '
+                             ':{commitWithin in ms}')
+    parser.add_argument('--blue_green', type=bool, nargs='?', const=True,
+                        default=False, help='Index into the staging '
+                                            'collection of the search alias '
+                                            'and switch the alias to it once '
+                                            'validated')
 
     input_arguments = vars(parser.parse_args())
 
+    if input_arguments['blue_green'] and input_arguments['delta']:
+        parser.error('--blue_green requires a full index')
+
     logging.info('synchronize_collections.py -- starting')
     logging.info(' > delta index' if input_arguments['delta']
                  else ' > full index')
 
     dataset_collection = SolrCollection(os.getenv('SOLR_COLLECTION_DATASET'))
-    search_collection = SolrCollection(os.getenv('SOLR_COLLECTION_SEARCH'))
+    search_collection = SolrCollection(
+        os.getenv('SOLR_COLLECTION_SEARCH'),
+        commit_policy=input_arguments['commit_policy']
+    )
+    deployment = None
+    index_collection = search_collection
+
+    if input_arguments['blue_green']:
+        deployment = BlueGreenDeployment(
+            os.getenv('SOLR_COLLECTION_SEARCH'),
+            commit_policy=input_arguments['commit_policy']
+        )
+        index_collection = deployment.prepare()
 
     mutations = determine_dataset_mutations(dataset_collection,
                                             search_collection,
@@ -232,6 +262,12 @@ def main() -> None:
     logging.info(' update: %s', len(mutations['update']))
     logging.info(' delete: %s', len(mutations['delete']))
 
+    copied = 0
+
+    if deployment is not None:
+        logging.info('copying the live collection')
+        copied = deployment.copy_live('sys_id')
+
     logging.info('index results:')
 
     logging.info('building group community rules')
@@ -245,7 +281,7 @@ def main() -> None:
         for dataset in list(mutations['create'].values())
     ]
 
-    search_collection.index_documents(datasets_to_create, commit=False)
+    index_collection.index_documents(datasets_to_create, commit=False)
     logging.info(' created: %s', len(datasets_to_create))
 
     datasets_to_update = [
@@ -255,7 +291,7 @@ def main() -> None:
         for dataset in list(mutations['update'].values())
     ]
 
-    search_collection.index_documents(datasets_to_update, commit=False)
+    index_collection.index_documents(datasets_to_update, commit=False)
     logging.info(' updated: %s', len(datasets_to_update))
 
     delete_queries = ['sys_id:"{0}"'.format(sys_id)
@@ -266,15 +302,27 @@ def main() -> None:
               for i in range(0, len(delete_queries), chunk_size)]
 
     for chunk in chunks:
-        search_collection.delete_documents(' OR '.join(chunk), commit=False)
+        index_collection.delete_documents(' OR '.join(chunk), commit=False)
 
     logging.info(' deleted: %s', len(mutations['delete']))
 
     logging.info('committing index changes')
-    search_collection.index_documents([], commit=True)
+    index_collection.commit(final=True)
 
     logging.info('building spellcheck')
-    search_collection.build_spellcheck('select')
+    index_collection.build_spellcheck('select')
+
+    if deployment is not None and deployment.validate(
+            copied + len(datasets_to_create) - len(mutations['delete'])):
+        deployment.swap()
+
+    dataset_collection.log_transfer_statistics()
+    search_collection.log_transfer_statistics()
+
+    if deployment is not None:
+        index_collection.log_transfer_statistics()
+
+    dump_metrics(__file__)
 
     logging.info('synchronize_collections.py -- finished')
 
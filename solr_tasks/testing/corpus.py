@@ -0,0 +1,335 @@
+# encoding: utf-8
+
+
+import datetime
+import json
+import random
+from typing import Iterator
+from solr_tasks.lib import utils
+from solr_tasks.testing.fake_solr import FakeSolrServer
+
+
+COLLECTION_SCHEMAS = {
+    'SOLR_COLLECTION_DATASET': {
+        'unique_key': 'index_id',
+        'single_valued': {'id', 'name', 'identifier', 'title', 'notes',
+                          'metadata_created', 'metadata_modified', 'authority',
+                          'publisher', 'private'},
+        'without_doc_values': {'notes', 'res_description'}
+    },
+    'SOLR_COLLECTION_SEARCH': {
+        'unique_key': 'sys_id',
+        'single_valued': {'sys_uri', 'sys_type', 'sys_name', 'sys_created',
+                          'sys_modified', 'title', 'kind', 'asset_logo',
+                          'popularity'},
+        'copy_fields': {'relation': 'relation_*'},
+        'without_doc_values': {'description', 'text'}
+    },
+    'SOLR_COLLECTION_SUGGESTER': {
+        'unique_key': 'id'
+    },
+    'SOLR_COLLECTION_SIGNALS': {
+        'unique_key': 'id',
+        'single_valued': {'query', 'handler', 'search_timestamp'}
+    },
+    'SOLR_COLLECTION_SIGNALS_AGGREGATED': {
+        'unique_key': 'id',
+        'single_valued': {'subject', 'handler', 'type', 'count'}
+    },
+}
+ORGANIZATION_KINDS = ['gemeente', 'ministerie', 'provincie', 'waterschap',
+                      'zelfstandig_bestuursorgaan']
+HANDLERS = ['select', 'suggest', 'dataset', 'organization']
+WORDS = ['water', 'verkeer', 'energie', 'onderwijs', 'zorg', 'wonen',
+         'klimaat', 'natuur', 'bodem', 'lucht', 'economie', 'cultuur',
+         'veiligheid', 'bevolking', 'werk', 'inkomen', 'afval', 'geluid']
+THEMES = 50
+
+
+class SyntheticCorpus:
+    def __init__(self, documents: int, seed: int = 0):
+        """
+        Initialize a SyntheticCorpus instance. The corpus describes the
+        contents of the DONL collections at the given scale: `documents` is
+        the size of the search collection, the dataset collection holds about
+        as many CKAN datasets and the signals collection as many signals. The
+        documents are generated lazily and deterministically, so that every
+        run of the same corpus yields the same documents.
+
+        About 5% of the datasets only exist in CKAN, 5% only in the search
+        collection and 10% were modified in CKAN since they were indexed, so
+        that a synchronization creates, updates and deletes datasets. The
+        reverse relations are partially stale.
+
+        :param int documents: The amount of documents in the search collection
+        :param int seed: The seed of the random generator
+        :rtype: SyntheticCorpus
+        """
+        self.documents = documents
+        self.seed = seed
+        self.community_uris = list(utils.load_resource('communities').keys())
+        self.counts = {
+            'community': len(self.community_uris) + documents // 20000,
+            'organization': max(10, documents * 2 // 100),
+            'group': max(5, documents // 100),
+            'appliance': max(5, documents * 2 // 100),
+            'datarequest': max(5, documents * 3 // 100),
+            'dataservice': max(5, documents * 2 // 100),
+        }
+        self.counts['dataset'] = max(10,
+                                     documents - sum(self.counts.values()))
+        self.community_uris += [
+            'https://data.overheid.nl/communities/community-{0}'.format(number)
+            for number in range(self.counts['community'] -
+                                len(self.community_uris))
+        ]
+        self.now = datetime.datetime(2026, 1, 1)
+
+    def uri(self, sys_type: str, number: int) -> str:
+        """
+        Returns the URI of the given object.
+
+        :param str sys_type: The type of the object
+        :param int number: The sequence number of the object within its type
+        :rtype: str
+        """
+        if 'community' == sys_type:
+            return self.community_uris[number]
+
+        return 'https://data.overheid.nl/{0}/{0}-{1}'.format(sys_type, number)
+
+    def search_documents(self) -> Iterator[dict]:
+        """
+        Generates the documents of the search collection.
+
+        :rtype: Iterator[dict[str, Any]]
+        """
+        rng = random.Random(self.seed)
+
+        for sys_type, count in self.counts.items():
+            for number in range(count):
+                if 'dataset' == sys_type and number % 20 == 19:
+                    continue
+
+                yield self._search_document(rng, sys_type, number)
+
+        for number in range(self.counts['dataset'] // 20):
+            yield self._search_document(rng, 'dataset',
+                                        self.counts['dataset'] + number)
+
+    def dataset_documents(self) -> Iterator[dict]:
+        """
+        Generates the CKAN datasets of the dataset collection.
+
+        :rtype: Iterator[dict[str, Any]]
+        """
+        rng = random.Random(self.seed + 1)
+
+        for number in range(self.counts['dataset']):
+            organization = self.uri('organization', rng.randrange(
+                self.counts['organization']))
+            modified = self._date(number, 10 if number % 10 == 3 else 0)
+            dataset = {
+                'index_id': 'index-{0}'.format(number),
+                'id': self._sys_id('dataset', number),
+                'name': 'dataset-{0}'.format(number),
+                'identifier': self.uri('dataset', number),
+                'title': self._title(rng, 'Dataset', number),
+                'notes': ' '.join(rng.choices(WORDS, k=30)),
+                'metadata_created': self._date(number, -100),
+                'metadata_modified': modified,
+                'authority': organization,
+                'publisher': organization,
+                'theme': self._themes(rng),
+                'tags': rng.sample(WORDS, 3),
+                'res_format': rng.sample(['CSV', 'JSON', 'XML', 'PDF'], 2),
+                'private': number % 50 == 7
+            }
+
+            if number % 10 == 0:
+                dataset['res_description'] = [json.dumps([{
+                    'name': word, 'code': word[:3], 'type': 'string',
+                    'description': 'Kolom {0}'.format(word)
+                } for word in rng.sample(WORDS, 4)])]
+
+            yield dataset
+
+    def signal_documents(self) -> Iterator[dict]:
+        """
+        Generates the search signals of the signals collection.
+
+        :rtype: Iterator[dict[str, Any]]
+        """
+        rng = random.Random(self.seed + 2)
+
+        for number in range(self.documents):
+            timestamp = self.now - datetime.timedelta(
+                seconds=rng.randrange(60 * 86400))
+            filters = ['theme:"{0}"'.format(self._theme(rng))]
+
+            if rng.random() < 0.5:
+                filters.append('authority:"{0}" AND sys_type:dataset'.format(
+                    self.uri('organization', rng.randrange(
+                        self.counts['organization']))))
+
+            yield {
+                'id': 'signal-{0}'.format(number),
+                'query': ' '.join(rng.sample(WORDS[:8], rng.randint(1, 2))),
+                'handler': rng.choice(HANDLERS),
+                'search_timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'filters': filters
+            }
+
+    def aggregated_signal_documents(self) -> Iterator[dict]:
+        """
+        Generates the aggregations of an earlier run of `aggregate_signals`.
+
+        :rtype: Iterator[dict[str, Any]]
+        """
+        rng = random.Random(self.seed + 3)
+
+        for number, handler in enumerate(HANDLERS):
+            for hour in range(24):
+                yield {'id': 'aggregation-{0}-{1}'.format(number, hour),
+                       'subject': hour, 'handler': handler,
+                       'type': 'search_timestamp',
+                       'count': rng.randrange(1000)}
+
+    def communities_valuelist(self) -> dict:
+        """
+        Returns the contents of the `donl_communities.json` valuelist.
+
+        :rtype: dict[str, dict[str, Any]]
+        """
+        return {uri: {'labels': {'nl-NL': uri.rsplit('/', 1)[-1]}}
+                for uri in self.community_uris}
+
+    def theme_synonyms(self) -> dict:
+        """
+        Returns the contents of the `uri_nl` managed synonyms, which map the
+        theme URIs to their labels.
+
+        :rtype: dict[str, list of str]
+        """
+        return {self._theme_uri(number): ['Thema {0}'.format(number)]
+                for number in range(THEMES)}
+
+    def create_server(self, collections: dict) -> FakeSolrServer:
+        """
+        Creates a FakeSolrServer holding this corpus.
+
+        :param dict[str, str] collections: The collection names, keyed by the
+                                           environment variable that
+                                           configures them, such as
+                                           `SOLR_COLLECTION_SEARCH`
+        :rtype: FakeSolrServer
+        """
+        server = FakeSolrServer()
+        contents = {
+            'SOLR_COLLECTION_DATASET': self.dataset_documents,
+            'SOLR_COLLECTION_SEARCH': self.search_documents,
+            'SOLR_COLLECTION_SIGNALS': self.signal_documents,
+            'SOLR_COLLECTION_SIGNALS_AGGREGATED':
+                self.aggregated_signal_documents,
+        }
+
+        for variable, name in collections.items():
+            collection = server.add_collection(
+                name, **COLLECTION_SCHEMAS[variable])
+
+            if variable in contents:
+                collection.load(contents[variable]())
+
+        if 'SOLR_COLLECTION_SEARCH' in collections:
+            search = server.collections[collections['SOLR_COLLECTION_SEARCH']]
+            search.add_managed_resource('synonyms', 'uri_nl',
+                                        self.theme_synonyms())
+            search.add_managed_resource('stopwords', 'nl',
+                                        ['de', 'het', 'een'])
+
+        return server
+
+    def _search_document(self,
+                         rng: random.Random,
+                         sys_type: str,
+                         number: int) -> dict:
+        document = {
+            'sys_id': self._sys_id(sys_type, number),
+            'sys_uri': self.uri(sys_type, number),
+            'sys_type': sys_type,
+            'sys_name': '{0}-{1}'.format(sys_type, number),
+            'sys_modified': self._date(number),
+            'title': self._title(rng, sys_type.capitalize(), number),
+            'description': ' '.join(rng.choices(WORDS, k=20))
+        }
+
+        if sys_type in ['dataset', 'dataservice', 'datarequest']:
+            organization = self._random_uri(rng, 'organization')
+            document['authority'] = [organization]
+            document['relation_organization'] = [organization]
+
+        if sys_type in ['dataset', 'dataservice']:
+            document['theme'] = self._themes(rng)
+
+        if sys_type in ['dataset', 'organization', 'datarequest', 'appliance',
+                        'group'] and rng.random() < 0.6:
+            document['relation_community'] = [self._random_uri(rng,
+                                                               'community')]
+
+        if sys_type in ['appliance', 'group', 'datarequest', 'community']:
+            document['relation_dataset'] = [
+                self._random_uri(rng, 'dataset')
+                for _ in range(rng.randint(1, 5))
+            ]
+
+        if 'community' == sys_type:
+            for related_type in ['appliance', 'datarequest', 'group',
+                                 'organization']:
+                document['relation_{0}'.format(related_type)] = [
+                    self._random_uri(rng, related_type)
+                    for _ in range(rng.randint(1, 20))
+                ]
+
+        if 'organization' == sys_type:
+            document['kind'] = rng.choice(ORGANIZATION_KINDS)
+
+            if rng.random() < 0.5:
+                document['asset_logo'] = '{0}/logo.png'.format(
+                    document['sys_uri'])
+
+            if rng.random() < 0.2:
+                document['user_defined_synonyms'] = [
+                    'Synoniem {0}'.format(number)]
+
+        if 'community' != sys_type and rng.random() < 0.3:
+            document['relation_group'] = [self._random_uri(rng, 'group')]
+
+        return document
+
+    def _random_uri(self, rng: random.Random, sys_type: str) -> str:
+        return self.uri(sys_type, rng.randrange(self.counts[sys_type]))
+
+    def _sys_id(self, sys_type: str, number: int) -> str:
+        return '{0:08x}-{1}-{2}'.format(number * 2654435761 % 2 ** 32,
+                                        sys_type, number)
+
+    def _title(self, rng: random.Random, prefix: str, number: int) -> str:
+        return '{0} {1} {2}'.format(prefix, ' '.join(rng.sample(WORDS, 2)),
+                                    number)
+
+    def _themes(self, rng: random.Random) -> list:
+        return [self._theme(rng) for _ in range(rng.randint(1, 3))]
+
+    def _theme(self, rng: random.Random) -> str:
+        return self._theme_uri(rng.randrange(THEMES))
+
+    @staticmethod
+    def _theme_uri(number: int) -> str:
+        return 'http://standaarden.overheid.nl/owms/terms/thema-{0}'.format(
+            number)
+
+    def _date(self, number: int, days: int = 0) -> str:
+        date = self.now - datetime.timedelta(days=30, seconds=number) \
+            + datetime.timedelta(days=days)
+
+        return date.strftime('%Y-%m-%dT%H:%M:%SZ')
@@ -0,0 +1,1010 @@
+# encoding: utf-8
+
+
+import base64
+import fnmatch
+import gzip
+import json
+import logging
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Iterator, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+from solr_tasks.lib.filters import field_values
+from solr_tasks.testing.query import parse_filters, parse_query
+
+
+ATOMIC_OPERATIONS = {'set', 'add', 'add-distinct', 'remove', 'inc'}
+MANAGED_RESOURCE_CLASSES = {
+    'stopwords': 'org.apache.solr.rest.schema.analysis.'
+                 'ManagedWordSetResource',
+    'synonyms': 'org.apache.solr.rest.schema.analysis.'
+                'ManagedSynonymGraphFilterFactory$SynonymManager',
+}
+EXPORT_CHUNK_SIZE = 1000
+
+
+class FakeSolrError(Exception):
+    def __init__(self, status: int, message: str):
+        """
+        Initialize a FakeSolrError, reported to the client as a Solr error
+        response with the given HTTP status.
+
+        :param int status: The HTTP status of the error
+        :param str message: The error message
+        :rtype: FakeSolrError
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class FakeCollection:
+    def __init__(self,
+                 name: str,
+                 unique_key: str = 'id',
+                 single_valued: Union[set, list] = (),
+                 copy_fields: dict = None,
+                 without_doc_values: Union[set, list] = ()):
+        """
+        Initialize a FakeCollection instance, an in-memory stand-in for a Solr
+        collection. Like in Solr, searches, exports and facets only see the
+        documents of the last opened searcher: updates become visible after a
+        soft commit, a hard commit that opens a searcher, or once their
+        `commitWithin` has passed. Atomic updates apply to the latest version
+        of the documents, visible or not. Every stored document gets a new
+        `_version_`.
+
+        :param str name: The name of the collection
+        :param str unique_key: The uniqueKey field, generated as a UUID for
+                               new documents that lack it
+        :param set of str single_valued: The fields that are not multiValued,
+                                         indexing more than one value in them
+                                         is rejected
+        :param dict[str, str] copy_fields: Destination fields mapped to a
+                                           source field pattern, for example
+                                           `{'relation': 'relation_*'}`
+        :param set of str without_doc_values: The field patterns that do not
+                                              have docValues, and can thus not
+                                              be exported
+        :rtype: FakeCollection
+        """
+        self.name = name
+        self.unique_key = unique_key
+        self.single_valued = set(single_valued) | {unique_key}
+        self.copy_fields = copy_fields or {}
+        self.without_doc_values = set(without_doc_values)
+        self.documents = {}
+        self.committed = {}
+        self.visible = {}
+        self.commit_deadline = None
+        self.managed_resources = OrderedDict()
+        self.version = 0
+        self.document_version = 0
+        self.sorted_results = OrderedDict()
+        self.statistics = dict.fromkeys(['commits', 'soft_commits',
+                                         'suggest_builds', 'spellcheck_builds',
+                                         'reloads'], 0)
+        self.lock = threading.RLock()
+
+    def load(self, documents: Iterator[dict]) -> None:
+        """
+        Adds the given documents to the collection as-is, without atomic
+        update handling, and commits them. Used to seed the collection.
+
+        :param Iterator[dict[str, Any]] documents: The documents to load
+        """
+        with self.lock:
+            for document in documents:
+                document = self._normalize(dict(document))
+                self.documents[document[self.unique_key]] = document
+
+            self.committed = dict(self.documents)
+            self.open_searcher(self.committed)
+
+    def commit(self, soft: bool = False, open_searcher: bool = True) -> None:
+        """
+        Commits the pending updates. A hard commit makes them durable, so that
+        they survive a reload, a soft commit only makes them visible.
+
+        :param bool soft: Whether or not to commit softly
+        :param bool open_searcher: Whether or not a hard commit makes the
+                                   updates visible
+        """
+        with self.lock:
+            if soft:
+                self.statistics['soft_commits'] += 1
+            else:
+                self.statistics['commits'] += 1
+                self.committed = dict(self.documents)
+
+            if soft or open_searcher:
+                self.open_searcher(self.documents)
+
+    def commit_within(self, milliseconds: int) -> None:
+        """
+        Schedules a soft commit of the pending updates, like `commitWithin`.
+        An earlier scheduled commit is kept.
+
+        :param int milliseconds: The time within which to commit
+        """
+        with self.lock:
+            deadline = time.monotonic() + milliseconds / 1000
+
+            if self.commit_deadline is None or deadline < self.commit_deadline:
+                self.commit_deadline = deadline
+
+    def open_searcher(self, documents: dict) -> None:
+        """
+        Makes the given documents, keyed by their unique key, visible to
+        searches.
+
+        :param dict[str, dict[str, Any]] documents: The documents to search
+        """
+        with self.lock:
+            self.visible = dict(documents)
+            self.commit_deadline = None
+            self.version += 1
+
+    def searchable_documents(self) -> dict:
+        """
+        Returns the documents visible to searches, after opening a new
+        searcher if a `commitWithin` has passed.
+
+        :rtype: dict[str, dict[str, Any]]
+        """
+        with self.lock:
+            if self.commit_deadline is not None and \
+                    time.monotonic() >= self.commit_deadline:
+                self.statistics['soft_commits'] += 1
+                self.open_searcher(self.documents)
+
+            return self.visible
+
+    def add_managed_resource(self,
+                             resource_type: str,
+                             name: str,
+                             data: Union[list, dict] = None) -> None:
+        """
+        Registers a managed stopwords or synonyms resource.
+
+        :param str resource_type: Either 'stopwords' or 'synonyms'
+        :param str name: The name of the resource
+        :param list|dict data: The initial stopwords or synonym mappings
+        """
+        self.managed_resources['/schema/analysis/{0}/{1}'.format(
+            resource_type, name)] = {
+            'type': resource_type,
+            'class': MANAGED_RESOURCE_CLASSES[resource_type],
+            'initArgs': {'ignoreCase': False},
+            'data': data if data is not None
+            else ({} if 'synonyms' == resource_type else [])
+        }
+
+    def update(self, body: Union[list, dict]) -> None:
+        """
+        Processes the body of an update request: a list of documents or a
+        dictionary of `add`, `delete` and `commit` commands. Documents are
+        processed in order, so the documents preceding a rejected document
+        are indexed, like in Solr. The updates are not visible until they are
+        committed.
+
+        :param list|dict body: The update request body
+        :raises FakeSolrError: When a document is rejected
+        """
+        commands = [('add', document) for document in body] \
+            if isinstance(body, list) else list(body.items())
+
+        with self.lock:
+            for command, argument in commands:
+                if 'add' == command:
+                    self._add(argument.get('doc', argument))
+                elif 'delete' == command:
+                    for delete in argument if isinstance(argument, list) \
+                            else [argument]:
+                        self._delete(delete)
+                elif 'commit' == command:
+                    self.commit(is_true(argument.get('softCommit')),
+                                argument.get('openSearcher', True)
+                                not in (False, 'false'))
+                else:
+                    raise FakeSolrError(400, 'Unknown command \'{0}\''
+                                        .format(command))
+
+    def search(self, params: dict) -> dict:
+        """
+        Executes a select request: `q`, `fq`, `fl`, `sort`, `start`, `rows`,
+        `cursorMark` and field facets are supported.
+
+        :param dict[str, Any] params: The request parameters
+        :rtype: dict[str, Any]
+        """
+        rows = int(params.get('rows', 10))
+        cursor = params.get('cursorMark')
+        sort_field, descending = parse_sort(params.get('sort'),
+                                            self.unique_key)
+        results = self._sorted_results(params.get('q'), params.get('fq'),
+                                       sort_field, descending)
+        fields = parse_field_list(params.get('fl'))
+
+        if cursor is None:
+            start = int(params.get('start', 0))
+        elif '*' == cursor:
+            start = 0
+        else:
+            start = self._cursor_position(results, decode_cursor(cursor),
+                                          descending)
+
+        page = results[start:start + rows]
+        response = {} if is_true(params.get('omitHeader')) \
+            else {'responseHeader': {'status': 0, 'QTime': 0}}
+        response['response'] = {
+            'numFound': len(results),
+            'start': start,
+            'docs': [project(document, fields) for _, document in page]
+        }
+
+        if cursor is not None:
+            response['nextCursorMark'] = encode_cursor(page[-1][0]) \
+                if page else cursor
+
+        if is_true(params.get('facet')) and params.get('facet.field'):
+            response['facet_counts'] = {
+                'facet_queries': {},
+                'facet_fields': {
+                    field: self._facet(results, field, params)
+                    for field in as_list(params.get('facet.field'))
+                }
+            }
+
+        return response
+
+    def export(self, params: dict) -> list:
+        """
+        Executes an export request, returning all the matching documents.
+
+        :param dict[str, Any] params: The request parameters
+        :rtype: list of dict[str, Any]
+        :raises FakeSolrError: When a field lacks docValues
+        """
+        fields = parse_field_list(params.get('fl'))
+
+        if not fields or not all(self.has_doc_values(field)
+                                 for field in fields):
+            raise FakeSolrError(400, 'export fields must have docValues')
+
+        sort_field, descending = parse_sort(params.get('sort'),
+                                            self.unique_key)
+
+        return [project(document, fields) for _, document in
+                self._sorted_results(params.get('q'), params.get('fq'),
+                                     sort_field, descending)]
+
+    def has_doc_values(self, field: str) -> bool:
+        """
+        Returns whether or not the given field has docValues.
+
+        :param str field: The name of the field
+        :rtype: bool
+        """
+        return not any(fnmatch.fnmatchcase(field, pattern)
+                       for pattern in self.without_doc_values)
+
+    def _add(self, document: dict) -> None:
+        key = document.get(self.unique_key)
+
+        if isinstance(key, list):
+            key = key[0] if key else None
+
+        atomic = any(isinstance(value, dict)
+                     and value.keys() & ATOMIC_OPERATIONS
+                     for value in document.values())
+
+        if not atomic:
+            if key is None:
+                document = dict(document)
+                document[self.unique_key] = str(uuid.uuid4())
+
+            document = self._normalize(dict(document))
+            self.documents[document[self.unique_key]] = document
+
+            return
+
+        if key is None:
+            raise FakeSolrError(400, 'Document is missing mandatory uniqueKey '
+                                     'field: {0}'.format(self.unique_key))
+
+        current = dict(self.documents.get(key, {self.unique_key: key}))
+
+        for field, value in document.items():
+            if field == self.unique_key:
+                continue
+
+            if not isinstance(value, dict):
+                current[field] = value
+
+                continue
+
+            for operation, operand in value.items():
+                current = apply_operation(current, field, operation, operand)
+
+        self.documents[key] = self._normalize(current)
+
+    def _delete(self, delete: Union[dict, str]) -> None:
+        if isinstance(delete, str) or 'id' in delete:
+            self.documents.pop(delete if isinstance(delete, str)
+                               else delete['id'], None)
+
+            return
+
+        query = parse_query(delete['query'])
+
+        for key in [key for key, document in self.documents.items()
+                    if query.matches(document)]:
+            del self.documents[key]
+
+    def _normalize(self, document: dict) -> dict:
+        for field in list(document.keys()):
+            value = document[field]
+
+            if value is None or [] == value:
+                del document[field]
+            elif field in self.single_valued and isinstance(value, list):
+                if len(value) > 1:
+                    raise FakeSolrError(400, 'ERROR: [doc={0}] multiple '
+                                             'values encountered for non '
+                                             'multiValued field {1}: {2}'
+                                        .format(document.get(self.unique_key),
+                                                field, value))
+
+                document[field] = value[0]
+
+        for destination, pattern in self.copy_fields.items():
+            values = []
+
+            for field, value in document.items():
+                if field != destination and \
+                        fnmatch.fnmatchcase(field, pattern):
+                    values += value if isinstance(value, list) else [value]
+
+            if values:
+                document[destination] = list(OrderedDict.fromkeys(values))
+            else:
+                document.pop(destination, None)
+
+        self.document_version += 1
+        document['_version_'] = self.document_version
+
+        return document
+
+    def _sorted_results(self,
+                        query: Union[str, None],
+                        filters: Union[str, list, None],
+                        sort_field: str,
+                        descending: bool) -> list:
+        key = (query, tuple(as_list(filters)), sort_field, descending)
+
+        with self.lock:
+            documents = self.searchable_documents()
+            cached = self.sorted_results.get(key)
+
+            if cached is not None and cached[0] == self.version:
+                self.sorted_results.move_to_end(key)
+
+                return cached[1]
+
+            query = parse_query(query or '*:*')
+            filters = parse_filters(filters)
+            results = sorted(
+                ((sort_value(document, sort_field), document)
+                 for document in documents.values()
+                 if query.matches(document) and filters.matches(document)),
+                key=lambda result: result[0], reverse=descending
+            )
+
+            self.sorted_results[key] = (self.version, results)
+
+            while len(self.sorted_results) > 16:
+                self.sorted_results.popitem(last=False)
+
+            return results
+
+    @staticmethod
+    def _cursor_position(results: list, after: str, descending: bool) -> int:
+        low, high = 0, len(results)
+
+        while low < high:
+            middle = (low + high) // 2
+            value = results[middle][0]
+
+            if (value < after or value == after) if not descending \
+                    else (value > after or value == after):
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+    def _facet(self,
+               results: list,
+               field: str,
+               params: dict) -> Union[dict, list]:
+        minimum = int(params.get('facet.mincount', 0))
+        counts = {}
+
+        # Like Solr, every indexed value is counted by default, including the
+        # values of the documents excluded by the filters.
+        if minimum <= 0:
+            counts = {value: 0 for document in
+                      self.searchable_documents().values()
+                      for value in field_values(document, field)}
+
+        for _, document in results:
+            for value in set(field_values(document, field)):
+                counts[value] = counts.get(value, 0) + 1
+
+        limit = int(params.get('f.{0}.facet.limit'.format(field),
+                               params.get('facet.limit', 100)))
+        ordered = sorted(((value, count) for value, count in counts.items()
+                          if count >= minimum),
+                         key=lambda item: (-item[1], item[0]))
+
+        if limit >= 0:
+            ordered = ordered[:limit]
+
+        if 'map' == params.get('json.nl'):
+            return OrderedDict(ordered)
+
+        return [item for pair in ordered for item in pair]
+
+
+class FakeSolrServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        Initialize a FakeSolrServer instance, a local HTTP server implementing
+        the subset of the Solr API used by the tasks on top of in-memory
+        collections. Port 0 picks a free port.
+
+        :param str host: The interface to listen on
+        :param int port: The port to listen on
+        :rtype: FakeSolrServer
+        """
+        self.collections = {}
+        self.aliases = {}
+        self.httpd = FakeSolrHTTPServer((host, port), FakeSolrRequestHandler)
+        self.httpd.fake_solr = self
+        self.thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        The base URL of the server, to be used as `SOLR_HOST`.
+
+        :rtype: str
+        """
+        host, port = self.httpd.server_address[:2]
+
+        return 'http://{0}:{1}/solr'.format(host, port)
+
+    def add_collection(self, name: str, **kwargs) -> FakeCollection:
+        """
+        Creates an empty collection, see `FakeCollection` for the arguments.
+
+        :param str name: The name of the collection
+        :rtype: FakeCollection
+        """
+        self.collections[name] = FakeCollection(name, **kwargs)
+
+        return self.collections[name]
+
+    def collection(self, name: str) -> FakeCollection:
+        """
+        Returns the collection with the given name or alias.
+
+        :param str name: The name or alias of the collection
+        :rtype: FakeCollection
+        :raises FakeSolrError: When the collection does not exist
+        """
+        name = self.aliases.get(name, name)
+
+        if name not in self.collections:
+            raise FakeSolrError(404, 'Collection not found: {0}'.format(name))
+
+        return self.collections[name]
+
+    def start(self) -> 'FakeSolrServer':
+        """
+        Starts serving requests in a background thread.
+
+        :rtype: FakeSolrServer
+        """
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       daemon=True)
+        self.thread.start()
+
+        logging.debug('fake Solr server listening on %s', self.url)
+
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the server and closes its socket.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> 'FakeSolrServer':
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
+
+    def handle(self,
+               method: str,
+               path: str,
+               params: dict,
+               body: Union[dict, list, None]) \
+            -> Union[dict, Iterator[bytes]]:
+        """
+        Dispatches a request to the admin API or to a collection.
+
+        :param str method: The HTTP method
+        :param str path: The path of the request, below `/solr/`
+        :param dict[str, Any] params: The request parameters
+        :param dict|list|None body: The decoded JSON body, if any
+        :rtype: dict[str, Any]|Iterator[bytes]
+        :return: The response, or the chunks of a streamed response
+        :raises FakeSolrError: When the request fails
+        """
+        segments = [unquote(segment) for segment in path.split('/')]
+
+        if 'admin' == segments[0]:
+            return self._handle_admin(params)
+
+        collection = self.collection(segments[0])
+        handler = '/'.join(segments[1:2])
+
+        if 'update' == handler:
+            if body is not None:
+                collection.update(body)
+
+            if is_true(params.get('commit')):
+                collection.commit(open_searcher='false' != params.get(
+                    'openSearcher'))
+
+            if is_true(params.get('softCommit')):
+                collection.commit(soft=True)
+
+            if params.get('commitWithin') is not None:
+                collection.commit_within(int(params['commitWithin']))
+
+            return {'responseHeader': {'status': 0, 'QTime': 0}}
+
+        if 'export' == handler:
+            return self._export(collection.export(params))
+
+        if 'schema' == handler:
+            return self._handle_schema(collection, method, segments[2:],
+                                       params, body)
+
+        if is_true(params.get('suggest.build')):
+            collection.statistics['suggest_builds'] += 1
+
+            return {'responseHeader': {'status': 0}, 'command': 'build'}
+
+        if is_true(params.get('spellcheck.build')):
+            collection.statistics['spellcheck_builds'] += 1
+
+            return {'responseHeader': {'status': 0}, 'command': 'build'}
+
+        return collection.search(params)
+
+    def _handle_admin(self, params: dict) -> dict:
+        action = params.get('action')
+        name = params.get('name', params.get('core'))
+
+        if 'RELOAD' == action:
+            collection = self.collection(name)
+            collection.statistics['reloads'] += 1
+            # The reloaded core only sees the hard committed documents
+            collection.open_searcher(collection.committed)
+
+            return {'responseHeader': {'status': 0}}
+
+        if 'LIST' == action:
+            return {'responseHeader': {'status': 0},
+                    'collections': sorted(self.collections.keys())}
+
+        if 'LISTALIASES' == action:
+            return {'responseHeader': {'status': 0},
+                    'aliases': dict(self.aliases)}
+
+        if 'CREATEALIAS' == action:
+            collections = [collection for collection in
+                           params.get('collections', '').split(',')
+                           if collection]
+
+            if name in self.collections:
+                raise FakeSolrError(400, 'Can\'t create alias {0}, a '
+                                         'collection with the same name '
+                                         'exists'.format(name))
+
+            if len(collections) != 1:
+                raise FakeSolrError(400, 'Aliases of {0} collections are not '
+                                         'supported'.format(len(collections)))
+
+            if collections[0] not in self.collections:
+                raise FakeSolrError(400, 'Can\'t create alias {0}, collection '
+                                         '{1} does not exist'
+                                    .format(name, collections[0]))
+
+            self.aliases[name] = collections[0]
+
+            return {'responseHeader': {'status': 0}}
+
+        if 'DELETEALIAS' == action:
+            self.aliases.pop(name, None)
+
+            return {'responseHeader': {'status': 0}}
+
+        raise FakeSolrError(400, 'Unsupported action: {0}'.format(action))
+
+    @staticmethod
+    def _handle_schema(collection: FakeCollection,
+                       method: str,
+                       segments: list,
+                       params: dict,
+                       body: Union[dict, list, None]) -> dict:
+        if ['copyfields'] == segments:
+            return {'copyFields': [{
+                'source': pattern,
+                'dest': destination
+            } for destination, pattern in collection.copy_fields.items()]}
+
+        if ['fields'] == segments:
+            return {'fields': [{
+                'name': field,
+                'type': 'string',
+                'docValues': collection.has_doc_values(field)
+            } for field in (params.get('fl') or '').split(',') if field]}
+
+        if ['managed'] == segments:
+            return {'managedResources': [{
+                'resourceId': resource_id,
+                'class': resource['class'],
+                'numObservers': '1'
+            } for resource_id, resource in
+                collection.managed_resources.items()]}
+
+        if len(segments) < 3 or 'analysis' != segments[0] \
+                or segments[1] not in MANAGED_RESOURCE_CLASSES:
+            raise FakeSolrError(404, 'Unknown schema endpoint')
+
+        resource_type, name = segments[1], segments[2]
+        resource_id = '/schema/analysis/{0}/{1}'.format(resource_type, name)
+
+        with collection.lock:
+            resource = collection.managed_resources.get(resource_id)
+
+            if resource is None and method in ['PUT', 'POST']:
+                collection.add_managed_resource(resource_type, name)
+                resource = collection.managed_resources[resource_id]
+
+            if resource is None:
+                raise FakeSolrError(404, '{0} not found'.format(resource_id))
+
+            data = resource['data']
+
+            if 'DELETE' == method and len(segments) == 3:
+                del collection.managed_resources[resource_id]
+            elif 'DELETE' == method:
+                if segments[3] not in data:
+                    raise FakeSolrError(404, '{0} not found in {1}'.format(
+                        segments[3], resource_id))
+
+                if isinstance(data, dict):
+                    del data[segments[3]]
+                else:
+                    data.remove(segments[3])
+            elif isinstance(body, dict) and \
+                    {'managedList', 'managedMap'} & set(body):
+                # The full representation replaces the resource
+                resource['initArgs'] = body.get('initArgs',
+                                                resource['initArgs'])
+                resource['data'] = body.get('managedList',
+                                            body.get('managedMap'))
+            elif isinstance(body, dict) and 'class' in body:
+                resource['class'] = body['class']
+            elif isinstance(body, dict) and 'initArgs' in body:
+                resource['initArgs'] = body['initArgs']
+            elif isinstance(body, dict) and isinstance(data, dict):
+                for term, synonyms in body.items():
+                    data[term] = list(OrderedDict.fromkeys(
+                        data.get(term, []) + as_list(synonyms)))
+            elif isinstance(body, list) and isinstance(data, list):
+                data += [word for word in body if word not in data]
+
+            data_key, values_key = ('wordSet', 'managedList') \
+                if 'stopwords' == resource_type \
+                else ('synonymMappings', 'managedMap')
+
+            return {'responseHeader': {'status': 0}, data_key: {
+                'initArgs': resource['initArgs'],
+                values_key: resource['data']
+            }}
+
+    @staticmethod
+    def _export(documents: list) -> Iterator[bytes]:
+        yield '{{"responseHeader":{{"status":0}},"response":{{"numFound":{0},'\
+              '"docs":['.format(len(documents)).encode('utf-8')
+
+        for offset in range(0, len(documents), EXPORT_CHUNK_SIZE):
+            yield (',' if offset else '').encode('utf-8') + ','.join(
+                json.dumps(document) for document in
+                documents[offset:offset + EXPORT_CHUNK_SIZE]
+            ).encode('utf-8')
+
+        yield b']}}'
+
+
+class FakeSolrHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address) -> None:
+        """
+        Ignores clients closing their keep-alive connections when they exit,
+        other errors are logged.
+        """
+        if isinstance(sys.exc_info()[1], ConnectionError):
+            return
+
+        logging.exception('fake Solr: error handling request from %s',
+                          client_address)
+
+
+class FakeSolrRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self) -> None:
+        self._handle('GET')
+
+    def do_POST(self) -> None:
+        self._handle('POST')
+
+    def do_PUT(self) -> None:
+        self._handle('PUT')
+
+    def do_DELETE(self) -> None:
+        self._handle('DELETE')
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug('fake Solr: ' + format, *args)
+
+    def _handle(self, method: str) -> None:
+        url = urlsplit(self.path)
+        params = {key: values[0] if len(values) == 1 else values
+                  for key, values in parse_qs(url.query).items()}
+
+        try:
+            body = self._read_body()
+
+            if isinstance(body, dict) and isinstance(body.get('params'),
+                                                     dict):
+                params.update(body.pop('params'))
+                body = body or None
+
+            if not url.path.startswith('/solr/'):
+                raise FakeSolrError(404, 'Not found: {0}'.format(url.path))
+
+            response = self.server.fake_solr.handle(
+                method, url.path[len('/solr/'):], params, body)
+        except FakeSolrError as e:
+            self._send_json(e.status, {
+                'responseHeader': {'status': e.status},
+                'error': {'msg': e.message, 'code': e.status}
+            })
+
+            return
+
+        if isinstance(response, dict):
+            self._send_json(200, response)
+
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        for chunk in response:
+            self.wfile.write('{0:x}\r\n'.format(len(chunk)).encode('ascii')
+                             + chunk + b'\r\n')
+
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _read_body(self) -> Union[dict, list, None]:
+        length = int(self.headers.get('Content-Length', 0))
+
+        if not length:
+            return None
+
+        data = self.rfile.read(length)
+
+        if 'gzip' == self.headers.get('Content-Encoding'):
+            data = gzip.decompress(data)
+
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise FakeSolrError(400, 'Invalid JSON: {0}'.format(e))
+
+    def _send_json(self, status: int, response: dict) -> None:
+        data = json.dumps(response).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+
+        if 'gzip' in self.headers.get('Accept-Encoding', '') \
+                and len(data) >= 1024:
+            data = gzip.compress(data)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+
+        for header, value in headers.items():
+            self.send_header(header, value)
+
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def apply_operation(document: dict,
+                    field: str,
+                    operation: str,
+                    operand: Union[list, str, int, None]) -> dict:
+    """
+    Applies an atomic update operation to a field of the given document. Lists
+    are replaced rather than modified, so that documents handed out earlier
+    are never changed.
+
+    :param dict[str, Any] document: The document to update
+    :param str field: The field to update
+    :param str operation: The atomic operation, such as `set` or `remove`
+    :param Any operand: The value of the operation
+    :rtype: dict[str, Any]
+    :raises FakeSolrError: When the operation is not supported
+    """
+    current = as_list(document.get(field))
+
+    if 'set' == operation:
+        document[field] = operand
+    elif 'add' == operation:
+        document[field] = current + as_list(operand)
+    elif 'add-distinct' == operation:
+        document[field] = current + [value for value in as_list(operand)
+                                     if value not in current]
+    elif 'remove' == operation:
+        removals = as_list(operand)
+        document[field] = [value for value in current
+                           if value not in removals]
+    elif 'inc' == operation:
+        document[field] = (document.get(field) or 0) + operand
+    else:
+        raise FakeSolrError(400, 'Unknown operation for the atomic update: '
+                                 '{0}'.format(operation))
+
+    return document
+
+
+def parse_field_list(field_list: Union[str, None]) -> Union[list, None]:
+    """
+    Parses the `fl` parameter into a list of field patterns.
+
+    :param str|None field_list: The comma separated field list
+    :rtype: list of str|None
+    :return: The field patterns, or None to return all fields
+    """
+    if not field_list:
+        return None
+
+    fields = [field.strip() for field in field_list.split(',')
+              if field.strip()]
+
+    return None if '*' in fields else fields
+
+
+def parse_sort(sort: Union[str, None], default_field: str) -> tuple:
+    """
+    Parses the first clause of the `sort` parameter.
+
+    :param str|None sort: The sort parameter, such as `sys_id asc`
+    :param str default_field: The field to sort on when no sort is given
+    :rtype: tuple[str, bool]
+    :return: The field to sort on and whether or not to sort descending
+    """
+    if not sort:
+        return default_field, False
+
+    field, _, direction = sort.split(',')[0].strip().partition(' ')
+
+    return field, 'desc' == direction.strip().lower()
+
+
+def project(document: dict, fields: Union[list, None]) -> dict:
+    """
+    Returns the fields of the document matching the given field patterns.
+
+    :param dict[str, Any] document: The document
+    :param list of str|None fields: The field patterns, None for all fields
+    :rtype: dict[str, Any]
+    """
+    if fields is None:
+        return dict(document)
+
+    return {field: value for field, value in document.items()
+            if any(field == pattern or fnmatch.fnmatchcase(field, pattern)
+                   for pattern in fields)}
+
+
+def sort_value(document: dict, field: str) -> str:
+    """
+    Returns the value to sort the document on.
+
+    :param dict[str, Any] document: The document
+    :param str field: The sort field
+    :rtype: str
+    """
+    values = field_values(document, field)
+
+    return values[0] if values else ''
+
+
+def encode_cursor(value: str) -> str:
+    """
+    Encodes the sort value of the last document of a page as a cursorMark.
+
+    :param str value: The sort value
+    :rtype: str
+    """
+    return base64.urlsafe_b64encode(value.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> str:
+    """
+    Decodes a cursorMark created by `encode_cursor()`.
+
+    :param str cursor: The cursorMark
+    :rtype: str
+    :raises FakeSolrError: When the cursorMark is invalid
+    """
+    try:
+        return base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+    except ValueError:
+        raise FakeSolrError(400, 'Unable to parse \'cursorMark\': {0}'.format(
+            cursor))
+
+
+def as_list(value: Any) -> list:
+    """
+    Returns the given value as a list, None becomes an empty list.
+
+    :param Any value: A single value or a list of values
+    :rtype: list
+    """
+    if value is None:
+        return []
+
+    return value if isinstance(value, list) else [value]
+
+
+def is_true(value: Any) -> bool:
+    """
+    Returns whether or not a request parameter is set to true.
+
+    :param Any value: The parameter value
+    :rtype: bool
+    """
+    return value is True or 'true' == str(value).lower()
@@ -0,0 +1,572 @@
+# encoding: utf-8
+
+
+import datetime
+import re
+from functools import lru_cache
+from typing import Union
+from solr_tasks.lib.filters import field_values
+
+
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+DATE_MATH = re.compile(r'^NOW((?:[+-]\d+[A-Z]+)*)(?:/([A-Z]+))?$')
+DATE_UNITS = {
+    'SECOND': 'seconds', 'SECONDS': 'seconds',
+    'MINUTE': 'minutes', 'MINUTES': 'minutes',
+    'HOUR': 'hours', 'HOURS': 'hours',
+    'DAY': 'days', 'DAYS': 'days',
+}
+
+
+class Query:
+    """
+    A parsed Solr query that can be evaluated against documents locally. Only
+    the subset of the Lucene query syntax used by the tasks is supported:
+    `*:*`, terms, phrases, prefixes, ranges (including `NOW` date math),
+    `AND`/`OR`/`NOT`, parentheses and `{!hash_range}` filters.
+    """
+
+    def matches(self, document: dict) -> bool:
+        """
+        Returns whether or not the given document matches this query.
+
+        :param dict[str, Any] document: The document to evaluate
+        :rtype: bool
+        """
+        raise NotImplementedError
+
+    def fields(self) -> set:
+        """
+        Returns the names of the fields this query reads.
+
+        :rtype: set of str
+        """
+        return set()
+
+
+class MatchAllQuery(Query):
+    def matches(self, document: dict) -> bool:
+        return True
+
+    def __repr__(self) -> str:
+        return '*:*'
+
+
+class TermQuery(Query):
+    def __init__(self, field: str, value: str):
+        """
+        Initialize a TermQuery instance, matching documents of which any value
+        of the field equals the given value. A trailing `*` matches values by
+        prefix, a single `*` matches any value.
+
+        :param str field: The field to match
+        :param str value: The value to match
+        :rtype: TermQuery
+        """
+        self.field = field
+        self.value = value
+
+    def matches(self, document: dict) -> bool:
+        values = field_values(document, self.field)
+
+        if '*' == self.value:
+            return bool(values)
+
+        if self.value.endswith('*') and not self.value.endswith('\\*'):
+            prefix = self.value[:-1]
+
+            return any(value.startswith(prefix) for value in values)
+
+        return self.value in values
+
+    def fields(self) -> set:
+        return {self.field}
+
+    def __repr__(self) -> str:
+        return '{0}:"{1}"'.format(self.field, self.value)
+
+
+class RangeQuery(Query):
+    def __init__(self,
+                 field: str,
+                 lower: str,
+                 upper: str,
+                 include_lower: bool = True,
+                 include_upper: bool = True):
+        """
+        Initialize a RangeQuery instance. Values are compared numerically when
+        both sides are numbers and lexicographically otherwise, which orders
+        ISO 8601 dates correctly. A bound of `*` is unbounded.
+
+        :param str field: The field to match
+        :param str lower: The lower bound of the range
+        :param str upper: The upper bound of the range
+        :param bool include_lower: Whether or not the lower bound is inclusive
+        :param bool include_upper: Whether or not the upper bound is inclusive
+        :rtype: RangeQuery
+        """
+        self.field = field
+        self.lower = None if '*' == lower else resolve_date_math(lower)
+        self.upper = None if '*' == upper else resolve_date_math(upper)
+        self.include_lower = include_lower
+        self.include_upper = include_upper
+
+    def matches(self, document: dict) -> bool:
+        return any(self._in_range(value)
+                   for value in field_values(document, self.field))
+
+    def _in_range(self, value: str) -> bool:
+        if self.lower is not None:
+            comparison = compare_values(value, self.lower)
+
+            if comparison < 0 or (comparison == 0 and not self.include_lower):
+                return False
+
+        if self.upper is not None:
+            comparison = compare_values(value, self.upper)
+
+            if comparison > 0 or (comparison == 0 and not self.include_upper):
+                return False
+
+        return True
+
+    def fields(self) -> set:
+        return {self.field}
+
+    def __repr__(self) -> str:
+        return '{0}:{1}{2} TO {3}{4}'.format(
+            self.field, '[' if self.include_lower else '{',
+            '*' if self.lower is None else self.lower,
+            '*' if self.upper is None else self.upper,
+            ']' if self.include_upper else '}')
+
+
+class HashRangeQuery(Query):
+    def __init__(self, field: str, lower: int, upper: int):
+        """
+        Initialize a HashRangeQuery instance, matching documents of which the
+        MurmurHash3 (x86, 32-bit) hash of the field value lies within the
+        given bounds, like the `{!hash_range}` query parser of Solr.
+
+        :param str field: The field to hash
+        :param int lower: The inclusive lower bound of the hash
+        :param int upper: The inclusive upper bound of the hash
+        :rtype: HashRangeQuery
+        """
+        self.field = field
+        self.lower = lower
+        self.upper = upper
+
+    def matches(self, document: dict) -> bool:
+        values = field_values(document, self.field)
+
+        return bool(values) and \
+            self.lower <= murmurhash3_32(values[0]) <= self.upper
+
+    def fields(self) -> set:
+        return {self.field}
+
+    def __repr__(self) -> str:
+        return '{{!hash_range f={0} l={1} u={2}}}'.format(
+            self.field, self.lower, self.upper)
+
+
+class BooleanQuery(Query):
+    def __init__(self, operator: str, clauses: list):
+        """
+        Initialize a BooleanQuery instance.
+
+        :param str operator: Either 'AND', 'OR' or 'NOT', the latter takes a
+                             single clause
+        :param list of Query clauses: The clauses to combine
+        :rtype: BooleanQuery
+        """
+        self.operator = operator
+        self.clauses = clauses
+
+    def matches(self, document: dict) -> bool:
+        if 'AND' == self.operator:
+            return all(clause.matches(document) for clause in self.clauses)
+
+        if 'OR' == self.operator:
+            return any(clause.matches(document) for clause in self.clauses)
+
+        return not self.clauses[0].matches(document)
+
+    def fields(self) -> set:
+        return set().union(*[clause.fields() for clause in self.clauses])
+
+    def __repr__(self) -> str:
+        if 'NOT' == self.operator:
+            return 'NOT {0!r}'.format(self.clauses[0])
+
+        return '({0})'.format(' {0} '.format(self.operator).join(
+            repr(clause) for clause in self.clauses))
+
+
+class QueryParser:
+    def __init__(self, query: str):
+        """
+        Initialize a QueryParser instance for the given query string.
+
+        :param str query: The Solr query to parse
+        :rtype: QueryParser
+        """
+        self.query = query
+        self.position = 0
+
+    def parse(self) -> Query:
+        """
+        Parses the query string.
+
+        :rtype: Query
+        :raises ValueError: When the query uses unsupported syntax
+        """
+        self._skip_whitespace()
+
+        if self.position == len(self.query):
+            return MatchAllQuery()
+
+        query = self._parse_or()
+        self._skip_whitespace()
+
+        if self.position != len(self.query):
+            self._fail('unexpected input')
+
+        return query
+
+    def _parse_or(self) -> Query:
+        clauses = [self._parse_and()]
+
+        while True:
+            self._skip_whitespace()
+
+            if self._peek(')') or self.position == len(self.query):
+                break
+
+            self._keyword('OR')
+            clauses.append(self._parse_and())
+
+        return clauses[0] if len(clauses) == 1 else BooleanQuery('OR', clauses)
+
+    def _parse_and(self) -> Query:
+        clauses = [self._parse_unary()]
+
+        while True:
+            self._skip_whitespace()
+
+            if not self._keyword('AND') and not self._keyword('&&'):
+                break
+
+            clauses.append(self._parse_unary())
+
+        return clauses[0] if len(clauses) == 1 \
+            else BooleanQuery('AND', clauses)
+
+    def _parse_unary(self) -> Query:
+        self._skip_whitespace()
+
+        if self._keyword('NOT') or self._consume('-'):
+            return BooleanQuery('NOT', [self._parse_unary()])
+
+        self._consume('+')
+
+        if self._consume('('):
+            query = self._parse_or()
+            self._skip_whitespace()
+
+            if not self._consume(')'):
+                self._fail('missing closing parenthesis')
+
+            return query
+
+        if self._peek('{!'):
+            return self._parse_local_parameters()
+
+        if self._consume('*:*'):
+            return MatchAllQuery()
+
+        return self._parse_clause()
+
+    def _parse_clause(self) -> Query:
+        separator = self.query.find(':', self.position)
+
+        if separator < 0:
+            self._fail('missing field name')
+
+        field = self.query[self.position:separator]
+        self.position = separator + 1
+
+        if not field or any(character.isspace() for character in field):
+            self._fail('invalid field name')
+
+        if self._peek('[') or self._peek('{'):
+            return self._parse_range(field)
+
+        if self._consume('('):
+            values = []
+
+            while True:
+                self._skip_whitespace()
+
+                if self._consume(')'):
+                    break
+
+                if self._keyword('OR'):
+                    continue
+
+                values.append(TermQuery(field, self._parse_value()))
+
+            return BooleanQuery('OR', values)
+
+        return TermQuery(field, self._parse_value())
+
+    def _parse_range(self, field: str) -> Query:
+        include_lower = '[' == self.query[self.position]
+        closing = self.query.find(']', self.position)
+        exclusive_closing = self.query.find('}', self.position)
+
+        if closing < 0 or 0 <= exclusive_closing < closing:
+            closing = exclusive_closing
+
+        if closing < 0:
+            self._fail('unterminated range')
+
+        bounds = self.query[self.position + 1:closing].split(' TO ')
+
+        if 2 != len(bounds):
+            self._fail('invalid range')
+
+        include_upper = ']' == self.query[closing]
+        self.position = closing + 1
+
+        return RangeQuery(field, unquote(bounds[0].strip()),
+                          unquote(bounds[1].strip()), include_lower,
+                          include_upper)
+
+    def _parse_local_parameters(self) -> Query:
+        closing = self.query.find('}', self.position)
+
+        if closing < 0:
+            self._fail('unterminated local parameters')
+
+        parameters = self.query[self.position + 2:closing].split()
+        self.position = closing + 1
+
+        if not parameters or 'hash_range' != parameters[0]:
+            self._fail('unsupported query parser')
+
+        arguments = dict(parameter.split('=', 1)
+                         for parameter in parameters[1:])
+
+        return HashRangeQuery(arguments['f'], int(arguments['l']),
+                              int(arguments['u']))
+
+    def _parse_value(self) -> str:
+        if self._consume('"'):
+            value = []
+
+            while self.position < len(self.query) \
+                    and not self._peek('"'):
+                if self._peek('\\'):
+                    self.position += 1
+
+                value.append(self.query[self.position])
+                self.position += 1
+
+            if not self._consume('"'):
+                self._fail('unterminated phrase')
+
+            return ''.join(value)
+
+        start = self.position
+
+        while self.position < len(self.query) \
+                and not self.query[self.position].isspace() \
+                and not self._peek(')'):
+            if self._peek('\\'):
+                self.position += 1
+
+            self.position += 1
+
+        if start == self.position:
+            self._fail('missing value')
+
+        return re.sub(r'\\(.)', r'\1', self.query[start:self.position])
+
+    def _keyword(self, keyword: str) -> bool:
+        end = self.position + len(keyword)
+
+        if self.query[self.position:end] != keyword \
+                or (end < len(self.query) and not self.query[end].isspace()
+                    and '(' != self.query[end]):
+            return False
+
+        self.position = end
+
+        return True
+
+    def _peek(self, text: str) -> bool:
+        return self.query.startswith(text, self.position)
+
+    def _consume(self, text: str) -> bool:
+        if not self._peek(text):
+            return False
+
+        self.position += len(text)
+
+        return True
+
+    def _skip_whitespace(self) -> None:
+        while self.position < len(self.query) \
+                and self.query[self.position].isspace():
+            self.position += 1
+
+    def _fail(self, reason: str) -> None:
+        raise ValueError('{0} at position {1} of query: {2}'.format(
+            reason, self.position, self.query))
+
+
+@lru_cache(maxsize=1024)
+def parse_query(query: Union[str, None]) -> Query:
+    """
+    Parses the given Solr query, see `Query` for the supported syntax. Parsed
+    queries are cached, as the tasks evaluate the same filters many times.
+
+    :param str|None query: The Solr query to parse, None matches everything
+    :rtype: Query
+    :raises ValueError: When the query uses unsupported syntax
+    """
+    if query is None:
+        return MatchAllQuery()
+
+    return QueryParser(query).parse()
+
+
+def parse_filters(filters: Union[str, list, None]) -> Query:
+    """
+    Parses the given filter query, or filter queries, into a single query that
+    matches the documents matching all of them.
+
+    :param str|list of str|None filters: The filter queries to parse
+    :rtype: Query
+    """
+    if filters is None:
+        return MatchAllQuery()
+
+    if isinstance(filters, str):
+        return parse_query(filters)
+
+    queries = [parse_query(query) for query in filters]
+
+    return queries[0] if len(queries) == 1 else BooleanQuery('AND', queries)
+
+
+def compare_values(value: str, bound: str) -> int:
+    """
+    Compares a field value with a range bound, numerically when both are
+    numbers and lexicographically otherwise.
+
+    :param str value: The field value
+    :param str bound: The range bound
+    :rtype: int
+    :return: A negative number, zero or a positive number when the value is
+             smaller than, equal to or larger than the bound
+    """
+    try:
+        value, bound = float(value), float(bound)
+    except ValueError:
+        pass
+
+    return (value > bound) - (value < bound)
+
+
+def resolve_date_math(value: str) -> str:
+    """
+    Resolves Solr date math based on `NOW`, such as `NOW-30DAYS` or
+    `NOW/DAY`, into an ISO 8601 date. Other values are returned unchanged.
+
+    :param str value: The value to resolve
+    :rtype: str
+    """
+    match = DATE_MATH.match(value)
+
+    if not match:
+        return value
+
+    date = datetime.datetime.now(datetime.timezone.utc).replace(
+        microsecond=0)
+
+    for sign, amount, unit in re.findall(r'([+-])(\d+)([A-Z]+)',
+                                         match.group(1)):
+        if unit not in DATE_UNITS:
+            raise ValueError('unsupported date math unit: {0}'.format(unit))
+
+        delta = datetime.timedelta(**{DATE_UNITS[unit]: int(amount)})
+        date = date + delta if '+' == sign else date - delta
+
+    rounding = match.group(2)
+
+    if rounding in ['DAY', 'DAYS']:
+        date = date.replace(hour=0, minute=0, second=0)
+    elif rounding in ['HOUR', 'HOURS']:
+        date = date.replace(minute=0, second=0)
+
+    return date.strftime(DATE_FORMAT)
+
+
+def unquote(value: str) -> str:
+    """
+    Removes the surrounding double quotes of a value, if any.
+
+    :param str value: The value to unquote
+    :rtype: str
+    """
+    if len(value) > 1 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+
+    return value
+
+
+def murmurhash3_32(value: str, seed: int = 0) -> int:
+    """
+    Returns the signed MurmurHash3 (x86, 32-bit) hash of the UTF-8 encoding of
+    the given value, as computed by Solr for document routing and the
+    `{!hash_range}` query parser.
+
+    :param str value: The value to hash
+    :param int seed: The seed of the hash
+    :rtype: int
+    """
+    data = value.encode('utf-8')
+    length = len(data)
+    c1, c2 = 0xcc9e2d51, 0x1b873593
+    h = seed & 0xffffffff
+    rounded_end = length & ~3
+
+    for i in range(0, rounded_end, 4):
+        k = int.from_bytes(data[i:i + 4], 'little')
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+        h = ((h << 13) | (h >> 19)) & 0xffffffff
+        h = (h * 5 + 0xe6546b64) & 0xffffffff
+
+    tail = data[rounded_end:]
+
+    if tail:
+        k = int.from_bytes(tail, 'little')
+        k = (k * c1) & 0xffffffff
+        k = ((k << 15) | (k >> 17)) & 0xffffffff
+        k = (k * c2) & 0xffffffff
+        h ^= k
+
+    h ^= length
+    h ^= h >> 16
+    h = (h * 0x85ebca6b) & 0xffffffff
+    h ^= h >> 13
+    h = (h * 0xc2b2ae35) & 0xffffffff
+    h ^= h >> 16
+
+    return h - 0x100000000 if h & 0x80000000 else h
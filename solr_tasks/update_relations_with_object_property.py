@@ -1,21 +1,18 @@
 # encoding: utf-8
 
+import argparse
 from solr_tasks.lib import utils
+from solr_tasks.lib.commit import CommitPolicy
+from solr_tasks.lib.diff import UpdateDiff
 import logging
+from solr_tasks.lib.metrics import dump_metrics
+from solr_tasks.lib.scan import ScanPlan
 from solr_tasks.lib.solr import SolrCollection
 import os
 
 
-def get_object_uri_to_source_mapping(search_collection: SolrCollection,
-                                     object_type: str,
+def get_object_uri_to_source_mapping(objects: list,
                                      source_field: str) -> dict:
-    objects = search_collection.select_all_documents(
-        'sys_type:{0} AND {1}:[* TO *]'.format(
-            object_type, source_field),
-        ['sys_uri', source_field],
-        id_field='sys_id'
-    )
-
     return {
         single_object['sys_uri']: single_object[source_field]
         for single_object in objects
@@ -25,53 +22,77 @@ def get_object_uri_to_source_mapping(search_collection: SolrCollection,
 def get_relation_updates(relation: dict, mapping: dict,
                          object_uri_to_source_mapping: dict,
                          relation_objects: list) -> list:
-    relation_updates = [{
-        'sys_id': relation_object['sys_id'],
-        mapping['to']: {
-            'set': object_uri_to_source_mapping[
+    diff = UpdateDiff(mapping['to'])
+
+    for relation_object in relation_objects:
+        if relation_object[relation['match']][0] \
+                in object_uri_to_source_mapping:
+            diff.compare(relation_object, object_uri_to_source_mapping[
                 relation_object[relation['match']][0]
-            ]
-        }
-    }
-        for relation_object in relation_objects
-        if relation_object[relation['match']][0]
-        in object_uri_to_source_mapping
-    ]
+            ])
 
-    logging.info(' Preparing to index {0} {1} updates for {2}'.format(
-        len(relation_updates), mapping['to'], relation['type']
-    ))
+    logging.info(' Preparing to index {0} {1} updates for {2}, {3} '
+                 'unchanged'.format(len(diff.updates), mapping['to'],
+                                    relation['type'], diff.skipped))
 
-    return relation_updates
+    return diff.updates
 
 
 def main():
     utils.setup_logger(__file__)
 
+    parser = argparse.ArgumentParser(description='Indexes object properties '
+                                                 'on their relations')
+    parser.add_argument('--commit_policy', type=CommitPolicy.from_string,
+                        default=CommitPolicy.from_environment(),
+                        help='How to commit between phases: hard, soft, '
+                             'deferred or none, optionally followed by '
+                             ':{commitWithin in ms}')
+
+    input_arguments = vars(parser.parse_args())
+
     logging.info('update_relations_with_object_property.py -- starting')
 
-    search_collection = SolrCollection(os.getenv('SOLR_COLLECTION_SEARCH'))
+    search_collection = SolrCollection(
+        os.getenv('SOLR_COLLECTION_SEARCH'),
+        commit_policy=input_arguments['commit_policy']
+    )
     property_to_relation = utils.load_resource('property_to_relation')
 
+    plan = ScanPlan(search_collection, id_field='sys_id', export=True)
+    requests = {}
+
+    for object_type, mapping in property_to_relation.items():
+        requests[object_type] = (
+            plan.add('sys_type:{0} AND {1}:[* TO *]'.format(
+                object_type, mapping['source']),
+                ['sys_uri', mapping['source']]),
+            [plan.add('sys_type:{0} AND {1}:[* TO *]'.format(
+                relation['type'], relation['match']),
+                ['sys_uri', relation['match'], mapping['to']])
+             for relation in mapping['relations']]
+        )
+
+    plan.execute()
+
     updates = []
     for object_type, mapping in property_to_relation.items():
+        objects, relation_requests = requests[object_type]
         object_uri_to_source_mapping = get_object_uri_to_source_mapping(
-            search_collection, object_type, mapping['source'])
-
-        for relation in mapping['relations']:
-            relation_objects = search_collection.select_all_documents(
-                'sys_type:{0} AND {1}:[* TO *]'.format(
-                    relation['type'], relation['match']),
-                ['sys_uri', relation['match']],
-                id_field='sys_id'
-            )
+            objects.documents, mapping['source'])
 
+        for relation, relation_request in zip(mapping['relations'],
+                                              relation_requests):
             updates += get_relation_updates(relation, mapping,
                                             object_uri_to_source_mapping,
-                                            relation_objects)
+                                            relation_request.documents)
 
     search_collection.index_documents(updates)
 
+    search_collection.log_transfer_statistics()
+
+    dump_metrics(__file__)
+
     logging.info('update_relations_with_object_property.py -- finished')
 
 